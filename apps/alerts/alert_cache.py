@@ -0,0 +1,175 @@
+"""
+Active alert cache for the runner.
+
+The runner polls every second; selecting every active alert each time sends
+the whole table over the wire. AlertCache loads active alerts once, then only
+pulls rows whose ``updated_at`` is at or after the last watermark (migration
+08). Alerts that are no longer active are dropped; a status change bumps
+``updated_at``, so deactivations arrive with the delta. Hard deletes do not,
+so every ALERT_CACHE_RECONCILE_SECONDS the ids of active alerts are selected
+and cached alerts missing from them are dropped. A periodic full reload
+resynchronises everything. apply_change() accepts push notifications
+from a change feed.
+
+Simple-mode conditions are compiled once when an alert is inserted or
+changed, so evaluation does not re-parse them on every poll.
+"""
+
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from apps.api.clients.supabase_client import supabase as default_supabase
+from backend.evaluator import ConditionPlan, compile_condition
+
+logger = logging.getLogger(__name__)
+
+TABLE = "alerts"
+
+REFRESH_MS = int(os.getenv("ALERT_CACHE_REFRESH_MS", "1000"))
+FULL_RELOAD_SECONDS = int(os.getenv("ALERT_CACHE_FULL_RELOAD_SECONDS", "300"))
+RECONCILE_SECONDS = int(os.getenv("ALERT_CACHE_RECONCILE_SECONDS", "30"))
+
+# Supabase returns at most 1000 rows per request
+_PAGE_SIZE = 1000
+
+
+class AlertCache:
+    def __init__(
+        self,
+        client=None,
+        refresh_ms: int = REFRESH_MS,
+        full_reload_seconds: int = FULL_RELOAD_SECONDS,
+        reconcile_seconds: int = RECONCILE_SECONDS
+    ):
+        self.client = client if client is not None else default_supabase
+        self.refresh_interval = refresh_ms / 1000
+        self.full_reload_seconds = full_reload_seconds
+        self.reconcile_seconds = reconcile_seconds
+        self.alerts: Dict[str, Dict[str, Any]] = {}
+        self.compiled: Dict[str, List[ConditionPlan]] = {}
+        self.watermark: Optional[str] = None
+        self._last_refresh = 0.0
+        self._last_full_load = 0.0
+        self._last_reconcile = 0.0
+        self.loaded = False
+        self.stats = {"full_loads": 0, "refreshes": 0, "rows_applied": 0, "rows_removed": 0}
+
+    def active_alerts(self) -> List[Dict[str, Any]]:
+        """Active alerts, refreshing from the database when due."""
+        if self.client is None:
+            return []
+        now = time.monotonic()
+        if not self.loaded or now - self._last_full_load >= self.full_reload_seconds:
+            self.load()
+        elif now - self._last_refresh >= self.refresh_interval:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Alert delta refresh failed, doing a full reload: {e}")
+                self.load()
+        return list(self.alerts.values())
+
+    def plans(self, alert_id: str) -> Optional[List[ConditionPlan]]:
+        """Compiled plans for alert["conditions"], in the same order."""
+        return self.compiled.get(alert_id)
+
+    def load(self):
+        rows = self._fetch(lambda: self.client.table(TABLE).select("*").eq("status", "active"))
+        self.alerts.clear()
+        self.compiled.clear()
+        for row in rows:
+            self._apply(row)
+        self.watermark = self._max_updated_at(rows)
+        self._last_full_load = self._last_refresh = self._last_reconcile = time.monotonic()
+        self.loaded = True
+        self.stats["full_loads"] += 1
+        logger.info(f"Alert cache loaded {len(self.alerts)} active alerts")
+
+    def refresh(self):
+        watermark = self.watermark
+        if watermark is None:
+            # Nothing to track changes from (empty table or migration 08 not applied)
+            self.load()
+            return
+
+        def query():
+            # gte, not gt: rows sharing the watermark timestamp may commit later
+            return self.client.table(TABLE).select("*").gte("updated_at", watermark)
+
+        rows = self._fetch(query)
+        for row in rows:
+            self._apply(row)
+        if time.monotonic() - self._last_reconcile >= self.reconcile_seconds:
+            self._reconcile()
+        watermark = self._max_updated_at(rows)
+        if watermark and (self.watermark is None or watermark > self.watermark):
+            self.watermark = watermark
+        self._last_refresh = time.monotonic()
+        self.stats["refreshes"] += 1
+        self.stats["rows_applied"] += len(rows)
+
+    def _reconcile(self):
+        """Drop cached alerts that were deleted (or deactivated) since they were loaded."""
+        if not self.alerts:
+            return
+        active_ids = {
+            row["alert_id"]
+            for row in self._fetch(lambda: self.client.table(TABLE).select("alert_id").eq("status", "active"))
+        }
+        self._last_reconcile = time.monotonic()
+        removed = [alert_id for alert_id in self.alerts if alert_id not in active_ids]
+        for alert_id in removed:
+            self._remove(alert_id)
+        self.stats["rows_removed"] += len(removed)
+
+    def apply_change(self, record: Dict[str, Any], deleted: bool = False):
+        """Apply one change-feed event for the alerts table."""
+        if deleted:
+            self._remove(record.get("alert_id"))
+        else:
+            self._apply(record)
+        self.stats["rows_applied"] += 1
+
+    def _apply(self, row: Dict[str, Any]):
+        alert_id = row.get("alert_id")
+        if not alert_id:
+            return
+        if row.get("status") != "active":
+            self._remove(alert_id)
+            return
+        previous = self.alerts.get(alert_id)
+        self.alerts[alert_id] = row
+        if previous is None or previous.get("conditions") != row.get("conditions") or alert_id not in self.compiled:
+            self._compile(row)
+
+    def _compile(self, row: Dict[str, Any]):
+        alert_id = row["alert_id"]
+        try:
+            self.compiled[alert_id] = [compile_condition(c) for c in row.get("conditions") or []]
+        except Exception as e:
+            # Evaluation falls back to the raw condition dicts
+            self.compiled.pop(alert_id, None)
+            logger.warning(f"Could not compile conditions for alert {alert_id}: {e}")
+
+    def _remove(self, alert_id: Optional[str]):
+        self.alerts.pop(alert_id, None)
+        self.compiled.pop(alert_id, None)
+
+    @staticmethod
+    def _fetch(make_query: Callable[[], Any]) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        offset = 0
+        while True:
+            page = make_query().order("alert_id").range(offset, offset + _PAGE_SIZE - 1).execute()
+            data = page.data or []
+            rows.extend(data)
+            if len(data) < _PAGE_SIZE:
+                return rows
+            offset += _PAGE_SIZE
+
+    @staticmethod
+    def _max_updated_at(rows: List[Dict[str, Any]]) -> Optional[str]:
+        stamps = [row["updated_at"] for row in rows if row.get("updated_at")]
+        return max(stamps) if stamps else None
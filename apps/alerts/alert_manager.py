@@ -1,42 +1,121 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import pandas as pd
 import numpy as np
 import datetime as dt
 from apps.alerts.datasource import CandleSource
 from apps.alerts import state
+from apps.alerts.alert_cache import AlertCache
 from apps.api.clients.supabase_client import supabase
-from backend.evaluator import evaluate_condition, evaluate_playbook
+from backend.evaluator import evaluate_conditions_batch, evaluate_playbook
 
 TABLE = "alerts"
 LOG_TABLE = "alerts_log"
 
 class AlertManager:
-    def __init__(self, candle_source: CandleSource):
+    def __init__(self, candle_source: CandleSource, alert_cache: Optional[AlertCache] = None):
         self.src = candle_source
+        self.alert_cache = alert_cache
 
     def fetch_active_alerts(self) -> List[Dict[str,Any]]:
         if supabase is None:
             return []  # Return empty list if Supabase not configured
+        if self.alert_cache is not None:
+            return self.alert_cache.active_alerts()
         res = supabase.table(TABLE).select("*").eq("status","active").execute()
         return res.data or []
 
-    def _get_base_df(self, symbol: str, tf: str) -> pd.DataFrame:
-        return self.src.get_recent(symbol, tf, limit=1000)
-
-    def _resolve_tf_df(self, base_df: pd.DataFrame, cond_tf: str, base_tf: str, symbol: str) -> pd.DataFrame:
+    def _get_base_df(self, symbol: str, tf: str, group_cache: Optional[Dict[str,Any]] = None) -> pd.DataFrame:
+        if group_cache is None:
+            return self.src.get_recent(symbol, tf, limit=1000)
+        if "base" not in group_cache:
+            group_cache["base"] = self.src.get_recent(symbol, tf, limit=1000)
+        return group_cache["base"]
+
+    def _resolve_tf_df(
+        self,
+        base_df: pd.DataFrame,
+        cond_tf: str,
+        base_tf: str,
+        symbol: str,
+        group_cache: Optional[Dict[str,Any]] = None
+    ) -> pd.DataFrame:
         if cond_tf in ("same", base_tf):
             return base_df
-        return self.src.upsample_or_downsample(base_df, cond_tf)
-
-    def _apply_needed_indicators(self, df: pd.DataFrame, conditions: List[Dict[str,Any]]) -> pd.DataFrame:
+        if group_cache is None:
+            return self.src.upsample_or_downsample(base_df, cond_tf)
+        frames = group_cache.setdefault("frames", {})
+        if cond_tf not in frames:
+            frames[cond_tf] = self.src.upsample_or_downsample(base_df, cond_tf, symbol, base_tf)
+        return frames[cond_tf]
+
+    def _group_frame(
+        self,
+        base_df: pd.DataFrame,
+        tf: str,
+        base_tf: str,
+        symbol: str,
+        conds: List[Dict[str,Any]],
+        group_cache: Optional[Dict[str,Any]] = None
+    ) -> pd.DataFrame:
+        """Resolve the timeframe frame and add the indicators conds need (shared within a group)."""
+        df_tf = self._resolve_tf_df(base_df, tf, base_tf, symbol, group_cache)
+        if df_tf is None or df_tf.empty:
+            return df_tf
+        memo_key = self._indicator_memo_key(symbol, base_tf, tf, df_tf) if group_cache is not None else None
+        return self._apply_needed_indicators(df_tf, conds, memo_key)
+
+    def _apply_needed_indicators(
+        self,
+        df: pd.DataFrame,
+        conditions: List[Dict[str,Any]],
+        memo_key: Optional[Tuple[str,str,str]] = None
+    ) -> pd.DataFrame:
         """
         Apply only indicators referenced by LHS/RHS across conditions for this DF.
         Extracts parameters from conditions and applies appropriate indicators.
+
+        With a memo_key (see _indicator_memo_key), each (indicator, params) is
+        computed once per bar and shared by every alert on that frame.
         """
         if df.empty:
             return df
         out = df.copy()
-        
+
+        memo = None
+        if memo_key is not None:
+            memo = state.get_indicator_memo(memo_key)
+            if memo is None:
+                memo = {}
+                state.set_indicator_memo(memo_key, memo)
+                state.prune_indicator_memo(memo_key)
+
+        for indicator, config in self._needed_indicator_configs(conditions).items():
+            if memo is None:
+                out = self._add_indicator(out, indicator, config)
+                continue
+            key = (indicator, tuple(sorted(config.items())))
+            columns = memo.get(key)
+            if columns is None:
+                scratch = self._add_indicator(df.copy(), indicator, config)
+                columns = {c: scratch[c].to_numpy() for c in scratch.columns if c not in df.columns}
+                memo[key] = columns
+            for column, values in columns.items():
+                out[column] = values
+
+        return out
+
+    @staticmethod
+    def _indicator_memo_key(symbol: str, base_tf: str, tf: str, df: pd.DataFrame) -> Tuple[str,str,str]:
+        """(symbol, timeframe, bar_key) for the indicator memo; bar_key changes whenever the frame does."""
+        timeframe = base_tf if tf in ("same", base_tf) else f"{base_tf}>{tf}"
+        first, last = df.iloc[0], df.iloc[-1]
+        bar_key = "|".join(str(v) for v in (
+            len(df), first["time"], last["time"], last["open"], last["high"], last["low"], last["close"], last["volume"]
+        ))
+        return symbol, timeframe, bar_key
+
+    def _needed_indicator_configs(self, conditions: List[Dict[str,Any]]) -> Dict[str, Dict[str,Any]]:
+        """Indicators (with parameters) referenced by LHS/RHS across conditions."""
         # Track needed indicators with their parameters
         indicator_configs = {}  # {indicator_name: {params}}
         
@@ -108,68 +187,70 @@ class AlertManager:
                     indicator_configs[rhs_indicator]["period"] = ma_length
                     indicator_configs[rhs_indicator]["maType"] = cond.get("priceMaType", "EMA")
 
-        # Apply indicators with their parameters
-        for indicator, config in indicator_configs.items():
-            if indicator == "RSI":
-                period = config.get("period", 14)
-                out = self._add_rsi(out, period)
-            elif indicator == "MFI":
-                period = config.get("period", 14)
-                out = self._add_mfi(out, period)
-            elif indicator == "CCI":
-                period = config.get("period", 14)
-                out = self._add_cci(out, period)
-            elif indicator == "EMA":
-                period = config.get("period") or config.get("fast") or config.get("slow") or 20
-                out = self._add_ema(out, period)
-            elif indicator == "SMA":
-                period = config.get("period") or config.get("fast") or config.get("slow") or 20
-                out = self._add_sma(out, period)
-            elif indicator == "MACD":
-                fast = config.get("fast", 12)
-                slow = config.get("slow", 26)
-                signal = config.get("signal", 9)
-                out = self._add_macd(out, fast, slow, signal)
-            elif indicator.endswith("_Fast"):
-                # Handle Fast MA (e.g., EMA_Fast)
-                ma_type = config.get("maType", "EMA")
-                period = config.get("period", 20)
-                if ma_type == "EMA":
-                    fast_ema = out['close'].ewm(span=period).mean()
-                    out[f"{ma_type}_Fast"] = fast_ema
-                    out[f"{ma_type}_Fast_{ma_type}"] = fast_ema
-                elif ma_type == "SMA":
-                    fast_sma = out['close'].rolling(window=period).mean()
-                    out[f"{ma_type}_Fast"] = fast_sma
-                    out[f"{ma_type}_Fast_{ma_type}"] = fast_sma
-                else:
-                    # Fallback to EMA
-                    fast_ema = out['close'].ewm(span=period).mean()
-                    out[f"{ma_type}_Fast"] = fast_ema
-            elif indicator.endswith("_Slow"):
-                # Handle Slow MA (e.g., EMA_Slow)
-                ma_type = config.get("maType", "EMA")
-                period = config.get("period", 20)
-                if ma_type == "EMA":
-                    slow_ema = out['close'].ewm(span=period).mean()
-                    out[f"{ma_type}_Slow"] = slow_ema
-                    out[f"{ma_type}_Slow_{ma_type}"] = slow_ema
-                elif ma_type == "SMA":
-                    slow_sma = out['close'].rolling(window=period).mean()
-                    out[f"{ma_type}_Slow"] = slow_sma
-                    out[f"{ma_type}_Slow_{ma_type}"] = slow_sma
-                else:
-                    # Fallback to EMA
-                    slow_ema = out['close'].ewm(span=period).mean()
-                    out[f"{ma_type}_Slow"] = slow_ema
-            elif indicator in ["WMA", "TEMA", "KAMA", "MAMA", "VWMA", "Hull"]:
-                # For now, use EMA calculation as fallback
-                # In production, these should use proper implementations
-                period = config.get("period") or config.get("fast") or config.get("slow") or 20
-                out = self._add_ema(out, period)  # Fallback to EMA
-                # Map to the correct column name
-                out[f"{indicator}"] = out["EMA"]
-                out[f"{indicator}_{indicator}"] = out["EMA"]
+        return indicator_configs
+
+    def _add_indicator(self, out: pd.DataFrame, indicator: str, config: Dict[str,Any]) -> pd.DataFrame:
+        """Apply one indicator with its parameters to out."""
+        if indicator == "RSI":
+            period = config.get("period", 14)
+            out = self._add_rsi(out, period)
+        elif indicator == "MFI":
+            period = config.get("period", 14)
+            out = self._add_mfi(out, period)
+        elif indicator == "CCI":
+            period = config.get("period", 14)
+            out = self._add_cci(out, period)
+        elif indicator == "EMA":
+            period = config.get("period") or config.get("fast") or config.get("slow") or 20
+            out = self._add_ema(out, period)
+        elif indicator == "SMA":
+            period = config.get("period") or config.get("fast") or config.get("slow") or 20
+            out = self._add_sma(out, period)
+        elif indicator == "MACD":
+            fast = config.get("fast", 12)
+            slow = config.get("slow", 26)
+            signal = config.get("signal", 9)
+            out = self._add_macd(out, fast, slow, signal)
+        elif indicator.endswith("_Fast"):
+            # Handle Fast MA (e.g., EMA_Fast)
+            ma_type = config.get("maType", "EMA")
+            period = config.get("period", 20)
+            if ma_type == "EMA":
+                fast_ema = out['close'].ewm(span=period).mean()
+                out[f"{ma_type}_Fast"] = fast_ema
+                out[f"{ma_type}_Fast_{ma_type}"] = fast_ema
+            elif ma_type == "SMA":
+                fast_sma = out['close'].rolling(window=period).mean()
+                out[f"{ma_type}_Fast"] = fast_sma
+                out[f"{ma_type}_Fast_{ma_type}"] = fast_sma
+            else:
+                # Fallback to EMA
+                fast_ema = out['close'].ewm(span=period).mean()
+                out[f"{ma_type}_Fast"] = fast_ema
+        elif indicator.endswith("_Slow"):
+            # Handle Slow MA (e.g., EMA_Slow)
+            ma_type = config.get("maType", "EMA")
+            period = config.get("period", 20)
+            if ma_type == "EMA":
+                slow_ema = out['close'].ewm(span=period).mean()
+                out[f"{ma_type}_Slow"] = slow_ema
+                out[f"{ma_type}_Slow_{ma_type}"] = slow_ema
+            elif ma_type == "SMA":
+                slow_sma = out['close'].rolling(window=period).mean()
+                out[f"{ma_type}_Slow"] = slow_sma
+                out[f"{ma_type}_Slow_{ma_type}"] = slow_sma
+            else:
+                # Fallback to EMA
+                slow_ema = out['close'].ewm(span=period).mean()
+                out[f"{ma_type}_Slow"] = slow_ema
+        elif indicator in ["WMA", "TEMA", "KAMA", "MAMA", "VWMA", "Hull"]:
+            # For now, use EMA calculation as fallback
+            # In production, these should use proper implementations
+            period = config.get("period") or config.get("fast") or config.get("slow") or 20
+            out = self._add_ema(out, period)  # Fallback to EMA
+            # Map to the correct column name
+            out[f"{indicator}"] = out["EMA"]
+            out[f"{indicator}_{indicator}"] = out["EMA"]
 
         return out
 
@@ -289,10 +370,14 @@ class AlertManager:
         
         return df
 
-    def evaluate_alert(self, alert: Dict[str,Any]) -> Dict[str,Any] | None:
+    def evaluate_alert(self, alert: Dict[str,Any], group_cache: Optional[Dict[str,Any]] = None) -> Dict[str,Any] | None:
         """
         Returns payload if triggered else None.
         Supports both simple conditions and playbook mode.
+
+        Alerts sharing (symbol, base_timeframe) can pass the same group_cache
+        dict: the base frame and resampled frames are then built once, and
+        indicators are computed once per bar through the state indicator memo.
         """
         symbol = alert["symbol"]
         base_tf = alert["base_timeframe"]
@@ -301,13 +386,13 @@ class AlertManager:
         condition_config = alert.get("conditionConfig") or alert.get("condition_config")
         if condition_config and condition_config.get("mode") == "playbook":
             # Use playbook evaluation
-            return self._evaluate_playbook_alert(alert, condition_config)
+            return self._evaluate_playbook_alert(alert, condition_config, group_cache)
         
         # Fall back to simple condition evaluation
         conditions = alert.get("conditions", [])
         logic = alert.get("logic","AND")
 
-        base_df = self._get_base_df(symbol, base_tf)
+        base_df = self._get_base_df(symbol, base_tf, group_cache)
         if base_df is None or base_df.empty:
             return None
 
@@ -318,17 +403,22 @@ class AlertManager:
         per_tf_frames = {}  # cache per condition timeframe
 
         # Build per-timeframe frames with indicators applied only as needed
-        # Group conditions by timeframe
+        # Group conditions (and their precompiled plans, if cached) by timeframe
+        plans = self.alert_cache.plans(alert.get("alert_id")) if self.alert_cache is not None else None
+        if plans is not None and len(plans) != len(conditions):
+            plans = None
         tf_groups: Dict[str, List[Dict[str,Any]]] = {}
-        for c in conditions:
+        tf_plans: Dict[str, list] = {}
+        for i, c in enumerate(conditions):
             tf = c.get("timeframe","same")
             tf_groups.setdefault(tf, []).append(c)
+            if plans is not None:
+                tf_plans.setdefault(tf, []).append(plans[i])
 
         for tf, conds in tf_groups.items():
-            df_tf = self._resolve_tf_df(base_df, tf, base_tf, symbol)
+            df_tf = self._group_frame(base_df, tf, base_tf, symbol, conds, group_cache)
             if df_tf is None or df_tf.empty:
                 return None
-            df_tf = self._apply_needed_indicators(df_tf, conds)
             per_tf_frames[tf] = df_tf
 
         # Build a unified evaluation row dictionary the evaluator understands
@@ -365,13 +455,9 @@ class AlertManager:
             if last_fired is not None and pd.to_datetime(last_fired) == pd.to_datetime(latest_bar_time):
                 return None
 
-        # Now actually evaluate each condition on its TF frame, using last bar
-        for c in conditions:
-            tf = c.get("timeframe","same")
-            df_tf = per_tf_frames[tf]
-            idx = len(df_tf) - 1
-            ok = evaluate_condition(df_tf, idx, c)  # your function signature may differ
-            results.append(ok)
+        # Now evaluate all conditions of each TF frame in one batch, using last bar
+        for tf, conds in tf_groups.items():
+            results.extend(evaluate_conditions_batch(per_tf_frames[tf], tf_plans.get(tf, conds)).tolist())
 
         group_ok = all(results) if logic == "AND" else any(results)
         if not group_ok:
@@ -400,7 +486,12 @@ class AlertManager:
             "snapshot": ctx_snapshot
         }
 
-    def _evaluate_playbook_alert(self, alert: Dict[str,Any], condition_config: Dict[str,Any]) -> Dict[str,Any] | None:
+    def _evaluate_playbook_alert(
+        self,
+        alert: Dict[str,Any],
+        condition_config: Dict[str,Any],
+        group_cache: Optional[Dict[str,Any]] = None
+    ) -> Dict[str,Any] | None:
         """
         Evaluate alert using playbook mode with priority, validity duration, and AND/OR logic.
         """
@@ -408,7 +499,7 @@ class AlertManager:
         base_tf = alert["base_timeframe"]
         playbook = condition_config.get("playbook") or condition_config
         
-        base_df = self._get_base_df(symbol, base_tf)
+        base_df = self._get_base_df(symbol, base_tf, group_cache)
         if base_df is None or base_df.empty:
             return None
         
@@ -429,10 +520,9 @@ class AlertManager:
         
         per_tf_frames = {}
         for tf, conds in tf_groups.items():
-            df_tf = self._resolve_tf_df(base_df, tf, base_tf, symbol)
+            df_tf = self._group_frame(base_df, tf, base_tf, symbol, conds, group_cache)
             if df_tf is None or df_tf.empty:
                 return None
-            df_tf = self._apply_needed_indicators(df_tf, conds)
             per_tf_frames[tf] = df_tf
         
         # Get the base timeframe dataframe for playbook evaluation
@@ -486,6 +576,10 @@ class AlertManager:
             "snapshot": ctx_snapshot
         }
 
+    def claim_fire(self, alert: Dict[str,Any], payload: Dict[str,Any]) -> bool:
+        """Record the payload's bar as fired; False if it already was (possibly by another runner)."""
+        return state.claim_last_fired(alert["alert_id"], payload["latest_bar_time"])
+
     def log_and_dispatch(self, alert: Dict[str,Any], payload: Dict[str,Any]):
         if supabase is None:
             return  # Skip if Supabase not configured
@@ -497,7 +591,6 @@ class AlertManager:
         supabase.table(TABLE).update({
             "last_triggered_at": payload["latest_bar_time"]
         }).eq("alert_id", alert["alert_id"]).execute()
-        state.set_last_fired(alert["alert_id"], payload["latest_bar_time"])
 
     def simulate(self, alert: Dict[str, Any]) -> Dict[str, Any]:
         """Simulate alert evaluation without side effects."""
@@ -524,12 +617,13 @@ class AlertManager:
             df_tf = self._apply_needed_indicators(df_tf, conds)
             per_tf_frames[tf] = df_tf
 
+        tf_results = {
+            tf: iter(evaluate_conditions_batch(per_tf_frames[tf], conds).tolist())
+            for tf, conds in tf_groups.items()
+        }
         reasons = []
         for c in conditions:
-            tf = c.get("timeframe", "same")
-            df_tf = per_tf_frames[tf]
-            idx = len(df_tf) - 1
-            ok = evaluate_condition(df_tf, idx, c)
+            ok = next(tf_results[c.get("timeframe", "same")])
             reasons.append({"condition_id": c["id"], "ok": bool(ok)})
 
         group_ok = all(r["ok"] for r in reasons) if logic == "AND" else any(r["ok"] for r in reasons)
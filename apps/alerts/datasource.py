@@ -1,15 +1,86 @@
-from typing import Literal, Dict, Any, Optional
+from abc import ABC, abstractmethod
+from typing import Literal, Dict, Any, Iterable, Optional, Tuple
+import os
+import sys
 import pandas as pd
 import datetime as dt
 import numpy as np
+from apps.alerts.resample_cache import ResampleCache
 
-class TestCandleSource:
+class BaseCandleSource(ABC):
+    """Shared resampling helpers for candle sources."""
+
+    def __init__(self):
+        self.resample_cache = ResampleCache()
+
+    @abstractmethod
+    def get_recent(self, symbol: str, timeframe: str, limit: int = 500) -> pd.DataFrame:
+        """Return the latest `limit` candles for symbol at timeframe."""
+
+    def upsample_or_downsample(
+        self,
+        df: pd.DataFrame,
+        to_tf: str,
+        symbol: Optional[str] = None,
+        base_tf: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        If alert condition timeframe ≠ base timeframe, convert via resample.
+        Assumes df.time is UTC and monotonic; use OHLCV resample rules.
+
+        With symbol and base_tf, bars come from the incremental resample cache
+        (only the forming bucket is re-aggregated) and the result is a view
+        that is valid until the next call for the same key.
+        """
+        if df.empty:
+            return df
+
+        if symbol and base_tf and "time" in df.columns:
+            out = self.resample_cache.resample(
+                symbol, base_tf, to_tf, df, pd.Timedelta(self._tf_to_pandas_rule(to_tf))
+            )
+            if out is not None:
+                return out
+
+        # Ensure datetime index
+        if not isinstance(df.index, pd.DatetimeIndex):
+            df = df.copy()
+            df["time"] = pd.to_datetime(df["time"], utc=True, errors="coerce")
+            df = df.set_index("time")
+
+        rule = self._tf_to_pandas_rule(to_tf)
+        o = df["open"].resample(rule).first()
+        h = df["high"].resample(rule).max()
+        l = df["low"].resample(rule).min()
+        c = df["close"].resample(rule).last()
+        v = df["volume"].resample(rule).sum()
+        out = pd.concat([o,h,l,c,v], axis=1)
+        out.columns = ["open","high","low","close","volume"]
+        out = out.dropna(how="any")
+        out = out.reset_index().rename(columns={"index":"time"})
+        return out
+
+    def _tf_to_pandas_rule(self, tf: str) -> str:
+        # very basic mapping; extend as needed
+        if tf.endswith("m"):
+            return f"{tf[:-1]}T"          # minutes
+        if tf.endswith("h"):
+            return f"{tf[:-1]}H"          # hours
+        if tf.endswith("d"):
+            return f"{tf[:-1]}D"          # days
+        if tf == "same":
+            return "1T"
+        return "1T"
+
+
+class TestCandleSource(BaseCandleSource):
     """
     Test implementation of CandleSource that generates sample data
     for testing the alert system without requiring real market data.
     """
     
     def __init__(self):
+        super().__init__()
         self.sample_data = {}
         self._generate_sample_data()
     
@@ -102,43 +173,45 @@ class TestCandleSource:
         df = self.sample_data[symbol][timeframe].copy()
         return df.tail(limit)
 
-    def upsample_or_downsample(self, df: pd.DataFrame, to_tf: str) -> pd.DataFrame:
+class KlineStoreCandleSource(BaseCandleSource):
+    """
+    Live candles from the shared websocket-fed kline store (apps/bots/kline_store.py).
+
+    get_recent() only reads memory; call prepare() from async code first so
+    every (symbol, timeframe) is seeded and subscribed.
+    """
+
+    def __init__(self, store=None):
+        super().__init__()
+        if store is None:
+            bots_path = os.path.join(os.path.dirname(__file__), '..', 'bots')
+            if bots_path not in sys.path:
+                sys.path.insert(0, bots_path)
+            from kline_store import kline_store as store
+        self.store = store
+
+    async def prepare(self, pairs: Iterable[Tuple[str, str]], limit: int = 1000):
+        """Seed/subscribe all (symbol, timeframe) pairs the next cycle will read."""
+        for symbol, timeframe in set(pairs):
+            await self.store.ensure(symbol, timeframe, limit)
+
+    def get_recent(self, symbol: str, timeframe: str, limit: int = 500) -> pd.DataFrame:
         """
-        If alert condition timeframe ≠ base timeframe, convert via resample.
-        Assumes df.time is UTC and monotonic; use OHLCV resample rules.
+        Return last N candles for (symbol,timeframe) as DataFrame.
         """
+        df = self.store.snapshot(symbol, timeframe, limit)
         if df.empty:
             return df
-
-        # Ensure datetime index
-        if not isinstance(df.index, pd.DatetimeIndex):
-            df = df.copy()
-            df["time"] = pd.to_datetime(df["time"], utc=True, errors="coerce")
-            df = df.set_index("time")
-
-        rule = self._tf_to_pandas_rule(to_tf)
-        o = df["open"].resample(rule).first()
-        h = df["high"].resample(rule).max()
-        l = df["low"].resample(rule).min()
-        c = df["close"].resample(rule).last()
-        v = df["volume"].resample(rule).sum()
-        out = pd.concat([o,h,l,c,v], axis=1)
-        out.columns = ["open","high","low","close","volume"]
-        out = out.dropna(how="any")
-        out = out.reset_index().rename(columns={"index":"time"})
+        out = df[["open_time", "open", "high", "low", "close", "volume"]].rename(columns={"open_time": "time"})
+        out["time"] = out["time"].dt.tz_localize("UTC")
         return out
 
-    def _tf_to_pandas_rule(self, tf: str) -> str:
-        # very basic mapping; extend as needed
-        if tf.endswith("m"):
-            return f"{tf[:-1]}T"          # minutes
-        if tf.endswith("h"):
-            return f"{tf[:-1]}H"          # hours
-        if tf.endswith("d"):
-            return f"{tf[:-1]}D"          # days
-        if tf == "same":
-            return "1T"
-        return "1T"
+    async def close(self):
+        await self.store.stop()
+
 
-# Use test implementation for now
-CandleSource = TestCandleSource
+# Use test implementation unless live candles are requested
+if os.getenv("ALERT_CANDLE_SOURCE", "test").lower() == "binance":
+    CandleSource = KlineStoreCandleSource
+else:
+    CandleSource = TestCandleSource
@@ -1,7 +1,12 @@
-import json, httpx, asyncio, os, hmac, hashlib, time
-from typing import Dict, Any, Optional
+import json, httpx, asyncio, os, hmac, hashlib, time, heapq, itertools
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit
 from apps.api.clients.supabase_client import supabase
-from apps.api.metrics import record_webhook_failure
+from apps.api.metrics import (
+    record_webhook_failure, record_webhook_delivery, record_webhook_dropped, update_webhook_queue_depth
+)
 
 # Webhook configuration
 WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "your-webhook-secret-key")
@@ -9,6 +14,13 @@ WEBHOOK_TIMEOUT = int(os.getenv("WEBHOOK_TIMEOUT", "10"))
 WEBHOOK_MAX_RETRIES = int(os.getenv("WEBHOOK_MAX_RETRIES", "3"))
 WEBHOOK_MAX_AGE_SECONDS = int(os.getenv("WEBHOOK_MAX_AGE_SECONDS", "300"))  # 5 minutes
 
+# Dispatcher configuration
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "32"))
+WEBHOOK_PER_HOST_LIMIT = int(os.getenv("WEBHOOK_PER_HOST_LIMIT", "8"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "10000"))
+WEBHOOK_OVERFLOW_POLICY = os.getenv("WEBHOOK_OVERFLOW_POLICY", "drop_oldest")  # drop_oldest | drop_newest | spill
+WEBHOOK_SPILL_PATH = os.getenv("WEBHOOK_SPILL_PATH", "./webhook_spill.jsonl")
+
 
 def generate_webhook_signature(payload: str, timestamp: int, secret: str) -> str:
     """Generate HMAC SHA-256 signature for webhook payload."""
@@ -26,15 +38,8 @@ def generate_event_id(alert_id: str, bar_time: str) -> str:
     return f"{alert_id}:{bar_time}"
 
 
-async def send_webhook_with_retry(
-    url: str, 
-    payload: Dict[str, Any], 
-    event_id: str,
-    max_retries: int = WEBHOOK_MAX_RETRIES
-) -> bool:
-    """
-    Send webhook with HMAC signing, replay protection, and exponential backoff retry.
-    """
+def build_webhook_request(payload: Dict[str, Any], event_id: str) -> Tuple[str, Dict[str, str]]:
+    """Build the signed webhook body and headers."""
     timestamp = int(time.time())
     
     # Add event metadata to payload
@@ -54,10 +59,23 @@ async def send_webhook_with_retry(
         "X-Tradeeon-EventId": event_id,
         "User-Agent": "Tradeeon-Alerts/1.0"
     }
-    
+    return payload_str, headers
+
+
+async def send_webhook_with_retry(
+    url: str, 
+    payload: Dict[str, Any], 
+    event_id: str,
+    max_retries: int = WEBHOOK_MAX_RETRIES
+) -> bool:
+    """
+    Send webhook with HMAC signing, replay protection, and exponential backoff retry.
+    """
     last_exception = None
     
     for attempt in range(max_retries + 1):
+        # Signed per attempt so the timestamp stays within WEBHOOK_MAX_AGE_SECONDS
+        payload_str, headers = build_webhook_request(payload, event_id)
         try:
             async with httpx.AsyncClient(timeout=WEBHOOK_TIMEOUT) as client:
                 response = await client.post(url, content=payload_str, headers=headers)
@@ -95,11 +113,294 @@ async def send_webhook_with_retry(
     return False
 
 
+@dataclass
+class _WebhookJob:
+    url: str
+    payload: Dict[str, Any]  # Signed when sent, so retries and replays carry a fresh timestamp
+    event_id: str
+    submitted_at: float = field(default_factory=time.monotonic)
+    attempt: int = 0
+
+
+class WebhookDispatcher:
+    """
+    Long-lived webhook delivery service.
+    
+    - One pooled httpx.AsyncClient, so TLS sessions and connections are reused
+    - A fixed worker pool, with at most per_host_limit in-flight requests per host.
+      Jobs for a host that is at its limit wait in that host's pending list, so a
+      slow host never holds workers that other hosts' webhooks need
+    - A bounded queue; on overflow, drops the oldest or newest job, or spills it to disk
+    - Retries are parked on a timer heap instead of sleeping inside a coroutine
+    
+    Usage:
+        await webhook_dispatcher.start()
+        webhook_dispatcher.submit(url, payload, event_id)
+        await webhook_dispatcher.stop()
+    """
+    
+    def __init__(
+        self,
+        workers: int = WEBHOOK_WORKERS,
+        per_host_limit: int = WEBHOOK_PER_HOST_LIMIT,
+        queue_size: int = WEBHOOK_QUEUE_SIZE,
+        overflow_policy: str = WEBHOOK_OVERFLOW_POLICY,
+        spill_path: str = WEBHOOK_SPILL_PATH,
+        max_retries: int = WEBHOOK_MAX_RETRIES,
+        timeout: float = WEBHOOK_TIMEOUT
+    ):
+        self.workers = workers
+        self.per_host_limit = per_host_limit
+        self.overflow_policy = overflow_policy
+        self.spill_path = spill_path
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.client: Optional[httpx.AsyncClient] = None
+        self.running = False
+        self.queue_size = queue_size
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._retries: List[Tuple[float, int, _WebhookJob]] = []  # (due, seq, job) heap
+        self._retry_wakeup = asyncio.Event()
+        self._seq = itertools.count()
+        self._host_active: Dict[str, int] = {}  # host -> requests in flight
+        self._host_pending: Dict[str, deque] = {}  # host -> jobs waiting for a free slot
+        self._pending = 0
+        self._tasks: List[asyncio.Task] = []
+        self._latencies: deque = deque(maxlen=1000)
+        self.stats = {"submitted": 0, "delivered": 0, "failed": 0, "retried": 0, "dropped": 0, "spilled": 0}
+    
+    async def start(self):
+        """Start workers and the retry scheduler (idempotent); replays spilled jobs."""
+        if self.running:
+            return
+        self.running = True
+        self.client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers)
+        )
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._retry_scheduler()))
+        self._replay_spill()
+        print(f"Webhook dispatcher started ({self.workers} workers, {self.per_host_limit} per host)")
+    
+    async def stop(self, drain_timeout: float = 10.0):
+        """Deliver what is queued (up to drain_timeout), spill the rest and close the client."""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"Webhook dispatcher drain timed out with {self._queue.qsize()} queued")
+        self.running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        
+        leftover = [job for _, _, job in self._retries]
+        self._retries.clear()
+        while not self._queue.empty():
+            leftover.append(self._queue.get_nowait())
+            self._queue.task_done()
+        for pending in self._host_pending.values():
+            for job in pending:
+                leftover.append(job)
+                self._queue.task_done()
+        self._host_pending.clear()
+        self._host_active.clear()
+        self._pending = 0
+        for job in leftover:
+            self._overflow(job, "shutdown")
+        
+        await self.client.aclose()
+        self.client = None
+        self._update_depth()
+    
+    def submit(self, url: str, payload: Dict[str, Any], event_id: str) -> bool:
+        """Queue a webhook; never blocks. Returns False if it was dropped or spilled."""
+        self.stats["submitted"] += 1
+        return self._enqueue(_WebhookJob(url, payload, event_id))
+    
+    def latency_percentiles(self) -> Dict[str, float]:
+        """p50/p99 delivery latency (seconds) over the last 1000 deliveries."""
+        if not self._latencies:
+            return {"p50": 0.0, "p99": 0.0}
+        samples = sorted(self._latencies)
+        return {
+            "p50": samples[int(0.50 * (len(samples) - 1))],
+            "p99": samples[int(0.99 * (len(samples) - 1))]
+        }
+    
+    def _enqueue(self, job: _WebhookJob) -> bool:
+        # Jobs parked for a busy host count toward the bound
+        if self._queue.qsize() + self._pending < self.queue_size:
+            self._queue.put_nowait(job)
+            self._update_depth()
+            return True
+        
+        if self.overflow_policy == "drop_oldest":
+            oldest = self._queue.get_nowait() if not self._queue.empty() else self._pop_oldest_pending()
+            self._queue.task_done()
+            self._queue.put_nowait(job)
+            self._overflow(oldest, "queue_full", spill=False)
+            return True
+        self._overflow(job, "queue_full")
+        return False
+    
+    def _overflow(self, job: _WebhookJob, reason: str, spill: Optional[bool] = None):
+        """Spill (policy 'spill', or on shutdown when a spill path is set) or drop a job."""
+        if spill is None:
+            spill = self.overflow_policy == "spill" or (reason == "shutdown" and bool(self.spill_path))
+        if spill and self.spill_path:
+            try:
+                line = json.dumps({"url": job.url, "payload": job.payload,
+                                   "event_id": job.event_id, "attempt": job.attempt})
+                with open(self.spill_path, "a") as f:
+                    f.write(line + "\n")
+                self.stats["spilled"] += 1
+                record_webhook_dropped(f"spilled_{reason}")
+                return
+            except (OSError, TypeError, ValueError) as e:
+                # Unwritable file, or a payload JSON cannot encode
+                print(f"Failed to spill webhook {job.event_id}: {e}")
+        self.stats["dropped"] += 1
+        record_webhook_dropped(reason)
+        print(f"Webhook dropped ({reason}): {job.event_id} -> {job.url}")
+    
+    def _replay_spill(self):
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        try:
+            with open(self.spill_path) as f:
+                lines = f.readlines()
+            os.remove(self.spill_path)
+        except OSError as e:
+            print(f"Failed to read webhook spill file: {e}")
+            return
+        for line in lines:
+            try:
+                data = json.loads(line)
+                self._enqueue(_WebhookJob(data["url"], data["payload"], data["event_id"],
+                                          attempt=data.get("attempt", 0)))
+            except (ValueError, KeyError, TypeError):
+                continue
+        if lines:
+            print(f"Replayed {len(lines)} spilled webhooks")
+    
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            host = urlsplit(job.url).netloc
+            active = self._host_active.get(host, 0)
+            if active >= self.per_host_limit:
+                # Host at its limit: park the job and serve other hosts meanwhile
+                self._host_pending.setdefault(host, deque()).append(job)
+                self._pending += 1
+                self._update_depth()
+                continue
+            self._host_active[host] = active + 1
+            try:
+                # Keep the host slot while that host has jobs waiting for one
+                while job is not None:
+                    try:
+                        await self._deliver(job)
+                    except Exception as e:
+                        print(f"Webhook worker error for {job.event_id}: {e}")
+                    finally:
+                        self._queue.task_done()
+                        self._update_depth()
+                    job = self._next_pending(host)
+            finally:
+                self._host_active[host] -= 1
+                if not self._host_active[host]:
+                    del self._host_active[host]
+    
+    def _next_pending(self, host: str) -> Optional[_WebhookJob]:
+        pending = self._host_pending.get(host)
+        if not pending:
+            return None
+        job = pending.popleft()
+        if not pending:
+            del self._host_pending[host]
+        self._pending -= 1
+        return job
+    
+    def _pop_oldest_pending(self) -> _WebhookJob:
+        host = min(self._host_pending, key=lambda h: self._host_pending[h][0].submitted_at)
+        return self._next_pending(host)
+    
+    async def _deliver(self, job: _WebhookJob):
+        error = None
+        retry = True
+        try:
+            body, headers = build_webhook_request(job.payload, job.event_id)
+            response = await self.client.post(job.url, content=body, headers=headers)
+            if response.status_code == 410:  # Gone - request too old
+                self._finish(job, "rejected")
+                return
+            response.raise_for_status()
+            self._finish(job, "delivered")
+            return
+        except httpx.TimeoutException:
+            error = f"Timeout after {self.timeout}s"
+            record_webhook_failure(job.url, "timeout")
+        except httpx.HTTPStatusError as e:
+            error = f"HTTP {e.response.status_code}"
+            record_webhook_failure(job.url, f"http_{e.response.status_code}")
+            retry = e.response.status_code not in [410, 429]  # Too old or rate limited
+        except Exception as e:
+            error = str(e)
+            record_webhook_failure(job.url, "exception")
+        
+        if retry and job.attempt < self.max_retries:
+            # Exponential backoff: 1s, 2s, 4s - parked on the timer heap
+            delay = 2 ** job.attempt
+            job.attempt += 1
+            heapq.heappush(self._retries, (time.monotonic() + delay, next(self._seq), job))
+            self._retry_wakeup.set()
+            self.stats["retried"] += 1
+            return
+        print(f"Webhook failed after {job.attempt + 1} attempts: {error}")
+        self._finish(job, "failed")
+    
+    def _finish(self, job: _WebhookJob, outcome: str):
+        latency = time.monotonic() - job.submitted_at
+        self.stats["delivered" if outcome == "delivered" else "failed"] += 1
+        if outcome == "delivered":
+            self._latencies.append(latency)
+        record_webhook_delivery(outcome, latency)
+    
+    async def _retry_scheduler(self):
+        """Move due retries back onto the work queue."""
+        while True:
+            self._retry_wakeup.clear()
+            now = time.monotonic()
+            while self._retries and self._retries[0][0] <= now:
+                _, _, job = heapq.heappop(self._retries)
+                self._enqueue(job)
+            timeout = self._retries[0][0] - now if self._retries else None
+            try:
+                await asyncio.wait_for(self._retry_wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+    
+    def _update_depth(self):
+        update_webhook_queue_depth(self._queue.qsize() + self._pending, len(self._retries))
+
+
+# Shared dispatcher; started by the alert runner
+webhook_dispatcher = WebhookDispatcher()
+
+
 async def send_webhook(url: str, payload: Dict[str, Any], alert_id: str, bar_time: str):
     """
     Legacy function for backward compatibility.
+    
+    Uses the shared dispatcher when it is running, otherwise sends inline.
     """
     event_id = generate_event_id(alert_id, bar_time)
+    if webhook_dispatcher.running:
+        return webhook_dispatcher.submit(url, payload, event_id)
     return await send_webhook_with_retry(url, payload, event_id)
 
 
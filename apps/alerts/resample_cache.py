@@ -0,0 +1,156 @@
+"""
+Incremental resampling of base candles into higher timeframes.
+
+A full pandas ``resample`` of the whole base window on every poll costs O(n)
+per alert condition. ResampleCache keeps the aggregated higher-timeframe bars
+per (symbol, base_tf, target_tf). On each call it only re-aggregates the
+still-forming bucket and any buckets opened by new base bars. The returned
+frame wraps the cached arrays without copying them.
+
+Buckets are aligned to the UTC epoch, the same as pandas' default ``start_day``
+origin for rules that divide a day. Any other rule returns None, and the
+caller falls back to a full resample.
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+_NS_PER_DAY = 86_400_000_000_000
+
+# Column order of the aggregated value buffer
+VALUE_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+
+class _ResampledSeries:
+    """Aggregated buckets for one (symbol, base_tf, target_tf)."""
+
+    def __init__(self, bucket_ns: int, capacity: int):
+        self.bucket_ns = bucket_ns
+        self.times = np.empty(capacity, dtype="int64")  # bucket start, ns since epoch
+        self.values = np.empty((capacity, len(VALUE_COLUMNS)), dtype=float)
+        self.n = 0
+        self.last_base_time: Optional[int] = None
+
+    def update(self, base_times: np.ndarray, base_values: np.ndarray) -> bool:
+        """
+        Fold the base window into the buckets.
+
+        Returns False when the window does not continue the cached series
+        (first call, gap larger than the window, or rewritten history).
+        """
+        if self.last_base_time is None:
+            start = 0
+        else:
+            pos = int(np.searchsorted(base_times, self.last_base_time))
+            if pos >= len(base_times) or base_times[pos] != self.last_base_time:
+                return False
+            start = pos
+
+        # Re-aggregate from the start of the bucket the last seen base bar was in
+        first_bucket = base_times[start] - base_times[start] % self.bucket_ns
+        start = int(np.searchsorted(base_times, first_bucket))
+        keep = int(np.searchsorted(self.times[:self.n], first_bucket))
+
+        times = base_times[start:]
+        values = base_values[start:]
+        buckets = times - times % self.bucket_ns
+        edges = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[edges[1:], len(times)] - 1
+
+        new_n = keep + len(edges)
+        self._reserve(new_n)
+        out = self.values[keep:new_n]
+        self.times[keep:new_n] = buckets[edges]
+        out[:, 0] = values[edges, 0]
+        out[:, 1] = np.maximum.reduceat(values[:, 1], edges)
+        out[:, 2] = np.minimum.reduceat(values[:, 2], edges)
+        out[:, 3] = values[ends, 3]
+        out[:, 4] = np.add.reduceat(values[:, 4], edges)
+        self.n = new_n
+        self.last_base_time = int(base_times[-1])
+        return True
+
+    def _reserve(self, size: int):
+        if size <= len(self.times):
+            return
+        capacity = max(size, 2 * len(self.times))
+        times = np.empty(capacity, dtype="int64")
+        values = np.empty((capacity, len(VALUE_COLUMNS)), dtype=float)
+        times[:self.n] = self.times[:self.n]
+        values[:self.n] = self.values[:self.n]
+        self.times, self.values = times, values
+
+    def trim(self, keep: int):
+        """Drop all but the last `keep` buckets."""
+        if self.n <= keep:
+            return
+        drop = self.n - keep
+        self.times[:keep] = self.times[drop:self.n]
+        self.values[:keep] = self.values[drop:self.n]
+        self.n = keep
+
+    def frame(self, since: int) -> pd.DataFrame:
+        """
+        Buckets starting at or after `since` (ns), as a frame over the cached arrays.
+
+        The frame shares memory with the cache and is only valid until the
+        next update; copy it before mutating or keeping it around.
+        """
+        first = int(np.searchsorted(self.times[:self.n], since))
+        values = self.values[first:self.n]
+        out = pd.DataFrame(values, columns=VALUE_COLUMNS, copy=False)
+        out.insert(0, "time", pd.to_datetime(self.times[first:self.n], utc=True))
+        return out
+
+
+class ResampleCache:
+    """
+    Cache of resampled bars keyed by (symbol, base_tf, target_tf).
+
+    Usage:
+        cache = ResampleCache()
+        df_5m = cache.resample("BTCUSDT", "1m", "5m", base_df, pd.Timedelta("5min"))
+    """
+
+    def __init__(self):
+        self._series: Dict[Tuple[str, str, str], _ResampledSeries] = {}
+        self.stats = {"incremental": 0, "rebuilds": 0}
+
+    def resample(
+        self,
+        symbol: str,
+        base_tf: str,
+        target_tf: str,
+        df: pd.DataFrame,
+        bucket: pd.Timedelta
+    ) -> Optional[pd.DataFrame]:
+        """
+        Resample df (columns time/open/high/low/close/volume, ordered by time).
+
+        Returns None if the bucket size is not supported incrementally.
+        """
+        bucket_ns = int(bucket.value)
+        if bucket_ns <= 0 or _NS_PER_DAY % bucket_ns != 0:
+            return None
+
+        times = pd.to_datetime(df["time"], utc=True).to_numpy(dtype="datetime64[ns]").view("int64")
+        values = df[VALUE_COLUMNS].to_numpy(dtype=float)
+
+        key = (symbol, base_tf, target_tf)
+        series = self._series.get(key)
+        if series is None or series.bucket_ns != bucket_ns or not series.update(times, values):
+            series = self._series[key] = _ResampledSeries(bucket_ns, capacity=len(df) + 1)
+            series.update(times, values)
+            self.stats["rebuilds"] += 1
+        else:
+            self.stats["incremental"] += 1
+
+        # Bound memory to what the window can cover
+        series.trim(len(df) + 1)
+        return series.frame(since=times[0] - times[0] % bucket_ns)
+
+    def evict(self, symbol: str):
+        for key in [k for k in self._series if k[0] == symbol]:
+            del self._series[key]
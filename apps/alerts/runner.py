@@ -1,9 +1,13 @@
 import asyncio, os, math, time, logging
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from apps.alerts.datasource import CandleSource
 from apps.alerts.alert_manager import AlertManager
-from apps.alerts import dispatch
-from apps.api.metrics import record_alert_evaluation, record_alert_trigger, runner_loop_seconds
+from apps.alerts.alert_cache import AlertCache
+from apps.alerts import dispatch, state
+from apps.api.metrics import (
+    record_alert_evaluation, record_alert_trigger, record_runner_cycle, record_runner_group_deferred,
+    runner_loop_seconds
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,26 +15,86 @@ logger = logging.getLogger(__name__)
 
 POLL_MS = int(os.getenv("ALERT_RUNNER_POLL_MS", "1000"))
 MAX_PER_SYMBOL = int(os.getenv("ALERT_MAX_ALERTS_PER_SYMBOL","200"))
+BUDGET_MS = int(os.getenv("ALERT_RUNNER_BUDGET_MS", str(int(POLL_MS * 0.8))))  # Evaluation time per cycle before deferring groups
+MAX_DEFER_CYCLES = int(os.getenv("ALERT_RUNNER_MAX_DEFER_CYCLES", "5"))
+SLOW_EVAL_MS = int(os.getenv("ALERT_SLOW_EVAL_MS", "200"))
+WORKERS = int(os.getenv("ALERT_RUNNER_WORKERS", "1"))  # >1 runs sharded worker processes (supervisor.py)
 
-async def run_once(manager: AlertManager):
+# Alert actions still in flight; awaited on shutdown so none are lost
+_pending_actions: set = set()
+
+# Consecutive cycles each (symbol, base_timeframe) group was deferred for
+_deferred_cycles: Dict[Tuple[str, str], int] = {}
+
+def _tf_seconds(tf: str) -> int:
+    units = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+    try:
+        return int(tf[:-1]) * units[tf[-1]]
+    except (KeyError, ValueError, IndexError):
+        return 86400
+
+def _fire_rank(alert: dict) -> int:
+    return 0 if alert.get("fireMode") == "per_tick" else 1
+
+def _schedule(groups: Dict[Tuple[str, str], List[dict]]) -> List[Tuple[str, str]]:
+    """
+    Evaluation order for (symbol, base_timeframe) groups.
+
+    Groups deferred MAX_DEFER_CYCLES times in a row go first so they can't starve,
+    then shorter timeframes, then groups with per_tick alerts.
+    """
+    def priority(key):
+        starved = _deferred_cycles.get(key, 0) >= MAX_DEFER_CYCLES
+        return (not starved, _tf_seconds(key[1]), min(_fire_rank(a) for a in groups[key]))
+    return sorted(groups, key=priority)
+
+async def run_once(manager: AlertManager, budget_seconds: Optional[float] = None):
     loop_start = time.time()
+    # Condition states buffered by earlier cycles must reach a shared
+    # backend even when no further state changes trigger a write
+    try:
+        state.flush_if_due()
+    except Exception as e:
+        logger.warning(f"Failed to flush alert condition states: {e}")
     alerts = manager.fetch_active_alerts()
     if not alerts:
         return
 
-    # Batch by symbol for efficiency
-    by_symbol: Dict[str, List[dict]] = {}
+    # Live candle sources seed/subscribe once, then serve from memory
+    if hasattr(manager.src, "prepare"):
+        await manager.src.prepare((a["symbol"], a["base_timeframe"]) for a in alerts)
+
+    # Alerts sharing a symbol and base timeframe share frames and indicator
+    # columns (see AlertManager.evaluate_alert), so a group is the unit of scheduling
+    groups: Dict[Tuple[str, str], List[dict]] = {}
+    per_symbol: Dict[str, int] = {}
     for a in alerts:
-        by_symbol.setdefault(a["symbol"], []).append(a)
+        if per_symbol.get(a["symbol"], 0) >= MAX_PER_SYMBOL:
+            continue  # safety
+        per_symbol[a["symbol"]] = per_symbol.get(a["symbol"], 0) + 1
+        groups.setdefault((a["symbol"], a["base_timeframe"]), []).append(a)
+
+    for key in [k for k in _deferred_cycles if k not in groups]:
+        del _deferred_cycles[key]
+
+    budget = BUDGET_MS / 1000 if budget_seconds is None else budget_seconds
+    deferred = 0
+    for key in _schedule(groups):
+        symbol, base_tf = key
+        # Over budget: put off low-priority groups to the next cycle
+        if time.time() - loop_start > budget and _deferred_cycles.get(key, 0) < MAX_DEFER_CYCLES:
+            _deferred_cycles[key] = _deferred_cycles.get(key, 0) + 1
+            record_runner_group_deferred(base_tf)
+            deferred += 1
+            continue
+        _deferred_cycles.pop(key, None)
 
-    for symbol, arr in by_symbol.items():
-        symbol_start = time.time()
-        if len(arr) > MAX_PER_SYMBOL:
-            arr = arr[:MAX_PER_SYMBOL]  # safety
-        for alert in arr:
+        group_start = time.time()
+        group_cache: dict = {}
+        for alert in sorted(groups[key], key=_fire_rank):
             start_time = time.time()
             try:
-                payload = manager.evaluate_alert(alert)
+                payload = manager.evaluate_alert(alert, group_cache)
                 evaluation_time = time.time() - start_time
                 
                 # Record metrics
@@ -42,7 +106,7 @@ async def run_once(manager: AlertManager):
                 )
                 
                 # Log slow evaluations
-                if evaluation_time > 0.2:  # 200ms threshold
+                if evaluation_time > SLOW_EVAL_MS / 1000:
                     logger.warning(
                         f"Slow alert evaluation: {evaluation_time:.3f}s",
                         extra={
@@ -53,7 +117,9 @@ async def run_once(manager: AlertManager):
                         }
                     )
                 
-                if payload:
+                # Atomic claim on the bar: with a shared state backend only one
+                # runner process fires it
+                if payload and manager.claim_fire(alert, payload):
                     logger.info(
                         f"Alert triggered: {alert.get('alert_id')}",
                         extra={
@@ -76,7 +142,9 @@ async def run_once(manager: AlertManager):
                     
                     manager.log_and_dispatch(alert, payload)
                     # Fire side-effects async using unified dispatcher
-                    asyncio.create_task(dispatch.dispatch_alert_action(alert, payload["snapshot"]))
+                    task = asyncio.create_task(dispatch.dispatch_alert_action(alert, payload["snapshot"]))
+                    _pending_actions.add(task)
+                    task.add_done_callback(_pending_actions.discard)
             except Exception as e:
                 logger.error(
                     f"Error evaluating alert: {e}",
@@ -88,20 +156,49 @@ async def run_once(manager: AlertManager):
                     }
                 )
         
-        # Record symbol processing time
-        symbol_duration = time.time() - symbol_start
-        runner_loop_seconds.labels(symbol=symbol).observe(symbol_duration)
-    
+        # Record group processing time
+        group_duration = time.time() - group_start
+        runner_loop_seconds.labels(symbol=symbol).observe(group_duration)
+
+    if deferred:
+        logger.warning(f"Alert cycle over its {budget:.3f}s budget, deferred {deferred} of {len(groups)} groups")
+
     # Record total loop time
     loop_duration = time.time() - loop_start
     runner_loop_seconds.labels(symbol="total").observe(loop_duration)
 
 async def main():
     src = CandleSource()
-    manager = AlertManager(src)
-    while True:
-        await run_once(manager)
-        await asyncio.sleep(POLL_MS / 1000)
+    manager = AlertManager(src, AlertCache())
+    await dispatch.webhook_dispatcher.start()
+    interval = POLL_MS / 1000
+    next_cycle = time.monotonic()
+    try:
+        while True:
+            # Fixed-rate schedule: a slow cycle shows up as lag on the next one
+            # instead of silently stretching the polling interval
+            started = time.monotonic()
+            lag = max(0.0, started - next_cycle)
+            next_cycle = max(next_cycle, started) + interval
+            await run_once(manager)
+            overran = time.monotonic() > next_cycle
+            record_runner_cycle(lag, overran)
+            if overran:
+                logger.warning(f"Alert cycle overran its {interval:.3f}s deadline by {time.monotonic() - next_cycle:.3f}s")
+            await asyncio.sleep(max(0.0, next_cycle - time.monotonic()))
+    finally:
+        await shutdown()
+
+async def shutdown():
+    """Wait for in-flight alert actions, then flush state and pending webhooks."""
+    if _pending_actions:
+        await asyncio.gather(*_pending_actions, return_exceptions=True)
+    state.flush()
+    await dispatch.webhook_dispatcher.stop()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if WORKERS > 1:
+        from apps.alerts.supervisor import ShardSupervisor
+        ShardSupervisor(WORKERS).run()
+    else:
+        asyncio.run(main())
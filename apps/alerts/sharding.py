@@ -0,0 +1,59 @@
+"""
+Consistent hashing of (symbol, timeframe) groups onto runner shards.
+
+Alerts for one symbol and base timeframe share frames and indicator columns,
+so a group is the unit of ownership. With consistent hashing, removing a
+shard only moves that shard's groups and adding it back only moves them back.
+"""
+
+import bisect
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes.
+
+    Usage:
+        ring = HashRing([0, 1, 2])
+        shard = ring.node_for(("BTCUSDT", "1m"))
+    """
+
+    def __init__(self, nodes: Iterable[int] = (), replicas: int = 64):
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: Dict[int, int] = {}
+        self.nodes: set = set()
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: int):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.replicas):
+            point = _hash(f"{node}:{i}")
+            self._owners[point] = node
+            bisect.insort(self._points, point)
+
+    def remove(self, node: int):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        for i in range(self.replicas):
+            point = _hash(f"{node}:{i}")
+            if self._owners.get(point) == node:
+                del self._owners[point]
+                self._points.remove(point)
+
+    def node_for(self, key: Tuple[str, str]) -> Optional[int]:
+        """Shard owning the (symbol, timeframe) group, or None if the ring is empty."""
+        if not self._points:
+            return None
+        idx = bisect.bisect(self._points, _hash("|".join(key))) % len(self._points)
+        return self._owners[self._points[idx]]
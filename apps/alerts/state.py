@@ -1,31 +1,373 @@
-from typing import Dict, Tuple, Any
-from collections import defaultdict
+"""
+Alert runner state: last fired bar per alert, playbook condition states and
+the per-bar indicator memo.
 
-# last fired bar-time per alert
-_last_fired: Dict[str, Any] = {}
-# memo for computed indicators per (symbol, timeframe, bar_key) to avoid recompute
-_indicator_memo: Dict[Tuple[str,str,str], dict] = defaultdict(dict)
-# condition states for playbook validity duration tracking {alert_id: {condition_id: {triggered_at, valid_until}}}
-_condition_states: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+State lives in a StateStore with two tiers:
+
+- An in-process LRU (bounded; memo entries also expire after a TTL)
+- A shared backend selected by ALERT_STATE_BACKEND: "memory" (default,
+  process-local), "sqlite" (ALERT_STATE_SQLITE_PATH) or "redis" (REDIS_URL)
+
+Last-fired updates go through an atomic compare-and-set on the backend, so
+several runner processes sharing a backend never fire the same bar twice.
+Condition state writes are buffered and written in batches: when
+ALERT_STATE_WRITE_BATCH_SIZE states are dirty, when a write comes in after
+ALERT_STATE_WRITE_BATCH_MS, and on every runner cycle via flush_if_due().
+The indicator memo only holds derived data and is never persisted.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple, Any, Optional
+
+import pandas as pd
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+STATE_BACKEND = os.getenv("ALERT_STATE_BACKEND", "memory").lower()
+SQLITE_PATH = os.getenv("ALERT_STATE_SQLITE_PATH", "./alert_state.db")
+LRU_SIZE = int(os.getenv("ALERT_STATE_LRU_SIZE", "50000"))
+MEMO_TTL_SECONDS = int(os.getenv("ALERT_STATE_MEMO_TTL_SECONDS", "900"))
+MEMO_MAX_ENTRIES = int(os.getenv("ALERT_STATE_MEMO_MAX_ENTRIES", "2000"))
+WRITE_BATCH_MS = int(os.getenv("ALERT_STATE_WRITE_BATCH_MS", "500"))
+WRITE_BATCH_SIZE = int(os.getenv("ALERT_STATE_WRITE_BATCH_SIZE", "500"))
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded mapping with least-recently-used eviction and an optional TTL."""
+
+    def __init__(self, max_size: int, ttl_seconds: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self._data: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        stored_at, value = item
+        if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def keys(self):
+        return list(self._data.keys())
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class MemoryStateBackend:
+    """Process-local backend (single runner), bounded like the LRU tier."""
+
+    def __init__(self, max_size: int = LRU_SIZE):
+        self._last_fired = LRUCache(max_size)
+        self._condition_states = LRUCache(max_size)
+        self._lock = threading.Lock()
+
+    def get_last_fired(self, alert_id: str):
+        return self._last_fired.get(alert_id)
+
+    def set_last_fired(self, alert_id: str, bar_time):
+        self._last_fired.set(alert_id, bar_time)
+
+    def compare_and_set_last_fired(self, alert_id: str, expected, new) -> bool:
+        with self._lock:
+            if self._last_fired.get(alert_id) != expected:
+                return False
+            self._last_fired.set(alert_id, new)
+            return True
+
+    def get_condition_states(self, alert_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        return self._condition_states.get(alert_id)
+
+    def set_condition_states_many(self, states: Dict[str, Dict[str, Dict[str, Any]]]):
+        for alert_id, value in states.items():
+            self._condition_states.set(alert_id, value)
+
+
+class SQLiteStateBackend:
+    """SQLite file shared by runner processes on one host."""
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS last_fired (alert_id TEXT PRIMARY KEY, bar_time TEXT)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS condition_states (alert_id TEXT PRIMARY KEY, states TEXT)")
+        self._lock = threading.Lock()
+
+    def get_last_fired(self, alert_id: str):
+        row = self._conn.execute("SELECT bar_time FROM last_fired WHERE alert_id = ?", (alert_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_last_fired(self, alert_id: str, bar_time):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO last_fired (alert_id, bar_time) VALUES (?, ?) "
+                "ON CONFLICT(alert_id) DO UPDATE SET bar_time = excluded.bar_time",
+                (alert_id, _to_text(bar_time))
+            )
+
+    def compare_and_set_last_fired(self, alert_id: str, expected, new) -> bool:
+        with self._lock:
+            if expected is None:
+                cur = self._conn.execute(
+                    "INSERT OR IGNORE INTO last_fired (alert_id, bar_time) VALUES (?, ?)",
+                    (alert_id, _to_text(new))
+                )
+            else:
+                cur = self._conn.execute(
+                    "UPDATE last_fired SET bar_time = ? WHERE alert_id = ? AND bar_time = ?",
+                    (_to_text(new), alert_id, _to_text(expected))
+                )
+            return cur.rowcount == 1
+
+    def get_condition_states(self, alert_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        row = self._conn.execute("SELECT states FROM condition_states WHERE alert_id = ?", (alert_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_condition_states_many(self, states: Dict[str, Dict[str, Dict[str, Any]]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO condition_states (alert_id, states) VALUES (?, ?) "
+                "ON CONFLICT(alert_id) DO UPDATE SET states = excluded.states",
+                [(alert_id, json.dumps(value, default=str)) for alert_id, value in states.items()]
+            )
+
+
+class RedisStateBackend:
+    """Redis backend shared by runner processes across hosts."""
+
+    # Set KEYS[1] to ARGV[2] only if it currently equals ARGV[1] ("" = missing)
+    _CAS_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if (current == false and ARGV[1] == '') or current == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+    def __init__(self, redis_url: Optional[str] = None, prefix: str = "alerts:state"):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("redis package not installed")
+        self.client = redis.from_url(redis_url or os.getenv("REDIS_URL", "redis://localhost:6379"), decode_responses=True)
+        self.prefix = prefix
+        self._cas = self.client.register_script(self._CAS_SCRIPT)
+
+    def _key(self, kind: str, alert_id: str) -> str:
+        return f"{self.prefix}:{kind}:{alert_id}"
+
+    def get_last_fired(self, alert_id: str):
+        return self.client.get(self._key("last_fired", alert_id))
+
+    def set_last_fired(self, alert_id: str, bar_time):
+        self.client.set(self._key("last_fired", alert_id), _to_text(bar_time))
+
+    def compare_and_set_last_fired(self, alert_id: str, expected, new) -> bool:
+        key = self._key("last_fired", alert_id)
+        expected_text = "" if expected is None else _to_text(expected)
+        return bool(self._cas(keys=[key], args=[expected_text, _to_text(new)]))
+
+    def get_condition_states(self, alert_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        value = self.client.get(self._key("condition_states", alert_id))
+        return json.loads(value) if value else None
+
+    def set_condition_states_many(self, states: Dict[str, Dict[str, Dict[str, Any]]]):
+        pipe = self.client.pipeline(transaction=False)
+        for alert_id, value in states.items():
+            pipe.set(self._key("condition_states", alert_id), json.dumps(value, default=str))
+        pipe.execute()
+
+
+def _to_text(value) -> str:
+    return value if isinstance(value, str) else str(value)
+
+
+class StateStore:
+    """LRU tier over a state backend, with batched condition state writes."""
+
+    def __init__(
+        self,
+        backend=None,
+        lru_size: int = LRU_SIZE,
+        memo_ttl_seconds: float = MEMO_TTL_SECONDS,
+        memo_max_entries: int = MEMO_MAX_ENTRIES,
+        write_batch_ms: int = WRITE_BATCH_MS,
+        write_batch_size: int = WRITE_BATCH_SIZE
+    ):
+        self.backend = backend or MemoryStateBackend()
+        self._last_fired = LRUCache(lru_size)
+        self._condition_states = LRUCache(lru_size)
+        # memo for computed indicators per (symbol, timeframe, bar_key) to avoid recompute
+        self._indicator_memo = LRUCache(memo_max_entries, ttl_seconds=memo_ttl_seconds)
+        self._dirty_states: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._write_interval = write_batch_ms / 1000
+        self._write_batch_size = write_batch_size
+        self._last_write = time.monotonic()
+
+    # last fired bar-time per alert
+    def get_last_fired(self, alert_id: str):
+        value = self._last_fired.get(alert_id, _MISSING)
+        if value is _MISSING:
+            value = self.backend.get_last_fired(alert_id)
+            self._last_fired.set(alert_id, value)
+        return value
+
+    def set_last_fired(self, alert_id: str, bar_time):
+        self.backend.set_last_fired(alert_id, bar_time)
+        self._last_fired.set(alert_id, bar_time)
+
+    def compare_and_set_last_fired(self, alert_id: str, expected, new) -> bool:
+        ok = self.backend.compare_and_set_last_fired(alert_id, expected, new)
+        if ok:
+            self._last_fired.set(alert_id, new)
+        else:
+            self._last_fired.pop(alert_id)  # Someone else won; re-read next time
+        return ok
+
+    def claim_last_fired(self, alert_id: str, bar_time) -> bool:
+        """
+        Atomically record bar_time as fired if it is newer than the last fired bar.
+
+        Returns False if this bar (or a later one) was already fired, by this
+        or another runner.
+        """
+        bar_time = _to_text(bar_time)
+        for _ in range(3):
+            current = self.backend.get_last_fired(alert_id)
+            if current is not None and pd.to_datetime(current) >= pd.to_datetime(bar_time):
+                self._last_fired.set(alert_id, current)
+                return False
+            if self.compare_and_set_last_fired(alert_id, current, bar_time):
+                return True
+        return False
+
+    # condition states for playbook validity duration tracking {alert_id: {condition_id: {triggered_at, valid_until}}}
+    def get_condition_states(self, alert_id: str) -> Dict[str, Dict[str, Any]]:
+        value = self._condition_states.get(alert_id, _MISSING)
+        if value is _MISSING:
+            value = self._dirty_states.get(alert_id)
+            if value is None:
+                value = self.backend.get_condition_states(alert_id) or {}
+            self._condition_states.set(alert_id, value)
+        return value
+
+    def set_condition_states(self, alert_id: str, states: Dict[str, Dict[str, Any]]):
+        self._condition_states.set(alert_id, states)
+        self._dirty_states[alert_id] = states
+        if len(self._dirty_states) >= self._write_batch_size or self._write_due():
+            self.flush()
+
+    def _write_due(self) -> bool:
+        return time.monotonic() - self._last_write >= self._write_interval
+
+    def flush_if_due(self):
+        """Flush buffered condition states once the write interval has passed."""
+        if self._dirty_states and self._write_due():
+            self.flush()
+
+    def flush(self):
+        """Write buffered condition states to the backend."""
+        self._last_write = time.monotonic()
+        if not self._dirty_states:
+            return
+        dirty, self._dirty_states = self._dirty_states, {}
+        try:
+            self.backend.set_condition_states_many(dirty)
+        except Exception:
+            # Keep newer writes, retry the rest on the next flush
+            self._dirty_states = {**dirty, **self._dirty_states}
+            raise
+
+    def get_indicator_memo(self, key: Tuple[str,str,str]):
+        return self._indicator_memo.get(key)
+
+    def set_indicator_memo(self, key: Tuple[str,str,str], val: dict):
+        self._indicator_memo.set(key, val)
+
+    def prune_indicator_memo(self, key: Tuple[str,str,str]):
+        symbol, timeframe, bar_key = key
+        for stale in [k for k in self._indicator_memo.keys() if k[0] == symbol and k[1] == timeframe and k[2] != bar_key]:
+            self._indicator_memo.pop(stale)
+
+
+def create_state_store(backend: str = STATE_BACKEND) -> StateStore:
+    """Build the store for a backend name (default: ALERT_STATE_BACKEND)."""
+    if backend == "sqlite":
+        return StateStore(SQLiteStateBackend(SQLITE_PATH))
+    if backend == "redis":
+        return StateStore(RedisStateBackend())
+    return StateStore(MemoryStateBackend())
+
+
+_store = create_state_store()
+
+def get_store() -> StateStore:
+    return _store
+
+def set_store(store: StateStore):
+    global _store
+    _store = store
 
 def get_last_fired(alert_id: str):
-    return _last_fired.get(alert_id)
+    return _store.get_last_fired(alert_id)
 
 def set_last_fired(alert_id: str, bar_time):
-    _last_fired[alert_id] = bar_time
+    _store.set_last_fired(alert_id, bar_time)
+
+def claim_last_fired(alert_id: str, bar_time) -> bool:
+    """Atomically mark bar_time as fired; False if it or a later bar already was"""
+    return _store.claim_last_fired(alert_id, bar_time)
 
 def get_indicator_memo(key: Tuple[str,str,str]):
-    return _indicator_memo.get(key)
+    return _store.get_indicator_memo(key)
 
 def get_condition_states(alert_id: str) -> Dict[str, Dict[str, Any]]:
     """Get condition states for an alert (for validity duration tracking)"""
-    return _condition_states.get(alert_id, {})
+    return _store.get_condition_states(alert_id)
 
 def set_condition_states(alert_id: str, states: Dict[str, Dict[str, Any]]):
     """Set condition states for an alert (for validity duration tracking)"""
-    _condition_states[alert_id] = states
+    _store.set_condition_states(alert_id, states)
 
 def set_indicator_memo(key: Tuple[str,str,str], val: dict):
-    _indicator_memo[key] = val
+    _store.set_indicator_memo(key, val)
+
+def prune_indicator_memo(key: Tuple[str,str,str]):
+    """Drop memo entries for the same (symbol, timeframe) from older bars"""
+    _store.prune_indicator_memo(key)
 
+def flush():
+    """Write buffered state to the backend"""
+    _store.flush()
 
+def flush_if_due():
+    """Write buffered state to the backend if the write interval has passed"""
+    _store.flush_if_due()
@@ -0,0 +1,294 @@
+"""
+Sharded alert runner: one supervisor process and N worker processes.
+
+runner.py evaluates every alert in one asyncio loop. The pandas work is
+CPU-bound, so a single core caps alert throughput. With ALERT_RUNNER_WORKERS
+> 1 the runner starts this supervisor instead:
+
+- The supervisor polls the alerts table once (AlertCache) and assigns each
+  (symbol, base_timeframe) group to a worker using a consistent hash ring.
+- Each worker receives alert-set updates for its shard over its own local
+  queue. It runs the normal run_once loop, so it only fetches candles for
+  its own symbols.
+- Workers report loop time and schedule lag on a shared status queue. The
+  supervisor records them as per-shard metrics.
+- When a worker dies or stops reporting, its shard leaves the ring and its
+  groups move to the surviving workers. The worker is restarted with backoff
+  and takes its groups back after its first report.
+
+A group can be evaluated by two workers for a moment while it moves. The
+last-fired claim in state.py stops it from firing twice, but only if the
+workers share a state backend. Workers are therefore given sqlite when
+ALERT_STATE_BACKEND is "memory".
+"""
+
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import queue
+import signal
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from apps.alerts import dispatch, runner, state
+from apps.alerts.alert_cache import AlertCache
+from apps.alerts.sharding import HashRing
+from apps.api.metrics import record_alert_shard_heartbeat, record_alert_shard_restart
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_TIMEOUT_SECONDS = float(os.getenv("ALERT_RUNNER_HEARTBEAT_TIMEOUT_SECONDS", "30"))
+RESTART_BACKOFF_SECONDS = float(os.getenv("ALERT_RUNNER_RESTART_BACKOFF_SECONDS", "1"))
+MAX_RESTART_BACKOFF_SECONDS = 60.0
+METRICS_PORT = int(os.getenv("ALERT_SUPERVISOR_METRICS_PORT", "0"))  # 0 = don't serve /metrics
+TICK_SECONDS = 0.5
+STOP_TIMEOUT_SECONDS = 30.0
+
+
+class ShardAlertCache(AlertCache):
+    """Alert cache fed by the supervisor instead of polling the database."""
+
+    def __init__(self):
+        super().__init__()
+        self.loaded = True
+
+    def active_alerts(self) -> List[Dict[str, Any]]:
+        return list(self.alerts.values())
+
+
+def _apply_updates(cache: ShardAlertCache, inbox) -> bool:
+    """Apply queued alert-set updates; False once the supervisor asked to stop."""
+    while True:
+        try:
+            kind, data = inbox.get_nowait()
+        except queue.Empty:
+            return True
+        if kind == "stop":
+            return False
+        if kind == "upsert":
+            for row in data:
+                cache.apply_change(row)
+        elif kind == "delete":
+            for alert_id in data:
+                cache.apply_change({"alert_id": alert_id}, deleted=True)
+
+
+async def _worker_loop(shard: int, inbox, status, poll_ms: int, spill_path: str):
+    from apps.alerts.alert_manager import AlertManager
+    from apps.alerts.datasource import CandleSource
+
+    cache = ShardAlertCache()
+    manager = AlertManager(CandleSource(), cache)
+    interval = poll_ms / 1000
+    # Own spill file: workers restarting together must not replay each other's webhooks
+    dispatch.webhook_dispatcher.spill_path = spill_path
+    await dispatch.webhook_dispatcher.start()
+    previous_start: Optional[float] = None
+    try:
+        while _apply_updates(cache, inbox):
+            started = time.monotonic()
+            # Lag: how late this loop started relative to its poll schedule
+            lag = 0.0 if previous_start is None else max(0.0, started - previous_start - interval)
+            previous_start = started
+            await runner.run_once(manager)
+            loop_seconds = time.monotonic() - started
+            status.put(("heartbeat", shard, os.getpid(), {
+                "loop_seconds": loop_seconds,
+                "lag_seconds": lag,
+                "alerts": len(cache.alerts),
+            }))
+            await asyncio.sleep(max(0.0, interval - loop_seconds))
+    finally:
+        await runner.shutdown()
+
+
+def _worker_main(shard: int, inbox, status, poll_ms: int, spill_path: str, state_backend: str):
+    logging.basicConfig(level=logging.INFO)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The supervisor handles Ctrl+C and sends "stop"
+    state.set_store(state.create_state_store(state_backend))
+    asyncio.run(_worker_loop(shard, inbox, status, poll_ms, spill_path))
+
+
+def shard_spill_path(shard: int, spill_path: str = dispatch.WEBHOOK_SPILL_PATH) -> str:
+    """Webhook spill file of one shard ("" keeps spilling disabled)."""
+    return f"{spill_path}.shard{shard}" if spill_path else ""
+
+
+class ShardSupervisor:
+    """
+    Starts, shards and restarts alert runner worker processes.
+
+    Usage:
+        ShardSupervisor(workers=4).run()
+    """
+
+    def __init__(self, workers: int, poll_ms: int = runner.POLL_MS, alert_cache: Optional[AlertCache] = None):
+        self.workers = workers
+        self.poll_ms = poll_ms
+        self.alert_cache = alert_cache or AlertCache()
+        self.state_backend = state.STATE_BACKEND
+        self.ring = HashRing()
+        self.running = False
+        self.shard_stats: Dict[int, Dict[str, Any]] = {}
+        self.stats = {"restarts": 0, "moves": 0}
+
+        self._ctx = mp.get_context("spawn")
+        self._status = self._ctx.Queue()
+        self._procs: Dict[int, Any] = {}  # shard -> Process, None while waiting to restart
+        self._inboxes: Dict[int, Any] = {}
+        self._started_at: Dict[int, float] = {}
+        self._last_seen: Dict[int, float] = {}
+        self._restart_at: Dict[int, float] = {}
+        self._backoff: Dict[int, float] = {}
+        self._assigned: Dict[str, Tuple[int, Dict[str, Any]]] = {}  # alert_id -> (shard, row sent)
+
+    def run(self):
+        if self.state_backend == "memory":
+            logger.warning("Sharded runner needs shared alert state, workers use the sqlite backend")
+            self.state_backend = "sqlite"
+        if METRICS_PORT:
+            from prometheus_client import start_http_server
+            start_http_server(METRICS_PORT)
+
+        signal.signal(signal.SIGTERM, lambda *_: self._request_stop())
+        self.running = True
+        # Initial workers own their shards right away; their inboxes buffer
+        # updates until they are up. Restarted workers rejoin on first report.
+        for shard in range(self.workers):
+            self._spawn(shard)
+            self.ring.add(shard)
+        logger.info(f"Alert supervisor started {self.workers} workers")
+        try:
+            while self.running:
+                self._drain_status()
+                self._check_workers()
+                try:
+                    self._assign()
+                except Exception as e:
+                    logger.error(f"Error assigning alerts to shards: {e}")
+                time.sleep(TICK_SECONDS)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _request_stop(self):
+        self.running = False
+
+    def stop(self):
+        """Ask workers to finish their loop and flush, then terminate stragglers."""
+        self.running = False
+        procs = [(shard, proc) for shard, proc in self._procs.items() if proc is not None]
+        for shard, proc in procs:
+            if proc.is_alive():
+                self._inboxes[shard].put(("stop", None))
+        deadline = time.monotonic() + STOP_TIMEOUT_SECONDS
+        for shard, proc in procs:
+            proc.join(max(0.0, deadline - time.monotonic()))
+            if proc.is_alive():
+                logger.warning(f"Shard {shard} did not stop in time, terminating")
+                proc.terminate()
+                proc.join()
+        self._procs.clear()
+
+    def _spawn(self, shard: int):
+        inbox = self._ctx.Queue()
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(shard, inbox, self._status, self.poll_ms, shard_spill_path(shard), self.state_backend),
+            name=f"alert-shard-{shard}",
+            daemon=True
+        )
+        proc.start()
+        now = time.monotonic()
+        self._procs[shard] = proc
+        self._inboxes[shard] = inbox
+        self._started_at[shard] = now
+        self._last_seen[shard] = now  # Startup grace period of one heartbeat timeout
+
+    def _drain_status(self):
+        while True:
+            try:
+                _, shard, pid, info = self._status.get_nowait()
+            except queue.Empty:
+                return
+            proc = self._procs.get(shard)
+            if proc is None or proc.pid != pid:
+                continue  # Report from a worker that has since been replaced
+            self._last_seen[shard] = time.monotonic()
+            self.shard_stats[shard] = info
+            if shard not in self.ring.nodes:
+                self.ring.add(shard)
+                logger.info(f"Shard {shard} rejoined")
+            record_alert_shard_heartbeat(shard, info["loop_seconds"], info["lag_seconds"], info["alerts"])
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for shard, proc in list(self._procs.items()):
+            if proc is None:
+                if now >= self._restart_at[shard]:
+                    logger.info(f"Restarting shard {shard}")
+                    self._spawn(shard)
+                    self.stats["restarts"] += 1
+                    record_alert_shard_restart(shard)
+                continue
+
+            stalled = now - self._last_seen[shard] > HEARTBEAT_TIMEOUT_SECONDS
+            if proc.is_alive() and not stalled:
+                continue
+            if proc.is_alive():
+                logger.warning(f"Shard {shard} sent no heartbeat for {HEARTBEAT_TIMEOUT_SECONDS}s, terminating")
+                proc.terminate()
+                proc.join(5)
+            else:
+                logger.warning(f"Shard {shard} exited with code {proc.exitcode}")
+
+            self._evict(shard)
+            backoff = self._backoff.get(shard, RESTART_BACKOFF_SECONDS)
+            if now - self._started_at[shard] > MAX_RESTART_BACKOFF_SECONDS:
+                backoff = RESTART_BACKOFF_SECONDS  # Was healthy for a while; not a crash loop
+            self._restart_at[shard] = now + backoff
+            self._backoff[shard] = min(backoff * 2, MAX_RESTART_BACKOFF_SECONDS)
+            self._procs[shard] = None
+
+    def _evict(self, shard: int):
+        """Take a dead shard out of the ring; the next _assign moves its groups."""
+        self.ring.remove(shard)
+        for alert_id in [a for a, (owner, _) in self._assigned.items() if owner == shard]:
+            del self._assigned[alert_id]
+        inbox = self._inboxes.pop(shard, None)
+        if inbox is not None:
+            inbox.cancel_join_thread()  # Nobody will read what is left
+            inbox.close()
+
+    def _assign(self):
+        """Send each shard the alerts it gained, changed or lost since the last tick."""
+        upserts: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        deletes: Dict[int, List[str]] = defaultdict(list)
+        seen = set()
+
+        for alert in self.alert_cache.active_alerts():
+            alert_id = alert["alert_id"]
+            seen.add(alert_id)
+            shard = self.ring.node_for((alert["symbol"], alert["base_timeframe"]))
+            if shard is None:
+                continue  # No live workers
+            previous = self._assigned.get(alert_id)
+            if previous is not None and previous[0] == shard and previous[1] is alert:
+                continue  # AlertCache replaces the row object when it changes
+            if previous is not None and previous[0] != shard:
+                deletes[previous[0]].append(alert_id)
+                self.stats["moves"] += 1
+            upserts[shard].append(alert)
+            self._assigned[alert_id] = (shard, alert)
+
+        for alert_id in [a for a in self._assigned if a not in seen]:
+            shard, _ = self._assigned.pop(alert_id)
+            deletes[shard].append(alert_id)
+
+        for shard, alert_ids in deletes.items():
+            self._inboxes[shard].put(("delete", alert_ids))
+        for shard, rows in upserts.items():
+            self._inboxes[shard].put(("upsert", rows))
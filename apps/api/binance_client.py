@@ -65,6 +65,12 @@ class BinanceClient:
         params = {"symbol": symbol} if symbol else None
         return await self._make_request(endpoint, params)
     
+    async def get_book_ticker(self, symbols: List[str] = None) -> List[Dict]:
+        """Get best bid/ask for the given symbols (one request) or all symbols"""
+        endpoint = "/api/v3/ticker/bookTicker"
+        params = {"symbols": json.dumps(symbols, separators=(",", ":"))} if symbols else None
+        return await self._make_request(endpoint, params)
+    
     async def get_klines(self, symbol: str, interval: str, limit: int = 100, start_time: int = None, end_time: int = None) -> List[List]:
         """Get kline/candlestick data"""
         params = {
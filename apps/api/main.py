@@ -214,6 +214,10 @@ async def startup_event():
         app.state.db_service = db_service
         logger.info("✅ Bot services registered in app state")
         
+        # Start the write-behind journal before recovery logs any events
+        if db_service and db_service.enabled:
+            await db_service.start_journal()
+        
         # Recover active bots from database
         if bot_execution_service and db_service and db_service.enabled:
             try:
@@ -249,6 +253,16 @@ async def startup_event():
         asyncio.create_task(run_alert_runner())
         logger.info("Alert runner started")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush pending bot journal writes before exiting."""
+    db_service = getattr(app.state, "db_service", None)
+    if db_service:
+        try:
+            await db_service.stop_journal()
+        except Exception as e:
+            logger.error(f"Error flushing bot journal on shutdown: {e}", exc_info=True)
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint with database and bot service status"""
@@ -317,6 +331,24 @@ async def debug_routes():
             })
     return {"routes": routes, "total": len(routes)}
 
+_trace_redis = None
+
+@app.get("/debug/traces/slowest")
+async def debug_slowest_traces(limit: int = Query(20, ge=1, le=200)):
+    """Slowest recent condition trigger traces, with per-hop durations"""
+    global _trace_redis
+    try:
+        import redis.asyncio as redis
+        from apps.bots.trigger_trace import load_slowest
+        
+        if _trace_redis is None:
+            _trace_redis = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379"), decode_responses=True)
+        traces = await load_slowest(_trace_redis, limit)
+        return {"traces": traces, "total": len(traces)}
+    except Exception as e:
+        logger.error(f"Error loading traces: {e}")
+        raise HTTPException(status_code=503, detail=f"Traces unavailable: {e}")
+
 # ==================== BINANCE API ENDPOINTS ====================
 
 @app.get("/api/symbols", response_model=SymbolListResponse)
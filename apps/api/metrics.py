@@ -31,6 +31,58 @@ api_requests_total = Counter(
     ['method', 'endpoint', 'status_code']
 )
 
+webhook_dropped_total = Counter(
+    'webhook_dropped_total',
+    'Total number of webhooks dropped or spilled by the dispatcher',
+    ['reason']
+)
+
+trigger_writer_rows_total = Counter(
+    'trigger_writer_rows_total',
+    'Total number of rows flushed by the trigger write-behind queue',
+    ['kind', 'status']
+)
+
+condition_index_lookups_total = Counter(
+    'condition_index_lookups_total',
+    'Total number of condition index lookups',
+    ['kind', 'result']
+)
+
+alert_shard_restarts_total = Counter(
+    'alert_shard_restarts_total',
+    'Alert runner shard worker restarts',
+    ['shard']
+)
+
+runner_groups_deferred_total = Counter(
+    'runner_groups_deferred_total',
+    'Alert groups deferred to the next cycle because the cycle was over budget',
+    ['timeframe']
+)
+
+runner_cycle_overruns_total = Counter(
+    'runner_cycle_overruns_total',
+    'Alert runner cycles that overran their poll deadline'
+)
+
+event_bus_published_total = Counter(
+    'event_bus_published_total',
+    'Events published to the event bus',
+    ['status']
+)
+
+bot_iterations_skipped_total = Counter(
+    'bot_iterations_skipped_total',
+    'Bot iterations skipped because the previous one was still running'
+)
+
+bot_journal_records_total = Counter(
+    'bot_journal_records_total',
+    'Total number of bot journal records flushed to the database',
+    ['status']
+)
+
 # Histograms
 runner_loop_seconds = Histogram(
     'runner_loop_seconds',
@@ -50,6 +102,72 @@ api_request_duration_seconds = Histogram(
     ['method', 'endpoint']
 )
 
+webhook_delivery_seconds = Histogram(
+    'webhook_delivery_seconds',
+    'Time from webhook submission to final outcome, including retries',
+    ['outcome'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+
+trigger_writer_flush_seconds = Histogram(
+    'trigger_writer_flush_seconds',
+    'Time spent flushing the trigger write-behind queue'
+)
+
+condition_index_refresh_seconds = Histogram(
+    'condition_index_refresh_seconds',
+    'Time spent refreshing the condition index',
+    ['mode']
+)
+
+alert_shard_loop_seconds = Histogram(
+    'alert_shard_loop_seconds',
+    'Time spent evaluating one shard loop',
+    ['shard']
+)
+
+event_bus_batch_size = Histogram(
+    'event_bus_batch_size',
+    'Events per pipelined event bus publish',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500)
+)
+
+event_bus_flush_seconds = Histogram(
+    'event_bus_flush_seconds',
+    'Round-trip time of a pipelined event bus publish',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+
+event_bus_callback_seconds = Histogram(
+    'event_bus_callback_seconds',
+    'Time spent in event bus subscriber callbacks',
+    ['status']
+)
+
+trigger_hop_seconds = Histogram(
+    'trigger_hop_seconds',
+    'Condition trigger latency per hop (bar close to order placement)',
+    ['hop'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
+bot_scheduler_lag_seconds = Histogram(
+    'bot_scheduler_lag_seconds',
+    'How late bot iterations started relative to their due time',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+bot_iteration_seconds = Histogram(
+    'bot_iteration_seconds',
+    'Time spent in one bot iteration',
+    ['status']
+)
+
+bot_journal_flush_seconds = Histogram(
+    'bot_journal_flush_seconds',
+    'Time spent flushing a bot journal batch'
+)
+
 # Gauges
 active_alerts_gauge = Gauge(
     'active_alerts_count',
@@ -62,6 +180,50 @@ active_connections_gauge = Gauge(
     'Number of active connections'
 )
 
+webhook_queue_depth_gauge = Gauge(
+    'webhook_queue_depth',
+    'Number of webhooks waiting in the dispatcher',
+    ['state']
+)
+
+trigger_writer_queue_depth_gauge = Gauge(
+    'trigger_writer_queue_depth',
+    'Number of trigger rows waiting to be flushed'
+)
+
+condition_index_size_gauge = Gauge(
+    'condition_index_size',
+    'Number of entries in the condition index',
+    ['kind']
+)
+
+alert_shard_lag_seconds_gauge = Gauge(
+    'alert_shard_lag_seconds',
+    'How far the shard loop is behind its poll schedule',
+    ['shard']
+)
+
+alert_shard_alerts_gauge = Gauge(
+    'alert_shard_alerts',
+    'Number of alerts owned by a shard',
+    ['shard']
+)
+
+runner_loop_lag_seconds_gauge = Gauge(
+    'runner_loop_lag_seconds',
+    'How late the last alert runner cycle started relative to its schedule'
+)
+
+event_bus_dispatch_backlog_gauge = Gauge(
+    'event_bus_dispatch_backlog',
+    'Received event bus messages waiting for a dispatch worker'
+)
+
+bot_journal_queue_depth_gauge = Gauge(
+    'bot_journal_queue_depth',
+    'Number of bot journal records waiting to be flushed'
+)
+
 def get_metrics_response():
     """Get Prometheus metrics response."""
     return Response(
@@ -98,6 +260,19 @@ def record_webhook_failure(url: str, error_type: str):
         error_type=error_type
     ).inc()
 
+def record_webhook_delivery(outcome: str, duration: float):
+    """Record a webhook delivery outcome (delivered, failed, rejected)."""
+    webhook_delivery_seconds.labels(outcome=outcome).observe(duration)
+
+def record_webhook_dropped(reason: str):
+    """Record a webhook dropped or spilled by the dispatcher."""
+    webhook_dropped_total.labels(reason=reason).inc()
+
+def update_webhook_queue_depth(queued: int, retrying: int):
+    """Update dispatcher queue depth gauges."""
+    webhook_queue_depth_gauge.labels(state="queued").set(queued)
+    webhook_queue_depth_gauge.labels(state="retrying").set(retrying)
+
 def record_api_request(method: str, endpoint: str, status_code: int, duration: float):
     """Record API request metrics."""
     api_requests_total.labels(
@@ -119,5 +294,82 @@ def update_active_connections_count(count: int):
     """Update active connections count gauge."""
     active_connections_gauge.set(count)
 
+def record_condition_index_lookup(kind: str, hit: bool):
+    """Record a condition index lookup (kind: conditions, subscribers)."""
+    condition_index_lookups_total.labels(
+        kind=kind,
+        result="hit" if hit else "miss"
+    ).inc()
+
+def record_condition_index_refresh(mode: str, duration: float, sizes: dict):
+    """Record a condition index refresh (mode: full, incremental) and its sizes."""
+    condition_index_refresh_seconds.labels(mode=mode).observe(duration)
+    for kind, count in sizes.items():
+        condition_index_size_gauge.labels(kind=kind).set(count)
+
+def record_trigger_writer_flush(duration: float, triggers: int, counters: int, failed: bool, queue_depth: int):
+    """Record a trigger write-behind flush."""
+    status = "failed" if failed else "ok"
+    trigger_writer_flush_seconds.observe(duration)
+    trigger_writer_rows_total.labels(kind="trigger", status=status).inc(triggers)
+    trigger_writer_rows_total.labels(kind="counter", status=status).inc(counters)
+    trigger_writer_queue_depth_gauge.set(queue_depth)
+
+def update_trigger_writer_queue_depth(depth: int):
+    """Update trigger write-behind queue depth gauge."""
+    trigger_writer_queue_depth_gauge.set(depth)
+
+def record_alert_shard_heartbeat(shard: int, loop_seconds: float, lag_seconds: float, alerts: int):
+    """Record a shard worker loop reported to the supervisor."""
+    alert_shard_loop_seconds.labels(shard=str(shard)).observe(loop_seconds)
+    alert_shard_lag_seconds_gauge.labels(shard=str(shard)).set(lag_seconds)
+    alert_shard_alerts_gauge.labels(shard=str(shard)).set(alerts)
+
+def record_alert_shard_restart(shard: int):
+    """Record a shard worker restart."""
+    alert_shard_restarts_total.labels(shard=str(shard)).inc()
+
+def record_runner_cycle(lag_seconds: float, overran: bool):
+    """Record alert runner cycle lag and deadline overruns."""
+    runner_loop_lag_seconds_gauge.set(lag_seconds)
+    if overran:
+        runner_cycle_overruns_total.inc()
+
+def record_runner_group_deferred(timeframe: str):
+    """Record an alert group deferred to the next cycle."""
+    runner_groups_deferred_total.labels(timeframe=timeframe).inc()
+
+def record_event_bus_flush(size: int, duration: float, failed: bool):
+    """Record a pipelined event bus publish."""
+    event_bus_batch_size.observe(size)
+    event_bus_flush_seconds.observe(duration)
+    event_bus_published_total.labels(status="failed" if failed else "ok").inc(size)
+
+def record_event_bus_callback(duration: float, failed: bool):
+    """Record an event bus subscriber callback."""
+    event_bus_callback_seconds.labels(status="failed" if failed else "ok").observe(duration)
+
+def update_event_bus_backlog(backlog: int):
+    """Update event bus dispatch backlog gauge."""
+    event_bus_dispatch_backlog_gauge.set(backlog)
+
+def record_trigger_trace(durations: dict):
+    """Record per-hop durations of a finished trigger trace (hop name -> seconds)."""
+    for hop, seconds in durations.items():
+        trigger_hop_seconds.labels(hop=hop).observe(seconds)
+
+def record_bot_iteration(lag_seconds: float, duration: float, failed: bool):
+    """Record a scheduled bot iteration."""
+    bot_scheduler_lag_seconds.observe(lag_seconds)
+    bot_iteration_seconds.labels(status="failed" if failed else "ok").observe(duration)
 
+def record_bot_iteration_skipped():
+    """Record a bot iteration skipped because the previous one overran."""
+    bot_iterations_skipped_total.inc()
 
+def record_bot_journal_flush(duration: float, written: int, failed: int, queue_depth: int):
+    """Record a bot journal flush."""
+    bot_journal_flush_seconds.observe(duration)
+    bot_journal_records_total.labels(status="ok").inc(written)
+    bot_journal_records_total.labels(status="failed").inc(failed)
+    bot_journal_queue_depth_gauge.set(queue_depth)
@@ -7,6 +7,7 @@ import logging
 
 from apps.api.utils.errors import TradeeonError, NotFoundError, DatabaseError
 from apps.api.deps.auth import get_current_user, AuthedUser
+from apps.api.routers.condition_registry import publish_subscription_change
 
 import sys
 import os
@@ -1081,6 +1082,8 @@ async def stop_dca_bot(
         
         # Update bot status to stopped
         db_service.update_bot_status(bot_id, "stopped")
+        # Bot notifiers cache bot rows; drop this one everywhere
+        await publish_subscription_change("bot_stopped", None, bot_id, user.user_id)
         
         # Update all active bot runs to stopped
         try:
@@ -1165,6 +1168,7 @@ async def pause_dca_bot(
         
         # Update bot status to paused
         db_service.update_bot_status(bot_id, "paused")
+        await publish_subscription_change("bot_paused", None, bot_id, user.user_id)
         
         # Log bot pause event to bot_events_live
         try:
@@ -1242,6 +1246,7 @@ async def resume_dca_bot(
         
         # Update bot status to running
         db_service.update_bot_status(bot_id, "running")
+        await publish_subscription_change("bot_resumed", None, bot_id, user.user_id)
         
         # Log bot resume event to bot_events_live
         try:
@@ -1348,6 +1353,7 @@ async def delete_dca_bot(
                 }
         
         logger.info(f"✅ DCA bot {bot_id} deleted successfully")
+        await publish_subscription_change("bot_deleted", None, bot_id, user.user_id)
         
         return {
             "success": True,
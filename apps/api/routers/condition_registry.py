@@ -5,6 +5,7 @@ from typing import List, Optional, Dict, Any
 import logging
 import hashlib
 import json
+import time
 from datetime import datetime
 
 from apps.api.deps.auth import get_current_user, AuthedUser
@@ -15,6 +16,36 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/conditions", tags=["conditions"])
 
+# Bot notifiers cache subscriptions and drop them on events from this channel
+SUBSCRIPTIONS_CHANNEL = "registry.subscriptions"
+_EVENT_BUS_RETRY_SECONDS = 60
+
+_event_bus = None
+_event_bus_retry_at = 0.0
+
+
+async def publish_subscription_change(action: str, condition_id: str, bot_id: Optional[str], user_id: str):
+    """Tell bot notifiers to drop cached subscriptions (best effort)."""
+    global _event_bus, _event_bus_retry_at
+    try:
+        if _event_bus is None:
+            if time.monotonic() < _event_bus_retry_at:
+                return
+            # Pub/sub regardless of EVENT_BUS_TRANSPORT: every notifier must see it
+            from apps.bots.event_bus import create_event_bus
+            _event_bus = await create_event_bus(transport="pubsub")
+            if _event_bus is None:
+                _event_bus_retry_at = time.monotonic() + _EVENT_BUS_RETRY_SECONDS
+                return
+        await _event_bus.publish(SUBSCRIPTIONS_CHANNEL, {
+            "action": action,
+            "condition_id": condition_id,
+            "bot_id": bot_id,
+            "user_id": user_id
+        })
+    except Exception as e:
+        logger.warning(f"Failed to publish subscription change: {e}")
+
 
 def normalize_condition(condition: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -64,6 +95,10 @@ def normalize_condition(condition: Dict[str, Any]) -> Dict[str, Any]:
         if condition.get("grid_level"):
             normalized["grid_level"] = condition["grid_level"]  # Grid level number
     
+    # Intrabar conditions are evaluated on every stream update, not just on bar close
+    if condition.get("fireMode") == "per_tick":
+        normalized["fire_mode"] = "per_tick"
+    
     # Handle RHS for indicator comparisons
     if condition.get("rhs"):
         normalized["rhs_indicator"] = condition["rhs"].get("indicator")
@@ -208,6 +243,7 @@ async def subscribe_bot_to_condition(
             result = supabase.table("user_condition_subscriptions").insert(subscription).execute()
             subscription_id = result.data[0]["id"] if result.data else None
             logger.info(f"Bot {bot_id} subscribed to condition {condition_id}")
+            await publish_subscription_change("subscribed", condition_id, bot_id, user.user_id)
         else:
             subscription_id = None
         
@@ -248,6 +284,12 @@ async def unsubscribe_bot_from_condition(
             }).eq("id", subscription_id).execute()
             
             logger.info(f"Unsubscribed subscription {subscription_id}")
+            await publish_subscription_change(
+                "unsubscribed",
+                subscription.data[0].get("condition_id"),
+                subscription.data[0].get("bot_id"),
+                user.user_id
+            )
         
         return {
             "success": True,
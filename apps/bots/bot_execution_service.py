@@ -18,15 +18,21 @@ try:
     # Try absolute imports first (PYTHONPATH=/app in Docker)
     from apps.bots.dca_executor import DCABotExecutor
     from apps.bots.db_service import db_service
+    from apps.bots.market_data import market_data_hub
+    from apps.bots.bot_scheduler import BotScheduler
 except ImportError:
     # Fallback for local development
     try:
         from dca_executor import DCABotExecutor
         from db_service import db_service
+        from market_data import market_data_hub
+        from bot_scheduler import BotScheduler
     except ImportError as e:
         logging.error(f"Failed to import required modules: {e}")
         DCABotExecutor = None
         db_service = None
+        market_data_hub = None
+        BotScheduler = None
 
 logger = logging.getLogger(__name__)
 
@@ -38,13 +44,13 @@ class BotExecutionService:
     This service:
     - Tracks running bots
     - Manages bot executor lifecycle
-    - Handles bot execution loops
+    - Runs bot iterations from one shared BotScheduler
     - Updates bot status in database
     """
     
     def __init__(self):
         self.running_bots: Dict[str, DCABotExecutor] = {}
-        self.bot_tasks: Dict[str, asyncio.Task] = {}
+        self.scheduler = BotScheduler(self._run_iteration, market_data=market_data_hub) if BotScheduler else None
         self.bot_configs: Dict[str, Dict[str, Any]] = {}
         self.execution_intervals: Dict[str, int] = {}  # seconds
         
@@ -78,6 +84,7 @@ class BotExecutionService:
             logger.error("DCABotExecutor not available")
             return False
         
+        initialized = None  # Executor holding a share of the market data hub
         try:
             # Validate mode
             if mode not in ["paper", "live"]:
@@ -142,7 +149,8 @@ class BotExecutionService:
             executor = DCABotExecutor(
                 bot_config=bot_config,
                 paper_trading=(mode == "paper"),
-                initial_balance=initial_balance
+                initial_balance=initial_balance,
+                market_data=market_data_hub
             )
             
             # Set bot_id, user_id, and run_id if available
@@ -156,15 +164,15 @@ class BotExecutionService:
             
             # Initialize executor
             await executor.initialize()
+            initialized = executor
             
             # Store executor and config
             self.running_bots[bot_id] = executor
             self.bot_configs[bot_id] = bot_config
             self.execution_intervals[bot_id] = interval_seconds
             
-            # Start execution loop in background
-            task = asyncio.create_task(self._execute_bot_loop(bot_id, interval_seconds))
-            self.bot_tasks[bot_id] = task
+            # Schedule iterations (the first one runs right away)
+            self.scheduler.add(bot_id, interval_seconds, executor._price_symbols())
             
             # Update bot status in database
             if db_service:
@@ -180,92 +188,73 @@ class BotExecutionService:
             logger.error(f"   Bot config keys: {list(bot_config.keys()) if bot_config else 'None'}")
             logger.error(f"   Bot ID: {bot_id}, User ID: {bot_config.get('user_id') if bot_config else 'None'}")
             # Cleanup on error
-            if bot_id in self.running_bots:
-                del self.running_bots[bot_id]
-            if bot_id in self.bot_configs:
-                del self.bot_configs[bot_id]
-            if bot_id in self.bot_tasks:
-                self.bot_tasks[bot_id].cancel()
-                del self.bot_tasks[bot_id]
+            await self._abandon_start(bot_id, initialized)
             # Re-raise the exception with more context so it can be caught and handled properly
             raise RuntimeError(f"Failed to start bot {bot_id}: {error_message}") from e
     
-    async def _execute_bot_loop(self, bot_id: str, interval_seconds: int):
-        """Execute bot in a loop with specified interval."""
+    async def _run_iteration(self, bot_id: str):
+        """Run one iteration of a bot (called by the scheduler)."""
         executor = self.running_bots.get(bot_id)
         if not executor:
             logger.error(f"Executor not found for bot {bot_id}")
+            await self.scheduler.remove(bot_id)
             return
         
-        logger.info(f"Starting execution loop for bot {bot_id} (interval: {interval_seconds}s)")
+        last_execution_time = datetime.now()
         
+        # Don't log every iteration - too noisy. Only log significant events (orders, errors, etc.)
         try:
-            iteration_count = 0
-            last_execution_time = None
-            next_execution_time = None
-            
-            while bot_id in self.running_bots:
-                try:
-                    iteration_count += 1
-                    last_execution_time = datetime.now()
-                    
-                    # Don't log every iteration - too noisy. Only log significant events (orders, errors, etc.)
-                    # Execute one iteration
-                    await executor.execute_once()
-                    
-                    # Calculate next execution time
-                    next_execution_time = last_execution_time + timedelta(seconds=interval_seconds)
-                    
-                    # Store execution times on executor for status queries
-                    executor.last_execution_time = last_execution_time
-                    executor.next_execution_time = next_execution_time
-                    executor.iteration_count = iteration_count
-                    
-                    # Save state periodically (every 10 iterations or every 10 minutes)
-                    if iteration_count % 10 == 0:
-                        try:
-                            self.save_bot_state(bot_id)
-                        except Exception as save_error:
-                            logger.warning(f"Failed to save bot state: {save_error}")
-                    
-                    # Wait for next iteration
-                    await asyncio.sleep(interval_seconds)
-                    
-                except asyncio.CancelledError:
-                    logger.info(f"Execution loop for bot {bot_id} cancelled")
-                    break
-                except Exception as e:
-                    logger.error(f"Error in execution loop for bot {bot_id}: {e}", exc_info=True)
-                    # Continue loop after error (don't stop bot)
-                    await asyncio.sleep(interval_seconds)
-                    
+            await executor.execute_once()
         except Exception as e:
-            logger.error(f"Fatal error in execution loop for bot {bot_id}: {e}", exc_info=True)
-        finally:
-            # Cleanup
-            if bot_id in self.running_bots:
-                del self.running_bots[bot_id]
-            if bot_id in self.bot_configs:
-                del self.bot_configs[bot_id]
-            if bot_id in self.execution_intervals:
-                del self.execution_intervals[bot_id]
-            
-            # Only update status to "stopped" if bot was actually running/paused
-            # Don't change status if bot was "inactive" or already "stopped"
-            if db_service:
-                try:
-                    bot_data = db_service.get_bot(bot_id)
-                    current_status = bot_data.get("status") if bot_data else None
-                    # Only update to stopped if bot was running or paused
-                    if current_status in ["running", "paused"]:
-                        db_service.update_bot_status(bot_id, "stopped")
-                        logger.info(f"Updated bot {bot_id} status from {current_status} to stopped (execution loop ended)")
-                    else:
-                        logger.debug(f"Bot {bot_id} status is {current_status}, not updating to stopped")
-                except Exception as status_error:
-                    logger.error(f"Failed to check/update bot status in finally block: {status_error}")
-            
-            logger.info(f"Execution loop for bot {bot_id} stopped")
+            # Keep the bot scheduled after an error (don't stop bot)
+            logger.error(f"Error in execution loop for bot {bot_id}: {e}", exc_info=True)
+        
+        # Store execution times on executor for status queries
+        iteration_count = getattr(executor, 'iteration_count', 0) + 1
+        executor.last_execution_time = last_execution_time
+        executor.next_execution_time = datetime.now() + timedelta(
+            seconds=self.scheduler.seconds_until_due(bot_id) or 0
+        )
+        executor.iteration_count = iteration_count
+        
+        # Save state periodically (every 10 iterations)
+        if iteration_count % 10 == 0:
+            try:
+                self.save_bot_state(bot_id)
+            except Exception as save_error:
+                logger.warning(f"Failed to save bot state: {save_error}")
+    
+    async def _abandon_start(self, bot_id: str, executor: Optional[Any]):
+        """Undo a start that failed part way; executor is set once it was initialized."""
+        if bot_id in self.running_bots:
+            del self.running_bots[bot_id]
+        if bot_id in self.bot_configs:
+            del self.bot_configs[bot_id]
+        if bot_id in self.execution_intervals:
+            del self.execution_intervals[bot_id]
+        await self.scheduler.remove(bot_id)
+        if executor is not None:
+            try:
+                await executor.cleanup()  # Releases its share of the market data hub
+            except Exception as cleanup_error:
+                logger.warning(f"Failed to clean up executor for bot {bot_id}: {cleanup_error}")
+    
+    async def _finish_bot(self, bot_id: str):
+        """Release a bot's executor and bookkeeping after it was unscheduled."""
+        executor = self.running_bots.get(bot_id)
+        if executor:
+            try:
+                await executor.cleanup()  # Releases its share of the market data hub
+            except Exception as cleanup_error:
+                logger.warning(f"Failed to clean up executor for bot {bot_id}: {cleanup_error}")
+        if bot_id in self.running_bots:
+            del self.running_bots[bot_id]
+        if bot_id in self.bot_configs:
+            del self.bot_configs[bot_id]
+        if bot_id in self.execution_intervals:
+            del self.execution_intervals[bot_id]
+        
+        logger.info(f"Execution loop for bot {bot_id} stopped")
     
     async def stop_bot(self, bot_id: str) -> bool:
         """Stop a running bot."""
@@ -274,25 +263,9 @@ class BotExecutionService:
             return False
         
         try:
-            # Cancel execution task
-            if bot_id in self.bot_tasks:
-                task = self.bot_tasks[bot_id]
-                task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    pass
-                del self.bot_tasks[bot_id]
-            
-            # Remove executor
-            if bot_id in self.running_bots:
-                del self.running_bots[bot_id]
-            
-            # Cleanup configs
-            if bot_id in self.bot_configs:
-                del self.bot_configs[bot_id]
-            if bot_id in self.execution_intervals:
-                del self.execution_intervals[bot_id]
+            # Unschedule (cancels a running iteration) and remove executor
+            await self.scheduler.remove(bot_id)
+            await self._finish_bot(bot_id)
             
             # Update status in database
             if db_service:
@@ -416,6 +389,7 @@ class BotExecutionService:
             logger.error("DCABotExecutor not available")
             return False
         
+        initialized = None
         try:
             # Load state from database if not provided
             if state is None and db_service:
@@ -439,7 +413,8 @@ class BotExecutionService:
             executor = DCABotExecutor(
                 bot_config=bot_config,
                 paper_trading=(mode == "paper"),
-                initial_balance=initial_balance
+                initial_balance=initial_balance,
+                market_data=market_data_hub
             )
             
             # Set identifiers
@@ -459,15 +434,15 @@ class BotExecutionService:
             
             # Initialize executor
             await executor.initialize()
+            initialized = executor
             
             # Store executor and config
             self.running_bots[bot_id] = executor
             self.bot_configs[bot_id] = bot_config
             self.execution_intervals[bot_id] = interval_seconds
             
-            # Start execution loop
-            task = asyncio.create_task(self._execute_bot_loop(bot_id, interval_seconds))
-            self.bot_tasks[bot_id] = task
+            # Schedule iterations
+            self.scheduler.add(bot_id, interval_seconds, executor._price_symbols())
             
             # Update bot status
             if db_service:
@@ -479,6 +454,7 @@ class BotExecutionService:
             
         except Exception as e:
             logger.error(f"Failed to restore bot {bot_id} from state: {e}", exc_info=True)
+            await self._abandon_start(bot_id, initialized)
             return False
     
     async def recover_active_bots(self) -> int:
@@ -599,6 +575,7 @@ class BotExecutionService:
             "next_execution_time": next_execution.isoformat() if next_execution else None,
             "time_until_next_seconds": time_until_next,
             "is_healthy": is_healthy,
+            "scheduling": self.scheduler.bot_stats(bot_id),
             "statistics": stats,
             "last_dca_times": {
                 pair: dt.isoformat() if dt else None
@@ -0,0 +1,398 @@
+"""
+Bot Journal - Write-behind persistence for bot events, orders, positions and funds.
+
+db_service used to make a synchronous Supabase call for every event, order,
+position and funds update, blocking the event loop for a network round trip
+in the middle of trading. With the journal:
+
+- append() only queues the record and returns; it never waits on the network.
+- Records are flushed every BOT_JOURNAL_FLUSH_MS, or as soon as a full batch
+  is waiting. Inserts go to each table in bulk requests, one per run of rows
+  with the same columns (PostgREST writes NULL for columns a row of a bulk
+  request leaves out). Upserts are coalesced per conflict key into the row
+  the single upserts would have produced, a delete included.
+  The Supabase client is synchronous, so writes run in a worker thread.
+- Records stay in append order, so rows for one bot are written in order.
+- When a bulk request fails its rows are retried one at a time, so one bad
+  row only holds back itself. Failed records go back to the front of the
+  queue and flushes back off. A record rejected for its data (constraint or
+  type errors) is moved to the dead-letter log after BOT_JOURNAL_MAX_ATTEMPTS.
+- With BOT_JOURNAL_WAL_PATH set, every record is also appended to a local
+  JSON-lines file. The file is replayed on start, which covers records lost
+  when the process crashed before a flush.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# Add root path for 'apps' modules
+root_path = os.path.join(os.path.dirname(__file__), '..', '..')
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+try:
+    from apps.api.metrics import record_bot_journal_flush
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+FLUSH_MS = int(os.getenv("BOT_JOURNAL_FLUSH_MS", "250"))
+MAX_BATCH = int(os.getenv("BOT_JOURNAL_MAX_BATCH", "500"))
+MAX_QUEUE = int(os.getenv("BOT_JOURNAL_MAX_QUEUE", "50000"))
+MAX_ATTEMPTS = int(os.getenv("BOT_JOURNAL_MAX_ATTEMPTS", "3"))
+WAL_PATH = os.getenv("BOT_JOURNAL_WAL_PATH", "")  # Empty = no on-disk log
+DEAD_LETTER_PATH = os.getenv("BOT_JOURNAL_DEAD_LETTER_PATH", "")  # Empty = error log only
+MAX_BACKOFF_SECONDS = 30.0
+
+# Error codes of rows that will fail the same way on every retry: SQLSTATE
+# classes 22 (data exception), 23 (constraint violation), 42 (undefined
+# column etc.) and PostgREST request/schema errors
+ROW_ERROR_CODES = ("22", "23", "42", "PGRST1", "PGRST2")
+
+# Conflict columns of tables written with upsert/delete
+CONFLICT_KEYS = {
+    "positions": ("user_id", "symbol"),
+    "funds": ("user_id", "exchange", "currency"),
+}
+
+# bot_events_live rows go to bot_events while migration 004 is missing
+LIVE_EVENTS_TABLE = "bot_events_live"
+LEGACY_EVENTS_TABLE = "bot_events"
+
+
+class _Record:
+    __slots__ = ("table", "op", "data", "attempts", "error")
+
+    def __init__(self, table: str, op: str, data: Dict[str, Any]):
+        self.table = table
+        self.op = op  # "insert", "upsert" or "delete"
+        self.data = data
+        self.attempts = 0  # Failures caused by the row itself
+        self.error: Optional[str] = None
+
+    def to_json(self) -> str:
+        return json.dumps((self.table, self.op, self.data), default=str)
+
+
+def _is_row_error(error: Exception) -> bool:
+    code = str(getattr(error, "code", None) or "")
+    return code.startswith(ROW_ERROR_CODES)
+
+
+class BotJournal:
+    """
+    Batched, non-blocking writer for bot database records.
+
+    The flush loop starts with the first append() made from a running event
+    loop. Appends from threads without a loop, or after stop(), return False.
+
+    Usage:
+        journal = BotJournal(supabase)
+        journal.append("order_logs", "insert", order_data)
+        await journal.stop()  # flushes pending records
+    """
+
+    def __init__(
+        self,
+        supabase_client,
+        flush_interval_ms: int = FLUSH_MS,
+        max_batch: int = MAX_BATCH,
+        max_queue: int = MAX_QUEUE,
+        wal_path: Optional[str] = WAL_PATH,
+        max_attempts: int = MAX_ATTEMPTS,
+        dead_letter_path: Optional[str] = DEAD_LETTER_PATH
+    ):
+        self.supabase = supabase_client
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.wal_path = wal_path or None
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter_path or None
+
+        self._queue: Deque[_Record] = deque()
+        self._wal = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self.running = False
+        self._closed = False
+        self.stats = {
+            "appended": 0, "flushes": 0, "written": 0, "coalesced": 0,
+            "failures": 0, "dead_lettered": 0, "dropped": 0,
+        }
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    async def start(self):
+        """Replay the WAL and start the background flush loop (idempotent)."""
+        self._ensure_started()
+
+    def _ensure_started(self) -> bool:
+        """Start on the calling thread's event loop; False when append() must not be used."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False  # Called from a thread without an event loop
+        if self.running:
+            return loop is self._loop
+        if self._closed:
+            return False
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        if self.wal_path:
+            self._replay_wal()
+            self._wal = open(self.wal_path, "a", encoding="utf-8")
+        self.running = True
+        self._task = loop.create_task(self._run())
+        logger.info(f"Bot journal started (flush every {self.flush_interval * 1000:.0f}ms, WAL: {self.wal_path or 'off'})")
+        return True
+
+    async def stop(self):
+        """Stop the flush loop and write everything still pending."""
+        self._closed = True  # Later appends are written directly
+        if not self.running:
+            return
+        self.running = False
+        self._wakeup.set()
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self.pending:
+            logger.error(f"Bot journal stopped with {self.pending} unwritten records" +
+                         (f" (kept in {self.wal_path})" if self.wal_path else ""))
+        if self._wal:
+            self._wal.close()
+            self._wal = None
+
+    def append(self, table: str, op: str, data: Dict[str, Any]) -> bool:
+        """Queue a record; False if the journal cannot take it (write it directly instead)."""
+        if not self._ensure_started():
+            return False
+        record = _Record(table, op, data)
+        if self._wal:
+            try:
+                self._wal.write(record.to_json() + "\n")
+                self._wal.flush()
+            except Exception as e:
+                logger.warning(f"Could not write bot journal WAL: {e}")
+        self._queue.append(record)
+        self.stats["appended"] += 1
+        if len(self._queue) > self.max_queue:
+            self._queue.popleft()
+            self.stats["dropped"] += 1
+            logger.error("Bot journal queue full, dropped the oldest record")
+        if len(self._queue) >= self.max_batch:
+            self._wakeup.set()
+        return True
+
+    async def _run(self):
+        while self.running:
+            timeout = max(self.flush_interval, self._retry_at - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if time.monotonic() < self._retry_at:
+                continue  # Backing off after a failed flush
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing bot journal: {e}", exc_info=True)
+
+    async def flush(self):
+        """Write queued records in batches of max_batch."""
+        async with self._flush_lock:
+            if not self._queue:
+                return
+            while self._queue:
+                batch = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+                started = time.perf_counter()
+                failed = await asyncio.to_thread(self._write, batch)
+                dead = [record for record in failed if record.attempts >= self.max_attempts]
+                if dead:
+                    self._dead_letter(dead)
+                    failed = [record for record in failed if record.attempts < self.max_attempts]
+                if failed:
+                    # Back to the front, in their original order
+                    self._queue.extendleft(reversed(failed))
+                self.stats["flushes"] += 1
+                self.stats["written"] += len(batch) - len(failed) - len(dead)
+                if METRICS_AVAILABLE:
+                    record_bot_journal_flush(time.perf_counter() - started, len(batch) - len(failed) - len(dead),
+                                             len(failed) + len(dead), self.pending)
+                if failed:
+                    self.stats["failures"] += 1
+                    self._backoff = min(max(self._backoff * 2, self.flush_interval), MAX_BACKOFF_SECONDS)
+                    self._retry_at = time.monotonic() + self._backoff
+                    logger.warning(f"Bot journal flush failed for {len(failed)} records, retrying in {self._backoff:.1f}s")
+                    break
+                self._backoff = 0.0
+                self._retry_at = 0.0
+            self._compact_wal()
+
+    def _write(self, batch: List[_Record]) -> List[_Record]:
+        """Write a batch (worker thread); returns the records that failed."""
+        inserts: Dict[str, List[_Record]] = {}
+        # (table, conflict key) -> [records, delete first, merged upsert row]
+        keyed: Dict[Tuple[str, tuple], list] = {}
+        for record in batch:
+            if record.op == "insert":
+                inserts.setdefault(record.table, []).append(record)
+                continue
+            key = (record.table, tuple(record.data.get(column) for column in CONFLICT_KEYS[record.table]))
+            entry = keyed.get(key)
+            if entry is None:
+                entry = keyed[key] = [[], False, None]
+            else:
+                self.stats["coalesced"] += 1
+            entry[0].append(record)
+            if record.op == "delete":
+                entry[1], entry[2] = True, None
+            else:
+                # Same row as upserting one after another: later values win, others are kept
+                entry[2] = {**entry[2], **record.data} if entry[2] else dict(record.data)
+
+        failed: List[_Record] = []
+        for table, records in inserts.items():
+            # One request per run of rows with the same columns, keeping their order
+            for _, run in itertools.groupby(records, key=lambda record: tuple(sorted(record.data))):
+                run = list(run)
+                failed.extend(self._send(
+                    lambda rows, table=table: self._insert(table, rows),
+                    [(record.data, [record]) for record in run]
+                ))
+
+        upserts: Dict[Tuple[str, tuple], List[Tuple[Dict[str, Any], List[_Record]]]] = {}
+        for (table, key), (records, delete, row) in keyed.items():
+            if delete:
+                try:
+                    query = self.supabase.table(table).delete()
+                    for column, value in zip(CONFLICT_KEYS[table], key):
+                        query = query.eq(column, value)
+                    query.execute()
+                except Exception as e:
+                    logger.error(f"Error deleting from {table}: {e}")
+                    self._failed(records, e)
+                    failed.extend(records)
+                    continue  # Its upsert must not run before the delete
+            if row is not None:
+                upserts.setdefault((table, tuple(sorted(row))), []).append((row, records))
+        for (table, _), items in upserts.items():
+            failed.extend(self._send(
+                lambda rows, table=table: self.supabase.table(table).upsert(
+                    rows, on_conflict=",".join(CONFLICT_KEYS[table])
+                ).execute(),
+                items
+            ))
+
+        if failed:
+            # Keep append order for the retry
+            order = {id(record): i for i, record in enumerate(batch)}
+            failed.sort(key=lambda record: order[id(record)])
+        return failed
+
+    def _send(self, write: Callable[[List[Dict[str, Any]]], Any],
+              items: List[Tuple[Dict[str, Any], List[_Record]]]) -> List[_Record]:
+        """Write rows in one request, falling back to one request per row; returns failed records."""
+        try:
+            write([row for row, _ in items])
+            return []
+        except Exception as e:
+            if len(items) == 1:
+                logger.error(f"Error writing {items[0][1][0].table} row: {e}")
+                self._failed(items[0][1], e)
+                return list(items[0][1])
+            logger.warning(f"Bulk write of {len(items)} {items[0][1][0].table} rows failed, retrying one by one: {e}")
+        failed = []
+        for item in items:
+            failed.extend(self._send(write, [item]))
+        return failed
+
+    def _failed(self, records: List[_Record], error: Exception):
+        row_error = _is_row_error(error)
+        for record in records:
+            record.error = str(error)
+            if row_error:
+                record.attempts += 1
+
+    def _dead_letter(self, records: List[_Record]):
+        """Give up on records the database keeps rejecting."""
+        self.stats["dead_lettered"] += len(records)
+        for record in records:
+            logger.error(f"Giving up on bot journal {record.op} into {record.table} after {record.attempts} attempts "
+                         f"({record.error}): {record.to_json()}")
+        if not self.dead_letter_path:
+            return
+        try:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps({
+                        "table": record.table,
+                        "op": record.op,
+                        "data": record.data,
+                        "error": record.error,
+                        "attempts": record.attempts,
+                        "failed_at": datetime.utcnow().isoformat(),
+                    }, default=str) + "\n")
+        except Exception as e:
+            logger.warning(f"Could not write bot journal dead-letter log: {e}")
+
+    def _insert(self, table: str, rows: List[Dict[str, Any]]):
+        try:
+            self.supabase.table(table).insert(rows).execute()
+        except Exception as e:
+            error_msg = str(e).lower()
+            if table != LIVE_EVENTS_TABLE or not ("does not exist" in error_msg or "relation" in error_msg):
+                raise
+            logger.warning(f"{LIVE_EVENTS_TABLE} table does not exist yet. Please run migration 004_bot_events_live.sql. "
+                           f"Writing {len(rows)} events to {LEGACY_EVENTS_TABLE}")
+            self.supabase.table(LEGACY_EVENTS_TABLE).insert(rows).execute()
+
+    def _replay_wal(self):
+        if not os.path.exists(self.wal_path):
+            return
+        replayed = []
+        with open(self.wal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    table, op, data = json.loads(line)
+                except (ValueError, TypeError):
+                    continue  # Torn last line from a crash
+                replayed.append(_Record(table, op, data))
+        if replayed:
+            logger.warning(f"Replaying {len(replayed)} bot journal records from {self.wal_path}")
+            self._queue.extendleft(reversed(replayed))
+
+    def _compact_wal(self):
+        """Rewrite the WAL with only the records still pending."""
+        if not self._wal:
+            return
+        try:
+            tmp_path = f"{self.wal_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in self._queue:
+                    f.write(record.to_json() + "\n")
+            self._wal.close()
+            os.replace(tmp_path, self.wal_path)
+            self._wal = open(self.wal_path, "a", encoding="utf-8")
+        except Exception as e:
+            logger.warning(f"Could not compact bot journal WAL: {e}")
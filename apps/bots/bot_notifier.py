@@ -9,7 +9,9 @@ import asyncio
 import logging
 import sys
 import os
-from typing import Dict, Any, Optional
+import time
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 # Add paths - same pattern as run_condition_evaluator.py
@@ -28,7 +30,8 @@ if root_path not in sys.path:
     sys.path.insert(0, root_path)
 
 try:
-    from event_bus import EventBus, create_event_bus
+    from event_bus import EventBus, StreamEventBus, create_event_bus
+    import trigger_trace
     from apps.api.clients.supabase_client import supabase
 except ImportError as e:
     logging.error(f"Failed to import required modules: {e}")
@@ -38,6 +41,13 @@ except ImportError as e:
 
 logger = logging.getLogger(__name__)
 
+# Published by the condition registry router when subscriptions change
+SUBSCRIPTIONS_CHANNEL = "registry.subscriptions"
+
+SUBSCRIPTION_CACHE_TTL_SECONDS = int(os.getenv("NOTIFIER_SUBSCRIPTION_CACHE_TTL_SECONDS", "300"))
+BOT_CACHE_TTL_SECONDS = int(os.getenv("NOTIFIER_BOT_CACHE_TTL_SECONDS", "10"))
+PER_USER_CONCURRENCY = int(os.getenv("NOTIFIER_PER_USER_CONCURRENCY", "2"))
+
 
 class BotNotifier:
     """
@@ -52,6 +62,17 @@ class BotNotifier:
         self.running = False
         self.subscribed_conditions = set()
         
+        # condition_id -> (expires_at, active subscriptions); dropped on registry events
+        self._subscriptions: Dict[str, tuple] = {}
+        # bot_id -> (expires_at, bots row); short TTL so status changes apply quickly
+        self._bots: Dict[str, tuple] = {}
+        self._user_semaphores: Dict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(PER_USER_CONCURRENCY)
+        )
+        self._invalidation_bus: Optional[EventBus] = None
+        self._invalidation_task: Optional[asyncio.Task] = None
+        self.stats = {"subscription_hits": 0, "subscription_misses": 0, "bot_hits": 0, "bot_misses": 0}
+        
     async def initialize(self):
         """Initialize the bot notifier."""
         if not self.event_bus:
@@ -66,6 +87,8 @@ class BotNotifier:
         await self.event_bus.psubscribe("condition.*", self.handle_condition_trigger)
         logger.info("Subscribed to condition triggers (pattern: condition.*)")
         
+        await self._subscribe_invalidations()
+        
         self.running = True
         return True
     
@@ -77,6 +100,7 @@ class BotNotifier:
             event: Trigger event from Redis
         """
         try:
+            trigger_trace.mark(event.get("trace"), "received")
             condition_id = event.get("condition_id")
             symbol = event.get("symbol")
             triggered_at = event.get("triggered_at")
@@ -88,24 +112,121 @@ class BotNotifier:
                 logger.warning("Supabase not available - cannot fetch bot subscriptions")
                 return
             
-            # Fetch active subscriptions for this condition
-            subscriptions = supabase.table("user_condition_subscriptions").select(
-                "user_id, bot_id, bot_type, bot_config, id"
-            ).eq("condition_id", condition_id).eq("active", True).execute()
+            subscriptions = self._get_subscriptions(condition_id)
             
-            if not subscriptions.data:
+            if not subscriptions:
                 logger.debug(f"No active bots subscribed to condition {condition_id}")
                 return
             
-            logger.info(f"Found {len(subscriptions.data)} bots subscribed to condition {condition_id}")
+            logger.info(f"Found {len(subscriptions)} bots subscribed to condition {condition_id}")
             
-            # Process each subscription
-            for subscription in subscriptions.data:
-                await self.execute_bot_action(subscription, event)
+            # One query for every DCA bot not in the cache
+            self._prefetch_bots([s.get("bot_id") for s in subscriptions if s.get("bot_type", "dca") == "dca"])
+            
+            # Process subscriptions concurrently, at most PER_USER_CONCURRENCY per user
+            await asyncio.gather(*[
+                self._execute_for_user(subscription, event) for subscription in subscriptions
+            ])
         
         except Exception as e:
             logger.error(f"Error handling condition trigger: {e}", exc_info=True)
     
+    async def _execute_for_user(self, subscription: Dict[str, Any], trigger_event: Dict[str, Any]):
+        # Each subscriber gets its own branch of the trace; TradingService stamps
+        # order placement on whichever trace is active in this task
+        trace = trigger_trace.fork(
+            trigger_event.get("trace"), bot_id=subscription.get("bot_id"), condition_id=trigger_event.get("condition_id")
+        )
+        token = trigger_trace.activate(trace)
+        try:
+            async with self._user_semaphores[subscription.get("user_id")]:
+                await self.execute_bot_action(subscription, trigger_event)
+        finally:
+            trigger_trace.deactivate(token)
+            trigger_trace.mark(trace, "handled")
+            await trigger_trace.finish(trace, self.event_bus.redis_client if self.event_bus else None)
+    
+    def _get_subscriptions(self, condition_id: str) -> List[Dict[str, Any]]:
+        """Active subscriptions for a condition, from the cache when possible."""
+        cached = self._subscriptions.get(condition_id)
+        if cached and cached[0] > time.monotonic():
+            self.stats["subscription_hits"] += 1
+            return cached[1]
+        
+        self.stats["subscription_misses"] += 1
+        result = supabase.table("user_condition_subscriptions").select(
+            "user_id, bot_id, bot_type, bot_config, id"
+        ).eq("condition_id", condition_id).eq("active", True).execute()
+        subscriptions = result.data or []
+        self._subscriptions[condition_id] = (time.monotonic() + SUBSCRIPTION_CACHE_TTL_SECONDS, subscriptions)
+        return subscriptions
+    
+    def _prefetch_bots(self, bot_ids: List[str]):
+        """Load uncached bot rows, in one in_() query when several are missing."""
+        now = time.monotonic()
+        missing = list({bot_id for bot_id in bot_ids if bot_id and not self._bot_cached(bot_id, now)})
+        if len(missing) < 2:
+            return  # A single miss is fetched by _get_bot
+        try:
+            result = supabase.table("bots").select("*").in_("bot_id", missing).execute()
+        except Exception as e:
+            logger.warning(f"Bulk bot fetch failed, falling back to per-bot queries: {e}")
+            return
+        self.stats["bot_misses"] += len(missing)
+        expires = now + BOT_CACHE_TTL_SECONDS
+        for row in result.data or []:
+            self._bots[row["bot_id"]] = (expires, row)
+    
+    def _bot_cached(self, bot_id: str, now: float) -> bool:
+        cached = self._bots.get(bot_id)
+        return cached is not None and cached[0] > now
+    
+    def _get_bot(self, bot_id: str) -> Optional[Dict[str, Any]]:
+        """Bot row from the cache, or from the database on a miss."""
+        cached = self._bots.get(bot_id)
+        if cached and cached[0] > time.monotonic():
+            self.stats["bot_hits"] += 1
+            return cached[1]
+        
+        self.stats["bot_misses"] += 1
+        bot_result = supabase.table("bots").select("*").eq("bot_id", bot_id).execute()
+        if not bot_result.data:
+            return None
+        self._bots[bot_id] = (time.monotonic() + BOT_CACHE_TTL_SECONDS, bot_result.data[0])
+        return bot_result.data[0]
+    
+    async def handle_registry_event(self, event: Dict[str, Any]):
+        """Drop cached subscriptions and bots touched by a registry or bot status change."""
+        condition_id = event.get("condition_id")
+        bot_id = event.get("bot_id")
+        if condition_id:
+            self._subscriptions.pop(condition_id, None)
+        elif not bot_id:
+            self._subscriptions.clear()
+        if bot_id:
+            self._bots.pop(bot_id, None)
+        logger.debug(f"Invalidated cache for condition {condition_id} bot {bot_id}")
+    
+    async def _subscribe_invalidations(self):
+        """
+        Listen for registry invalidation events.
+        
+        They must reach every notifier instance, so with the streams transport
+        (where a consumer group splits events) they go over a separate pub/sub bus.
+        """
+        bus = self.event_bus
+        if isinstance(self.event_bus, StreamEventBus):
+            bus = EventBus(self.event_bus.redis_url)
+            if not await bus.connect():
+                logger.warning("Cache invalidation unavailable - relying on cache TTLs")
+                return
+            self._invalidation_bus = bus
+        
+        await bus.subscribe(SUBSCRIPTIONS_CHANNEL, self.handle_registry_event)
+        if self._invalidation_bus:
+            self._invalidation_task = asyncio.create_task(self._invalidation_bus.start_listening())
+        logger.info(f"Subscribed to cache invalidations ({SUBSCRIPTIONS_CHANNEL})")
+    
     async def execute_bot_action(self, subscription: Dict[str, Any], trigger_event: Dict[str, Any]):
         """
         Execute action for a bot when condition triggers.
@@ -152,14 +273,12 @@ class BotNotifier:
                 logger.error(f"No price in trigger event for bot {bot_id}")
                 return
             
-            # Get bot config from database
+            # Get bot config (cached; prefetched in bulk per trigger)
             if supabase:
-                bot_result = supabase.table("bots").select("*").eq("bot_id", bot_id).execute()
-                if not bot_result.data:
+                full_bot_config = self._get_bot(bot_id)
+                if not full_bot_config:
                     logger.error(f"Bot {bot_id} not found in database")
                     return
-                
-                full_bot_config = bot_result.data[0]
             else:
                 full_bot_config = {"bot_id": bot_id, "config": bot_config}
             
@@ -257,6 +376,20 @@ class BotNotifier:
             self.event_bus.stop_listening()
             await self.event_bus.disconnect()
         
+        if self._invalidation_bus:
+            self._invalidation_bus.stop_listening()
+            if self._invalidation_task:
+                await asyncio.gather(self._invalidation_task, return_exceptions=True)
+            await self._invalidation_bus.disconnect()
+        
+        # Orders, positions and funds written by the executors are journaled;
+        # write them before the process exits
+        try:
+            from db_service import db_service
+            await db_service.stop_journal()
+        except Exception as e:
+            logger.error(f"Error flushing bot journal: {e}", exc_info=True)
+        
         logger.info("Bot notifier stopped")
 
 
@@ -115,6 +115,10 @@ class BotRunner:
                 
         if self.executor:
             await self.executor.cleanup()
+        
+        # Write this bot's journaled orders and positions before returning
+        if db_service:
+            await db_service.flush_journal()
             
         logger.info("Bot runner stopped")
         
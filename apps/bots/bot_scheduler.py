@@ -0,0 +1,245 @@
+"""
+Bot Scheduler - One timer for all running bots.
+
+BotExecutionService used to run one asyncio task per bot, each sleeping its
+own interval after every iteration. Start times drifted by the iteration
+cost, and bots started together kept waking together. Here a single heap of
+due times drives every bot:
+
+- Due times are fixed-rate (previous due + interval), so they do not drift.
+  When an iteration is still running at its next due time, that slot is
+  skipped instead of overlapping.
+- After its first iteration, a bot is aligned to a phase derived from its
+  first pair, at least half an interval later. Bots on the same pair and interval wake together, and
+  different pairs are spread across the interval.
+- Bots due at the same moment run as one batch. Prices for all their pairs
+  are fetched in one request before any of them runs. Concurrent kline reads
+  for the same pair share one fetch in the market data hub.
+
+Scheduling lag (start - due) and per-bot iteration cost are kept in
+``stats`` and exported as Prometheus metrics.
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+import sys
+import time
+import zlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Add root path for 'apps' modules
+root_path = os.path.join(os.path.dirname(__file__), '..', '..')
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+try:
+    from apps.api.metrics import record_bot_iteration, record_bot_iteration_skipped
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENCY = int(os.getenv("BOT_SCHEDULER_MAX_CONCURRENCY", "50"))
+
+
+class _ScheduledBot:
+    __slots__ = ("bot_id", "interval", "symbols", "phase", "due", "task", "stats")
+
+    def __init__(self, bot_id: str, interval: float, symbols: List[str]):
+        self.bot_id = bot_id
+        self.interval = interval
+        self.symbols = symbols
+        # Same first pair -> same phase, so those bots share a batch
+        anchor = symbols[0] if symbols else bot_id
+        self.phase = (zlib.crc32(anchor.encode()) % 10_000) / 10_000 * interval
+        self.due = 0.0
+        self.task: Optional[asyncio.Task] = None
+        self.stats = {
+            "iterations": 0,
+            "skipped": 0,
+            "last_iteration_seconds": 0.0,
+            "avg_iteration_seconds": 0.0,
+            "last_lag_seconds": 0.0,
+        }
+
+    def next_slot(self, after: float) -> float:
+        """First phase-aligned time strictly after `after`."""
+        slots = int((after - self.phase) // self.interval) + 1
+        return self.phase + slots * self.interval
+
+
+class BotScheduler:
+    """
+    Heap scheduler calling run_iteration(bot_id) for every bot on its interval.
+
+    Usage:
+        scheduler = BotScheduler(service._run_iteration, market_data=market_data_hub)
+        scheduler.add("bot-1", 60, ["BTCUSDT"])
+        await scheduler.remove("bot-1")
+    """
+
+    def __init__(
+        self,
+        run_iteration: Callable[[str], Awaitable[None]],
+        market_data: Any = None,
+        max_concurrency: int = MAX_CONCURRENCY
+    ):
+        self.run_iteration = run_iteration
+        self.market_data = market_data
+        self.bots: Dict[str, _ScheduledBot] = {}
+        self._heap: List[Tuple[float, str, int]] = []  # (due, bot_id, id(entry))
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.stats = {"batches": 0, "iterations": 0, "skipped": 0, "max_lag_seconds": 0.0}
+
+    def add(self, bot_id: str, interval_seconds: float, symbols: Optional[List[str]] = None):
+        """Schedule a bot; its first iteration runs right away."""
+        if bot_id in self.bots:
+            raise ValueError(f"Bot {bot_id} is already scheduled")
+        entry = _ScheduledBot(bot_id, float(interval_seconds), list(symbols or []))
+        entry.due = time.monotonic()
+        self.bots[bot_id] = entry
+        self._push(entry)
+        self._ensure_running()
+
+    async def remove(self, bot_id: str):
+        """Unschedule a bot and cancel its running iteration, if any."""
+        entry = self.bots.pop(bot_id, None)
+        if entry is None or entry.task is None or entry.task.done():
+            return
+        if entry.task is asyncio.current_task():
+            return  # Removed from inside its own iteration; let it finish
+        entry.task.cancel()
+        await asyncio.gather(entry.task, return_exceptions=True)
+
+    def seconds_until_due(self, bot_id: str) -> Optional[float]:
+        entry = self.bots.get(bot_id)
+        if entry is None:
+            return None
+        return max(0.0, entry.due - time.monotonic())
+
+    def bot_stats(self, bot_id: str) -> Dict[str, Any]:
+        entry = self.bots.get(bot_id)
+        return dict(entry.stats) if entry else {}
+
+    async def stop(self):
+        """Stop scheduling and cancel running iterations."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for bot_id in list(self.bots):
+            await self.remove(bot_id)
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        else:
+            self._wakeup.set()
+
+    def _push(self, entry: _ScheduledBot):
+        heapq.heappush(self._heap, (entry.due, entry.bot_id, id(entry)))
+
+    async def _run(self):
+        logger.info("Bot scheduler started")
+        while True:
+            try:
+                await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in bot scheduler: {e}", exc_info=True)
+                await asyncio.sleep(1)
+
+    async def _tick(self):
+        # Drop heap entries of removed or re-added bots
+        while self._heap and self._stale(self._heap[0]):
+            heapq.heappop(self._heap)
+        if not self._heap:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+            return
+
+        delay = self._heap[0][0] - time.monotonic()
+        if delay > 0:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            return
+
+        now = time.monotonic()
+        batch: List[Tuple[_ScheduledBot, float]] = []
+        while self._heap and self._heap[0][0] <= now:
+            item = heapq.heappop(self._heap)
+            if self._stale(item):
+                continue
+            entry = self.bots[item[1]]
+            due = entry.due
+            if entry.task is not None and not entry.task.done():
+                # Previous iteration still running: skip this slot
+                entry.stats["skipped"] += 1
+                self.stats["skipped"] += 1
+                if METRICS_AVAILABLE:
+                    record_bot_iteration_skipped()
+                logger.debug(f"Bot {entry.bot_id} iteration overran its interval, skipping a slot")
+            else:
+                batch.append((entry, due))
+            if entry.task is None:
+                # First run happens right away; keep the first aligned slot at
+                # least half an interval after it so the bot does not run twice
+                # almost back to back
+                entry.due = entry.next_slot(now + entry.interval / 2)
+            else:
+                # Next aligned slot; slots missed while lagging are dropped, not replayed
+                entry.due = entry.next_slot(now)
+            self._push(entry)
+
+        if batch:
+            await self._start_batch(batch)
+
+    def _stale(self, item: Tuple[float, str, int]) -> bool:
+        entry = self.bots.get(item[1])
+        return entry is None or id(entry) != item[2] or entry.due != item[0]
+
+    async def _start_batch(self, batch: List[Tuple[_ScheduledBot, float]]):
+        self.stats["batches"] += 1
+        symbols = sorted({symbol for entry, _ in batch for symbol in entry.symbols})
+        if symbols and hasattr(self.market_data, "get_prices"):
+            # One price snapshot for every bot in the batch
+            try:
+                await self.market_data.get_prices(symbols)
+            except Exception as e:
+                logger.warning(f"Price prefetch for {len(symbols)} symbols failed: {e}")
+        for entry, due in batch:
+            entry.task = asyncio.create_task(self._run_bot(entry, due))
+
+    async def _run_bot(self, entry: _ScheduledBot, due: float):
+        async with self._semaphore:
+            started = time.monotonic()
+            lag = max(0.0, started - due)
+            failed = False
+            try:
+                await self.run_iteration(entry.bot_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failed = True
+                logger.error(f"Error in iteration for bot {entry.bot_id}: {e}", exc_info=True)
+            finally:
+                duration = time.monotonic() - started
+                stats = entry.stats
+                stats["iterations"] += 1
+                stats["last_iteration_seconds"] = duration
+                stats["avg_iteration_seconds"] += (duration - stats["avg_iteration_seconds"]) / stats["iterations"]
+                stats["last_lag_seconds"] = lag
+                self.stats["iterations"] += 1
+                self.stats["max_lag_seconds"] = max(self.stats["max_lag_seconds"], lag)
+                if METRICS_AVAILABLE:
+                    record_bot_iteration(lag, duration, failed)
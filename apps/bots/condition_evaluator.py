@@ -2,11 +2,12 @@
 
 import asyncio
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Set, Tuple
 from datetime import datetime
 import pandas as pd
 import sys
 import os
+import time
 
 # Add paths
 bots_path = os.path.dirname(__file__)
@@ -14,7 +15,11 @@ if bots_path not in sys.path:
     sys.path.insert(0, bots_path)
 
 from market_data import MarketDataService
-from backend.evaluator import evaluate_condition
+from condition_index import ConditionIndex
+from trigger_writer import TriggerWriter
+import trigger_trace
+from indicator_frame_cache import IndicatorFrameCache, indicator_spec, spec_columns
+from backend.evaluator import ConditionPlan, compile_condition, evaluate_conditions_batch
 
 logger = logging.getLogger(__name__)
 
@@ -33,15 +38,42 @@ class CentralizedConditionEvaluator:
         self.supabase = supabase_client
         self.event_bus = event_bus  # Redis/RabbitMQ event bus
         self.evaluation_cache = {}  # Cache indicator values
+        self.indicator_frames = IndicatorFrameCache()  # Incremental indicator series per symbol/timeframe
+        self.condition_plans: Dict[str, ConditionPlan] = {}  # Compiled conditions by condition_id
+        # In-memory registry/subscriptions, refreshed in the background; plans and
+        # indicator series are dropped with the conditions they were built for
+        self.condition_index = ConditionIndex(
+            supabase_client,
+            on_key_removed=self.indicator_frames.evict,
+            on_condition_removed=self._drop_condition_plan
+        ) if supabase_client else None
+        # Write-behind queue for trigger rows and trigger counters
+        self.trigger_writer = TriggerWriter(supabase_client) if supabase_client else None
         self.running = False
+        # Event-driven mode (see start_event_loop)
+        self._bar_events: Optional[asyncio.Queue] = None
+        self._event_keys: Set[Tuple[str, str]] = set()
+        self._last_evaluated_bar: Dict[Tuple[str, str], int] = {}
+        self._pending_ticks: Set[Tuple[str, str]] = set()
+        self._intrabar = False
         
     async def initialize(self):
         """Initialize the evaluator."""
         await self.market_data.initialize()
+        if self.condition_index:
+            await self.condition_index.start()
+        if self.trigger_writer:
+            await self.trigger_writer.start()
         self.running = True
         logger.info("Centralized Condition Evaluator initialized")
     
-    async def evaluate_symbol_timeframe(self, symbol: str, timeframe: str):
+    async def evaluate_symbol_timeframe(
+        self,
+        symbol: str,
+        timeframe: str,
+        bar_time: Optional[int] = None,
+        per_tick_only: bool = False
+    ):
         """
         Evaluate all conditions for a specific symbol/timeframe.
         
@@ -50,6 +82,13 @@ class CentralizedConditionEvaluator:
         
         KEY OPTIMIZATION: Even if 500 users have different price ranges on BTCUSDT,
         we fetch BTCUSDT data ONCE and evaluate all conditions together.
+        
+        Args:
+            bar_time: Open time (ms) of a bar that just closed. Candles after it
+                are dropped so the closed bar is evaluated even if the next bar
+                has already started.
+            per_tick_only: Only evaluate conditions with fire_mode "per_tick"
+                (intrabar evaluation on the forming bar)
         """
         if not self.running:
             return
@@ -59,6 +98,9 @@ class CentralizedConditionEvaluator:
             logger.debug(f"Fetching market data for {symbol} {timeframe} (shared by all conditions)")
             df = await self.market_data.get_klines_as_dataframe(symbol, timeframe, limit=200)
             
+            if bar_time is not None and not df.empty:
+                df = df[df["open_time"] <= pd.to_datetime(bar_time, unit="ms")]
+            
             if df.empty:
                 logger.warning(f"No data for {symbol} {timeframe}")
                 return
@@ -66,6 +108,11 @@ class CentralizedConditionEvaluator:
             # Step 2: Get ALL conditions for this symbol/timeframe
             # This includes conditions from ALL users with different price ranges
             conditions = await self._get_conditions_for_symbol_timeframe(symbol, timeframe)
+            if per_tick_only:
+                conditions = [
+                    c for c in conditions
+                    if (c.get("indicator_config") or {}).get("fire_mode") == "per_tick"
+                ]
             
             if not conditions:
                 logger.debug(f"No conditions to evaluate for {symbol} {timeframe}")
@@ -75,47 +122,56 @@ class CentralizedConditionEvaluator:
             
             # Step 3: Calculate indicators once (only for indicator-based conditions)
             # Price conditions don't need indicators - they use price directly
-            indicator_cache = await self._calculate_indicators(df, conditions)
+            indicator_cache = await self._calculate_indicators(
+                df, conditions, symbol, timeframe, last_bar_closed=bar_time is not None
+            )
             
-            # Step 4: Evaluate each condition using the SAME market data
+            # Step 4: Evaluate ALL conditions in one batch against the SAME market data
             # Even if conditions have different price ranges, they all use same price data
-            current_price = float(df.iloc[-1]["close"])
+            plans = [self._get_condition_plan(condition) for condition in conditions]
+            triggered = evaluate_conditions_batch(df, plans)
             
-            for condition in conditions:
-                await self._evaluate_condition(condition, df, indicator_cache, symbol, timeframe)
+            # Handle triggers concurrently so their event bus publishes share pipelined round trips
+            latest_candle = df.iloc[-1]
+            await asyncio.gather(*[
+                self._handle_condition_trigger(condition, latest_candle, symbol, timeframe)
+                for condition, is_triggered in zip(conditions, triggered)
+                if is_triggered
+            ])
             
             # Step 5: Update evaluation cache
-            await self._update_evaluation_cache(symbol, timeframe, df.iloc[-1].name, indicator_cache)
+            await self._update_evaluation_cache(symbol, timeframe, latest_candle["open_time"], indicator_cache)
             
         except Exception as e:
             logger.error(f"Error evaluating {symbol} {timeframe}: {e}", exc_info=True)
     
     async def _get_conditions_for_symbol_timeframe(self, symbol: str, timeframe: str) -> List[Dict]:
-        """Get all unique conditions for a symbol/timeframe."""
-        if not self.supabase:
-            return []
-        
-        try:
-            result = self.supabase.table("condition_registry").select("*").eq(
-                "symbol", symbol
-            ).eq("timeframe", timeframe).execute()
-            
-            return result.data if result.data else []
-        except Exception as e:
-            logger.error(f"Error fetching conditions: {e}")
+        """Get all unique conditions for a symbol/timeframe (from the in-memory index)."""
+        if not self.condition_index:
             return []
+        return self.condition_index.conditions_for(symbol, timeframe)
     
-    async def _calculate_indicators(self, df: pd.DataFrame, conditions: List[Dict]) -> Dict[str, Any]:
+    async def _calculate_indicators(
+        self,
+        df: pd.DataFrame,
+        conditions: List[Dict],
+        symbol: str,
+        timeframe: str,
+        last_bar_closed: bool = False
+    ) -> Dict[str, Any]:
         """
         Calculate all needed indicators once.
         
-        Returns a cache of indicator values that can be reused.
+        Each distinct (indicator, params) pair requested by the conditions is
+        served from the shared indicator frame cache, which only processes
+        bars that closed since the previous cycle. Columns are added to df.
+        
+        Returns the latest value of every indicator column that was added.
         Note: Price conditions don't need indicator calculation - price is already in df.
         """
-        cache = {}
-        indicators_needed = set()
+        specs = set()
         
-        # Collect all unique indicators needed (skip price conditions)
+        # Collect all unique indicator/parameter sets needed (skip price conditions)
         for condition in conditions:
             indicator_config = condition.get("indicator_config", {})
             condition_type = indicator_config.get("condition_type", "indicator")
@@ -124,74 +180,88 @@ class CentralizedConditionEvaluator:
             if condition_type == "price":
                 continue
             
-            indicator = indicator_config.get("indicator")
-            if indicator:
-                indicators_needed.add(indicator)
+            spec = indicator_spec(indicator_config.get("indicator"), indicator_config.get("period"))
+            if spec:
+                specs.add(spec)
         
-        # Calculate each indicator once
-        for indicator in indicators_needed:
-            try:
-                if indicator == "RSI":
-                    period = 14  # Default, could be extracted from condition
-                    cache["RSI"] = self._calculate_rsi(df, period)
-                elif indicator == "MACD":
-                    cache["MACD"] = self._calculate_macd(df)
-                elif indicator in ["EMA", "SMA"]:
-                    period = 20  # Default
-                    cache[indicator] = self._calculate_ma(df, indicator, period)
-                # Add more indicators as needed
-            except Exception as e:
-                logger.error(f"Error calculating {indicator}: {e}")
+        self.indicator_frames.apply(symbol, timeframe, df, specs, last_bar_closed=last_bar_closed)
         
-        return cache
+        return {
+            column: float(df[column].iloc[-1])
+            for spec in specs
+            for column in spec_columns(spec)
+            if column in df.columns
+        }
     
-    async def _evaluate_condition(
-        self, 
-        condition: Dict, 
-        df: pd.DataFrame, 
-        indicator_cache: Dict,
+    def _build_eval_condition(self, condition: Dict) -> Dict[str, Any]:
+        """Convert a registry row into the condition format the evaluator understands."""
+        indicator_config = condition.get("indicator_config", {})
+        condition_type = indicator_config.get("condition_type", "indicator")
+        
+        eval_condition = {
+            "type": condition_type,
+            "indicator": indicator_config.get("indicator"),
+            "component": indicator_config.get("component"),
+            "operator": indicator_config.get("operator", "between" if condition_type == "price" else ">"),
+            "compareWith": indicator_config.get("compare_with", "value"),
+            "compareValue": indicator_config.get("compare_value"),
+            "period": indicator_config.get("period"),
+        }
+        
+        # Resolve the default period so the evaluator reads the matching cached column
+        spec = indicator_spec(indicator_config.get("indicator"), indicator_config.get("period"))
+        if spec and spec[0] != "MACD":
+            eval_condition["period"] = spec[1][0]
+        
+        # Handle price conditions (for grid bots)
+        if condition_type == "price":
+            eval_condition["priceField"] = indicator_config.get("price_field", "close")
+            # Add bounds for "between" operator
+            if indicator_config.get("lower_bound") is not None:
+                eval_condition["lowerBound"] = indicator_config["lower_bound"]
+            if indicator_config.get("upper_bound") is not None:
+                eval_condition["upperBound"] = indicator_config["upper_bound"]
+        
+        return eval_condition
+    
+    def _get_condition_plan(self, condition: Dict) -> ConditionPlan:
+        """
+        Get the compiled plan for a registry condition.
+        
+        condition_id is a hash of the normalized condition, so a plan compiled
+        once stays valid for the lifetime of the evaluator.
+        """
+        condition_id = condition["condition_id"]
+        plan = self.condition_plans.get(condition_id)
+        if plan is None:
+            plan = compile_condition(self._build_eval_condition(condition))
+            self.condition_plans[condition_id] = plan
+        return plan
+    
+    def _drop_condition_plan(self, condition_id: str):
+        """ConditionIndex hook: the condition was deleted from the registry."""
+        self.condition_plans.pop(condition_id, None)
+    
+    async def _handle_condition_trigger(
+        self,
+        condition: Dict,
+        latest_candle: pd.Series,
         symbol: str,
         timeframe: str
     ):
-        """Evaluate a single condition."""
+        """Publish and record a triggered condition."""
         try:
             condition_id = condition["condition_id"]
-            indicator_config = condition.get("indicator_config", {})
-            condition_type = indicator_config.get("condition_type", "indicator")
-            
-            # Prepare condition for evaluation
-            eval_condition = {
-                "type": condition_type,
-                "indicator": indicator_config.get("indicator"),
-                "component": indicator_config.get("component"),
-                "operator": indicator_config.get("operator", "between" if condition_type == "price" else ">"),
-                "compareWith": indicator_config.get("compare_with", "value"),
-                "compareValue": indicator_config.get("compare_value"),
-                "period": indicator_config.get("period"),
-            }
+            eval_condition = self._build_eval_condition(condition)
             
-            # Handle price conditions (for grid bots)
-            if condition_type == "price":
-                eval_condition["priceField"] = indicator_config.get("price_field", "close")
-                # Add bounds for "between" operator
-                if indicator_config.get("lower_bound") is not None:
-                    eval_condition["lowerBound"] = indicator_config["lower_bound"]
-                if indicator_config.get("upper_bound") is not None:
-                    eval_condition["upperBound"] = indicator_config["upper_bound"]
-            
-            # Evaluate condition
-            row_index = len(df) - 1  # Latest candle
-            triggered = evaluate_condition(df, row_index, eval_condition)
+            # Condition triggered! Publish event
+            await self._publish_condition_trigger(condition_id, symbol, timeframe, eval_condition, latest_candle)
             
-            if triggered:
-                # Condition triggered! Publish event
-                await self._publish_condition_trigger(condition_id, symbol, timeframe, eval_condition, df.iloc[-1])
-                
-                # Update condition stats
-                await self._update_condition_stats(condition_id)
+            # Update condition stats
+            await self._update_condition_stats(condition_id)
         
         except Exception as e:
-            logger.error(f"Error evaluating condition {condition.get('condition_id')}: {e}", exc_info=True)
+            logger.error(f"Error handling trigger for condition {condition.get('condition_id')}: {e}", exc_info=True)
     
     async def _publish_condition_trigger(
         self,
@@ -204,12 +274,10 @@ class CentralizedConditionEvaluator:
         """Publish condition trigger event to all subscribers."""
         try:
             # Get all subscribers for this condition
-            if self.supabase:
-                subscribers = self.supabase.table("user_condition_subscriptions").select(
-                    "user_id, bot_id, bot_type, bot_config"
-                ).eq("condition_id", condition_id).eq("active", True).execute()
+            if self.condition_index:
+                subscribers = self.condition_index.subscribers(condition_id)
                 
-                if not subscribers.data:
+                if not subscribers:
                     logger.debug(f"No subscribers for condition {condition_id}")
                     return
                 
@@ -223,28 +291,38 @@ class CentralizedConditionEvaluator:
                         "price": float(latest_candle.get("close", 0)),
                         "volume": float(latest_candle.get("volume", 0)),
                     },
-                    "subscribers_count": len(subscribers.data)
+                    "subscribers_count": len(subscribers)
                 }
                 
-                # Log trigger
-                if self.supabase:
-                    self.supabase.table("condition_triggers").insert(trigger_event).execute()
+                # Log trigger (batched by the write-behind queue)
+                if self.trigger_writer:
+                    await self.trigger_writer.add_trigger(trigger_event)
                 
-                # Publish to event bus (if available)
+                # Publish to event bus (if available), with a latency trace
                 if self.event_bus:
                     channel = f"condition.{condition_id}"
-                    await self.event_bus.publish(channel, trigger_event)
+                    trace = trigger_trace.start(self._bar_close_ts(latest_candle))
+                    await self.event_bus.publish(channel, {**trigger_event, "trace": trace})
                     logger.debug(f"Published trigger event to channel: {channel}")
                 
                 # Notify each subscriber
-                for subscriber in subscribers.data:
+                for subscriber in subscribers:
                     await self._notify_subscriber(subscriber, trigger_event)
                 
-                logger.info(f"✅ Condition {condition_id} triggered for {len(subscribers.data)} subscribers")
+                logger.info(f"✅ Condition {condition_id} triggered for {len(subscribers)} subscribers")
         
         except Exception as e:
             logger.error(f"Error publishing condition trigger: {e}", exc_info=True)
     
+    @staticmethod
+    def _bar_close_ts(latest_candle: pd.Series) -> Optional[float]:
+        """Close time of the candle in epoch seconds, or None while it is still open."""
+        close_time = latest_candle.get("close_time")
+        if close_time is None or pd.isna(close_time):
+            return None
+        close_ts = (int(close_time) + 1) / 1000  # Binance close_time is the bar's last millisecond
+        return close_ts if close_ts <= time.time() else None
+    
     async def _notify_subscriber(self, subscriber: Dict, trigger_event: Dict):
         """
         Notify a single subscriber about condition trigger.
@@ -259,23 +337,11 @@ class CentralizedConditionEvaluator:
         # This method logs the notification for tracking purposes
     
     async def _update_condition_stats(self, condition_id: str):
-        """Update condition statistics."""
-        if not self.supabase:
+        """Update condition statistics (coalesced and flushed by the trigger writer)."""
+        if not self.trigger_writer:
             return
         
-        try:
-            # Get current trigger count
-            current = self.supabase.table("condition_registry").select("trigger_count").eq("condition_id", condition_id).execute()
-            current_count = current.data[0]["trigger_count"] if current.data else 0
-            
-            # Update with incremented count
-            self.supabase.table("condition_registry").update({
-                "last_triggered_at": datetime.now().isoformat(),
-                "trigger_count": current_count + 1,
-                "last_evaluated_at": datetime.now().isoformat()
-            }).eq("condition_id", condition_id).execute()
-        except Exception as e:
-            logger.error(f"Error updating condition stats: {e}")
+        self.trigger_writer.increment_trigger_count(condition_id)
     
     async def _update_evaluation_cache(
         self,
@@ -300,38 +366,6 @@ class CentralizedConditionEvaluator:
             except Exception as e:
                 logger.error(f"Error updating cache: {e}")
     
-    # Indicator calculation methods
-    def _calculate_rsi(self, df: pd.DataFrame, period: int = 14) -> pd.Series:
-        """Calculate RSI."""
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
-        return rsi
-    
-    def _calculate_macd(self, df: pd.DataFrame) -> Dict[str, pd.Series]:
-        """Calculate MACD."""
-        ema_12 = df['close'].ewm(span=12).mean()
-        ema_26 = df['close'].ewm(span=26).mean()
-        macd = ema_12 - ema_26
-        signal = macd.ewm(span=9).mean()
-        histogram = macd - signal
-        return {
-            "macd": macd,
-            "signal": signal,
-            "histogram": histogram
-        }
-    
-    def _calculate_ma(self, df: pd.DataFrame, ma_type: str, period: int) -> pd.Series:
-        """Calculate moving average."""
-        if ma_type == "EMA":
-            return df['close'].ewm(span=period).mean()
-        elif ma_type == "SMA":
-            return df['close'].rolling(window=period).mean()
-        else:
-            return df['close'].ewm(span=period).mean()  # Default to EMA
-    
     async def start_evaluation_loop(self, symbols: Optional[List[str]] = None, timeframes: List[str] = ["1m"], interval_seconds: int = 60):
         """
         Start continuous evaluation loop.
@@ -371,29 +405,114 @@ class CentralizedConditionEvaluator:
                 logger.error(f"Error in evaluation loop: {e}", exc_info=True)
                 await asyncio.sleep(interval_seconds)
     
-    async def _get_active_symbols(self) -> List[str]:
-        """Get list of symbols that have active conditions."""
-        if not self.supabase:
-            return []
+    async def start_event_loop(
+        self,
+        timeframes: List[str] = ["1m"],
+        intrabar: bool = False,
+        refresh_seconds: int = 60,
+        workers: int = 4
+    ):
+        """
+        Evaluate conditions when bars close instead of on a fixed interval.
         
+        Every active (symbol, timeframe) is subscribed on the kline store; each
+        closed bar (x=True) queues exactly one evaluation of that pair. With
+        intrabar=True, forming-bar updates also queue an evaluation of the
+        "per_tick" conditions (at most one pending per pair).
+        
+        Active symbols are re-discovered every refresh_seconds.
+        """
+        store = getattr(self.market_data, 'kline_store', None)
+        if store is None:
+            logger.warning("Kline store disabled - falling back to interval evaluation loop")
+            await self.start_evaluation_loop(timeframes=timeframes, interval_seconds=refresh_seconds)
+            return
+        
+        logger.info(f"Starting bar-close evaluation for timeframes: {timeframes} (intrabar={intrabar})")
+        self._bar_events = asyncio.Queue()
+        self._intrabar = intrabar
+        store.add_listener(self._on_kline)
+        
+        worker_tasks = [asyncio.create_task(self._bar_event_worker()) for _ in range(workers)]
         try:
-            # Get unique symbols from condition registry
-            result = self.supabase.table("condition_registry").select("symbol").execute()
-            if not result.data:
-                return []
-            
-            # Extract unique symbols
-            symbols = list(set([row["symbol"] for row in result.data]))
-            return symbols
-        except Exception as e:
-            logger.error(f"Error getting active symbols: {e}")
+            while self.running:
+                try:
+                    symbols = await self._get_active_symbols()
+                    keys = {(symbol, timeframe) for symbol in symbols for timeframe in timeframes}
+                    new_keys = keys - self._event_keys
+                    removed_keys = self._event_keys - keys
+                    self._event_keys = keys
+                    # Seeds the series and subscribes the stream
+                    await asyncio.gather(
+                        *(store.ensure(symbol, timeframe, 200) for symbol, timeframe in new_keys),
+                        return_exceptions=True
+                    )
+                    if new_keys:
+                        logger.info(f"Subscribed {len(new_keys)} symbol/timeframe streams for evaluation")
+                    # Pairs without conditions give their stream back (1024 per connection)
+                    await asyncio.gather(
+                        *(store.release(symbol, timeframe) for symbol, timeframe in removed_keys),
+                        return_exceptions=True
+                    )
+                    for key in removed_keys:
+                        self._last_evaluated_bar.pop(key, None)
+                        self._pending_ticks.discard(key)
+                    if removed_keys:
+                        logger.info(f"Released {len(removed_keys)} symbol/timeframe streams without conditions")
+                except Exception as e:
+                    logger.error(f"Error refreshing evaluation streams: {e}", exc_info=True)
+                await asyncio.sleep(refresh_seconds)
+        finally:
+            store.remove_listener(self._on_kline)
+            for task in worker_tasks:
+                task.cancel()
+            await asyncio.gather(*worker_tasks, return_exceptions=True)
+    
+    def _on_kline(self, symbol: str, timeframe: str, candle):
+        """Kline store listener - queue evaluations (runs inside the websocket reader)."""
+        key = (symbol, timeframe)
+        if key not in self._event_keys or self._bar_events is None:
+            return
+        if candle.x:
+            self._bar_events.put_nowait((symbol, timeframe, candle.t))
+        elif self._intrabar and key not in self._pending_ticks:
+            self._pending_ticks.add(key)
+            self._bar_events.put_nowait((symbol, timeframe, None))
+    
+    async def _bar_event_worker(self):
+        """Process queued bar-close / intrabar evaluations."""
+        while self.running:
+            symbol, timeframe, bar_time = await self._bar_events.get()
+            key = (symbol, timeframe)
+            try:
+                if bar_time is None:
+                    self._pending_ticks.discard(key)
+                    await self.evaluate_symbol_timeframe(symbol, timeframe, per_tick_only=True)
+                elif self._last_evaluated_bar.get(key, -1) < bar_time:
+                    self._last_evaluated_bar[key] = bar_time
+                    await self.evaluate_symbol_timeframe(symbol, timeframe, bar_time=bar_time)
+            except Exception as e:
+                logger.error(f"Error handling bar event for {symbol} {timeframe}: {e}")
+            finally:
+                self._bar_events.task_done()
+    
+    async def _get_active_symbols(self) -> List[str]:
+        """Get list of symbols that have active conditions."""
+        if not self.condition_index:
             return []
+        return self.condition_index.symbols()
     
     async def stop(self):
         """Stop the evaluator."""
         self.running = False
+        if self.condition_index:
+            await self.condition_index.stop()
+        if self.trigger_writer:
+            await self.trigger_writer.stop()
         # Cleanup market data service
         if hasattr(self, 'market_data') and self.market_data:
             await self.market_data.cleanup()
+            if getattr(self.market_data, 'kline_store', None):
+                await self.market_data.kline_store.stop()
         logger.info("Centralized Condition Evaluator stopped")
 
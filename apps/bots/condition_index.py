@@ -0,0 +1,306 @@
+"""
+Condition Index - In-memory view of condition_registry and active subscriptions.
+
+The evaluator used to select the whole registry to discover symbols and then
+query once per symbol/timeframe on every cycle. This index loads both tables
+once, groups conditions by (symbol, timeframe) and keeps itself current:
+
+- Incremental refresh: rows with ``updated_at`` at or after the last seen
+  watermark (both tables have an updated_at trigger).
+- Periodic full reload: picks up deletes and rows committed late.
+- apply_change(): hook for a push-style change feed (e.g. Supabase realtime /
+  Postgres NOTIFY payloads).
+- on_key_removed is called with (symbol, timeframe) when the last condition
+  for that pair goes away, and on_condition_removed with the condition_id of
+  a deleted condition, so caches built from them can be dropped.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Any, List, Optional, Set, Tuple
+
+# Add root path for 'apps' modules
+root_path = os.path.join(os.path.dirname(__file__), '..', '..')
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+try:
+    from apps.api.metrics import record_condition_index_lookup, record_condition_index_refresh
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_TABLE = "condition_registry"
+SUBSCRIPTIONS_TABLE = "user_condition_subscriptions"
+
+# Supabase returns at most 1000 rows per request
+_PAGE_SIZE = 1000
+
+
+class ConditionIndex:
+    """
+    Conditions grouped by (symbol, timeframe) plus active subscribers per condition.
+
+    Usage:
+        index = ConditionIndex(supabase)
+        await index.start()
+        conditions = index.conditions_for("BTCUSDT", "1m")
+        subscribers = index.subscribers("a1b2c3d4e5f6a7b8")
+    """
+
+    def __init__(
+        self,
+        supabase_client,
+        refresh_seconds: int = 15,
+        full_reload_seconds: int = 600,
+        on_key_removed: Optional[Callable[[str, str], None]] = None,
+        on_condition_removed: Optional[Callable[[str], None]] = None
+    ):
+        self.supabase = supabase_client
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self.on_key_removed = on_key_removed
+        self.on_condition_removed = on_condition_removed
+
+        self.conditions: Dict[str, Dict[str, Any]] = {}  # condition_id -> registry row
+        self.by_key: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]] = defaultdict(dict)
+        self.subscriptions: Dict[str, Dict[str, Any]] = {}  # subscription id -> row
+        self.by_condition: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+
+        self._watermarks: Dict[str, Optional[str]] = {REGISTRY_TABLE: None, SUBSCRIPTIONS_TABLE: None}
+        self._last_full_load = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.loaded = False
+        self.stats = {"lookups": 0, "misses": 0, "full_loads": 0, "refreshes": 0, "rows_applied": 0}
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self):
+        """Load the index and start the background refresh (idempotent)."""
+        if self._task is not None:
+            return
+        await self.load()
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                if time.monotonic() - self._last_full_load >= self.full_reload_seconds:
+                    await self.load()
+                else:
+                    await self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing condition index: {e}")
+
+    async def load(self):
+        """Full reload of both tables."""
+        started = time.perf_counter()
+        # The Supabase client is synchronous; page in a worker thread so the
+        # websocket reader and bar-close evaluation keep running
+        registry = await asyncio.to_thread(self._fetch, REGISTRY_TABLE)
+        subscriptions = await asyncio.to_thread(self._fetch, SUBSCRIPTIONS_TABLE, active_only=True)
+
+        old_keys = set(self.by_key)
+        old_ids = set(self.conditions)
+        self.conditions.clear()
+        self.by_key.clear()
+        self.subscriptions.clear()
+        self.by_condition.clear()
+        for row in registry:
+            self._apply_condition(row)
+        for row in subscriptions:
+            self._apply_subscription(row)
+
+        self._watermarks[REGISTRY_TABLE] = self._max_updated_at(registry)
+        self._watermarks[SUBSCRIPTIONS_TABLE] = self._max_updated_at(subscriptions)
+        self._last_full_load = time.monotonic()
+        self.loaded = True
+        self.stats["full_loads"] += 1
+        for condition_id in old_ids - set(self.conditions):
+            self._notify(self.on_condition_removed, condition_id)
+        for key in old_keys - set(self.by_key):
+            self._key_removed(key)
+        self._record_refresh("full", started)
+        logger.info(
+            f"Condition index loaded: {len(self.conditions)} conditions, "
+            f"{len(self.subscriptions)} active subscriptions, {len(self.by_key)} symbol/timeframes"
+        )
+
+    async def refresh(self):
+        """Apply rows changed since the last watermark."""
+        if not self.loaded:
+            await self.load()
+            return
+
+        started = time.perf_counter()
+        applied = 0
+        for table, apply in ((REGISTRY_TABLE, self._apply_condition), (SUBSCRIPTIONS_TABLE, self._apply_subscription)):
+            rows = await asyncio.to_thread(self._fetch, table, since=self._watermarks[table])
+            for row in rows:
+                apply(row)
+            applied += len(rows)
+            watermark = self._max_updated_at(rows)
+            if watermark and (self._watermarks[table] is None or watermark > self._watermarks[table]):
+                self._watermarks[table] = watermark
+
+        self.stats["refreshes"] += 1
+        self.stats["rows_applied"] += applied
+        self._record_refresh("incremental", started)
+        if applied:
+            logger.debug(f"Condition index applied {applied} changed rows")
+
+    def apply_change(self, table: str, record: Dict[str, Any], deleted: bool = False):
+        """Apply one change-feed event (insert/update/delete) for either table."""
+        if table == REGISTRY_TABLE:
+            if deleted:
+                condition_id = record.get("condition_id")
+                removed = condition_id in self.conditions
+                self._key_removed(self._remove_condition(condition_id))
+                if removed:
+                    self._notify(self.on_condition_removed, condition_id)
+            else:
+                self._apply_condition(record)
+        elif table == SUBSCRIPTIONS_TABLE:
+            if deleted:
+                record = {**record, "active": False}
+            self._apply_subscription(record)
+        self.stats["rows_applied"] += 1
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def conditions_for(self, symbol: str, timeframe: str) -> List[Dict[str, Any]]:
+        """Registered conditions for a symbol/timeframe."""
+        group = self.by_key.get((symbol, timeframe))
+        self._record_lookup("conditions", group is not None)
+        return list(group.values()) if group else []
+
+    def subscribers(self, condition_id: str) -> List[Dict[str, Any]]:
+        """Active subscriptions for a condition."""
+        group = self.by_condition.get(condition_id)
+        self._record_lookup("subscribers", group is not None)
+        return list(group.values()) if group else []
+
+    def symbols(self) -> List[str]:
+        """Symbols that have at least one registered condition."""
+        return list({symbol for symbol, _ in self.by_key})
+
+    def keys(self) -> Set[Tuple[str, str]]:
+        """(symbol, timeframe) pairs that have registered conditions."""
+        return set(self.by_key)
+
+    def sizes(self) -> Dict[str, int]:
+        return {
+            "conditions": len(self.conditions),
+            "subscriptions": len(self.subscriptions),
+            "symbol_timeframes": len(self.by_key),
+        }
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _fetch(self, table: str, since: Optional[str] = None, active_only: bool = False) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        offset = 0
+        while True:
+            query = self.supabase.table(table).select("*")
+            if active_only:
+                query = query.eq("active", True)
+            if since:
+                # gte, not gt: rows sharing the watermark timestamp may commit later
+                query = query.gte("updated_at", since)
+            page = query.order("updated_at").range(offset, offset + _PAGE_SIZE - 1).execute()
+            data = page.data or []
+            rows.extend(data)
+            if len(data) < _PAGE_SIZE:
+                return rows
+            offset += _PAGE_SIZE
+
+    def _apply_condition(self, row: Dict[str, Any]):
+        condition_id = row.get("condition_id")
+        if not condition_id:
+            return
+        emptied = self._remove_condition(condition_id)
+        key = (row.get("symbol"), row.get("timeframe"))
+        self.conditions[condition_id] = row
+        self.by_key[key][condition_id] = row
+        if emptied != key:
+            self._key_removed(emptied)
+
+    def _remove_condition(self, condition_id: Optional[str]) -> Optional[Tuple[str, str]]:
+        """Remove a condition; returns its (symbol, timeframe) if that pair is now empty."""
+        old = self.conditions.pop(condition_id, None)
+        if old is None:
+            return None
+        key = (old.get("symbol"), old.get("timeframe"))
+        group = self.by_key.get(key)
+        if group is not None:
+            group.pop(condition_id, None)
+            if not group:
+                del self.by_key[key]
+                return key
+        return None
+
+    def _key_removed(self, key: Optional[Tuple[str, str]]):
+        if key is not None:
+            self._notify(self.on_key_removed, *key)
+
+    @staticmethod
+    def _notify(callback: Optional[Callable[..., None]], *args):
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.warning(f"Condition index callback failed for {args}: {e}")
+
+    def _apply_subscription(self, row: Dict[str, Any]):
+        subscription_id = row.get("id")
+        if not subscription_id:
+            return
+        old = self.subscriptions.pop(subscription_id, None)
+        if old is not None:
+            group = self.by_condition.get(old.get("condition_id"))
+            if group is not None:
+                group.pop(subscription_id, None)
+                if not group:
+                    del self.by_condition[old.get("condition_id")]
+        if row.get("active", True):
+            self.subscriptions[subscription_id] = row
+            self.by_condition[row.get("condition_id")][subscription_id] = row
+
+    @staticmethod
+    def _max_updated_at(rows: List[Dict[str, Any]]) -> Optional[str]:
+        stamps = [row["updated_at"] for row in rows if row.get("updated_at")]
+        return max(stamps) if stamps else None
+
+    def _record_lookup(self, kind: str, hit: bool):
+        self.stats["lookups"] += 1
+        if not hit:
+            self.stats["misses"] += 1
+        if METRICS_AVAILABLE:
+            record_condition_index_lookup(kind, hit)
+
+    def _record_refresh(self, mode: str, started: float):
+        if METRICS_AVAILABLE:
+            record_condition_index_refresh(mode, time.perf_counter() - started, self.sizes())
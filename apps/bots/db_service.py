@@ -13,8 +13,16 @@ try:
 except ImportError:
     supabase = None
 
+bots_path = os.path.dirname(os.path.abspath(__file__))
+if bots_path not in sys.path:
+    sys.path.insert(0, bots_path)
+from bot_journal import BotJournal
+
 logger = logging.getLogger(__name__)
 
+# Queue event/order/position/funds writes in the journal instead of writing inline
+JOURNAL_ENABLED = os.getenv("BOT_JOURNAL_ENABLED", "true").lower() in ("1", "true", "yes")
+
 
 class BotDatabaseService:
     """Service for persisting bot data to Supabase database."""
@@ -22,6 +30,7 @@ class BotDatabaseService:
     def __init__(self):
         self.supabase = supabase
         self.enabled = supabase is not None
+        self.journal = BotJournal(supabase) if self.enabled and JOURNAL_ENABLED else None
         
         # Log initialization details
         logger.info(f"🔧 BotDatabaseService initialization:")
@@ -50,6 +59,25 @@ class BotDatabaseService:
             logger.warning("Supabase not configured, database operations disabled. Bot data will only be stored in memory.")
             logger.warning("   To enable: Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY environment variables")
     
+    def _journal(self, table: str, op: str, data: Dict[str, Any]) -> bool:
+        """Queue a write in the journal; False if it has to be written inline."""
+        return self.journal is not None and self.journal.append(table, op, data)
+    
+    async def start_journal(self):
+        """Start the write-behind journal (replays its WAL, if any)."""
+        if self.journal:
+            await self.journal.start()
+    
+    async def flush_journal(self):
+        """Write pending journal records now, keeping the journal running."""
+        if self.journal and self.journal.running:
+            await self.journal.flush()
+    
+    async def stop_journal(self):
+        """Flush pending journal writes; later writes go straight to the database."""
+        if self.journal:
+            await self.journal.stop()
+    
     def create_bot(
         self, 
         bot_id: str,
@@ -246,7 +274,8 @@ class BotDatabaseService:
             if fees is not None:
                 order_data["fees"] = fees
             
-            self.supabase.table("order_logs").insert(order_data).execute()
+            if not self._journal("order_logs", "insert", order_data):
+                self.supabase.table("order_logs").insert(order_data).execute()
             logger.debug(f"Logged order: {side} {qty} {symbol} @ {avg_price}")
             return True
         except Exception as e:
@@ -282,6 +311,9 @@ class BotDatabaseService:
             if unrealized_pnl_percent is not None:
                 position_data["unrealized_pnl_percent"] = unrealized_pnl_percent
             
+            if self._journal("positions", "upsert", position_data):
+                return True
+            
             # Use upsert with on_conflict to handle unique constraint
             self.supabase.table("positions").upsert(
                 position_data,
@@ -299,6 +331,8 @@ class BotDatabaseService:
             return False
         
         try:
+            if self._journal("positions", "delete", {"user_id": user_id, "symbol": symbol}):
+                return True
             self.supabase.table("positions").delete().eq("user_id", user_id).eq("symbol", symbol).execute()
             return True
         except Exception as e:
@@ -326,6 +360,9 @@ class BotDatabaseService:
                 "locked": locked
             }
             
+            if self._journal("funds", "upsert", funds_data):
+                return True
+            
             self.supabase.table("funds").upsert(
                 funds_data,
                 on_conflict="user_id,exchange,currency"
@@ -608,7 +645,7 @@ class BotDatabaseService:
             details: Optional JSON details about the event
             
         Returns:
-            True if logged successfully, False otherwise
+            True if logged (or queued in the bot journal), False otherwise
         """
         # Legacy method - now logs to bot_events (old table)
         # Use log_live_event for important events
@@ -631,7 +668,8 @@ class BotDatabaseService:
             if symbol:
                 event_data["symbol"] = symbol
             
-            self.supabase.table("bot_events").insert(event_data).execute()
+            if not self._journal("bot_events", "insert", event_data):
+                self.supabase.table("bot_events").insert(event_data).execute()
             logger.debug(f"Logged event (legacy): {event_type} - {message}")
             return True
         except Exception as e:
@@ -668,7 +706,7 @@ class BotDatabaseService:
             details: Optional JSON details about the event
             
         Returns:
-            True if logged successfully, False otherwise
+            True if logged (or queued in the bot journal), False otherwise
         """
         if not self.enabled:
             logger.debug(f"Database disabled, skipping live event log: {event_type} - {message}")
@@ -700,7 +738,9 @@ class BotDatabaseService:
             if symbol:
                 event_data["symbol"] = symbol
             
-            self.supabase.table("bot_events_live").insert(event_data).execute()
+            # The journal falls back to bot_events itself if bot_events_live is missing
+            if not self._journal("bot_events_live", "insert", event_data):
+                self.supabase.table("bot_events_live").insert(event_data).execute()
             logger.info(f"Logged live event: {event_type} - {message}")
             return True
         except Exception as e:
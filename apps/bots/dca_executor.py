@@ -1,6 +1,7 @@
 """DCA Bot Executor - Handles execution of DCA bot with Phase 1 advanced features."""
 
 import asyncio
+import copy
 import logging
 from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
@@ -29,12 +30,24 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+_indicator_manager_instance = None
+
+
+def _indicator_manager():
+    """Process-wide AlertManager used only for its indicator functions (no candle source)."""
+    global _indicator_manager_instance
+    if _indicator_manager_instance is None:
+        from apps.alerts.alert_manager import AlertManager
+        _indicator_manager_instance = AlertManager(None)
+    return _indicator_manager_instance
+
 
 class DCABotExecutor:
     """Executes DCA bot strategy with advanced features."""
     
     def __init__(self, bot_config: Dict[str, Any], paper_trading: bool = True, 
-                 initial_balance: float = 10000.0):
+                 initial_balance: float = 10000.0,
+                 market_data: Optional[MarketDataService] = None):
         self.config = bot_config
         self.bot_id = None
         self.user_id = None
@@ -48,8 +61,8 @@ class DCABotExecutor:
         self.profit_strategy = bot_config.get("phase1Features", {}).get("profitStrategy")
         self.emergency_brake = bot_config.get("phase1Features", {}).get("emergencyBrake")
         
-        # Market data service
-        self.market_data = MarketDataService()
+        # Market data service (BotExecutionService passes the shared market_data_hub)
+        self.market_data = market_data or MarketDataService()
         
         # Trading service (unified for both paper and live)
         self.trading_engine = TradingService(
@@ -65,6 +78,7 @@ class DCABotExecutor:
         self.last_dca_time = {}  # Track last DCA per pair
         self.position_states = {}  # Track positions per pair
         self.regime_state = {}  # Market regime tracking
+        self._entry_plan_cache = None  # (condition config, plan) - see _entry_plan
         
     async def initialize(self):
         """Initialize bot executor."""
@@ -75,6 +89,14 @@ class DCABotExecutor:
             # Don't log initialization events - not important for bot_events_live
             # Initialize market data service
             await self.market_data.initialize()
+            self.market_data.subscribe(self._price_symbols())
+            
+            # Convert entry conditions once; iterations only evaluate them
+            if self.config.get("conditionConfig"):
+                try:
+                    self._entry_plan(self.config["conditionConfig"])
+                except Exception as e:
+                    logger.warning(f"Could not prepare entry conditions: {e}")
             
             # Initialize trading service
             if self.paper_trading:
@@ -99,40 +121,31 @@ class DCABotExecutor:
         # Process each pair
         pairs = self.config.get("selectedPairs", [])
         
-        # Normalize pair format (ETH/USDT -> ETHUSDT)
-        def normalize_pair(pair: str) -> str:
-            """Normalize pair format for API calls."""
-            return pair.replace('/', '').replace('-', '').upper()
+        # Exchange symbol per pair (ETH/USDT -> ETHUSDT)
+        symbols = dict(zip(pairs, self._price_symbols()))
         
-        # Fetch current prices for all pairs
-        current_prices = {}
-        market_data_dict = {}
+        # Fetch current prices for all pairs in one request
+        prices = await self.market_data.get_prices(symbols.values())
+        current_prices = {pair: prices[symbol] for pair, symbol in symbols.items() if prices.get(symbol, 0.0) > 0}
         
-        for pair in pairs:
-            # Normalize pair for API calls
-            normalized_pair = normalize_pair(pair)
-            logger.debug(f"Processing pair: {pair} (normalized: {normalized_pair})")
-            
-            # Get current price
-            price = await self.market_data.get_current_price(normalized_pair)
-            if price > 0:
-                current_prices[pair] = price
-                
-                # Get market data for regime detection and emergency brake
-                if self.market_regime or self.emergency_brake:
-                    regime_tf = self.market_regime.get("regimeTimeframe", "1d") if self.market_regime else "1h"
-                    df = await self.market_data.get_klines_as_dataframe(pair, regime_tf, 200)
-                    if not df.empty:
-                        market_data_dict[pair] = df
+        # Get market data for regime detection and emergency brake (all pairs concurrently)
+        market_data_dict = {}
+        if self.market_regime or self.emergency_brake:
+            regime_tf = self.market_regime.get("regimeTimeframe", "1d") if self.market_regime else "1h"
+            priced_pairs = [pair for pair in pairs if pair in current_prices]
+            frames = await asyncio.gather(*(
+                self.market_data.get_klines_as_dataframe(symbols[pair], regime_tf, 200)
+                for pair in priced_pairs
+            ))
+            market_data_dict = {pair: df for pair, df in zip(priced_pairs, frames) if not df.empty}
         
         # Process each pair with real market data
         for pair in pairs:
-            normalized_pair = normalize_pair(pair)
-            if normalized_pair not in current_prices or current_prices[normalized_pair] <= 0:
-                logger.warning(f"Could not fetch price for {pair} (normalized: {normalized_pair}), skipping")
+            if pair not in current_prices:
+                logger.warning(f"Could not fetch price for {pair} (normalized: {symbols[pair]}), skipping")
                 continue
                 
-            current_price = current_prices[normalized_pair]
+            current_price = current_prices[pair]
             
             # Check market regime detection (but allow override if entry condition triggers)
             if self.market_regime and market_data_dict.get(pair) is not None:
@@ -365,19 +378,12 @@ class DCABotExecutor:
             return True  # No conditions = allow entry
         
         try:
-            # Import evaluator and alert manager
             from backend.evaluator import evaluate_condition, evaluate_playbook
-            from apps.alerts.alert_manager import AlertManager
-            from apps.alerts.datasource import CandleSource
             
-            # Check if this is the new EntryConditionsData format (has 'entryType' or 'conditions' array)
-            # If so, convert it to evaluator format
-            if "entryType" in condition_config or ("conditions" in condition_config and isinstance(condition_config.get("conditions"), list)):
-                logger.debug(f"Converting EntryConditionsData format to evaluator format for {pair}")
-                condition_config = convert_for_dca_executor(condition_config)
-                if not condition_config or condition_config.get("mode") == "simple" and not condition_config.get("condition"):
-                    # No valid conditions after conversion
-                    return True
+            plan = self._entry_plan(condition_config)
+            mode = plan["mode"]
+            if mode is None:
+                return True  # No (enabled) conditions = allow entry
             
             # Prepare dataframe: ensure it has 'time' column (AlertManager expects 'time' not 'open_time')
             df = market_df.copy()
@@ -390,119 +396,16 @@ class DCABotExecutor:
                     if 'time' not in df.columns:
                         df['time'] = df.index
             
-            # Get mode (playbook or simple)
-            mode = condition_config.get("mode", "simple")
+            # Apply indicators needed for conditions
+            df_with_indicators = await self._apply_indicators(df, plan["conditions"], plan["indicators"])
             
             if mode == "playbook":
                 # Playbook mode: multiple conditions with AND/OR logic
-                playbook_conditions = condition_config.get("conditions", [])
-                gate_logic = condition_config.get("gateLogic", "ALL")  # ALL = AND, ANY = OR
-                
-                if not playbook_conditions:
-                    logger.warning(f"No conditions in playbook for {pair}")
-                    return True  # No conditions = allow entry
-                
-                # Extract conditions for indicator application
-                conditions_to_evaluate = []
-                for playbook_condition in playbook_conditions:
-                    if not playbook_condition.get("enabled", True):
-                        continue
-                    
-                    condition_data = playbook_condition.get("condition", {})
-                    condition_type = playbook_condition.get("conditionType", "indicator")
-                    
-                    # Build condition dict for evaluator
-                    condition = {
-                        "type": "price" if condition_type == "Price Action" else "indicator",
-                        "indicator": condition_data.get("indicator"),
-                        "component": condition_data.get("component"),
-                        "operator": condition_data.get("operator", ">"),
-                        "compareWith": condition_data.get("compareWith", "value"),
-                        "compareValue": condition_data.get("compareValue") or condition_data.get("value"),
-                        "timeframe": condition_data.get("timeframe", "same"),
-                        "period": condition_data.get("period"),
-                    }
-                    
-                    # Add RHS for price action conditions
-                    if condition_data.get("rhs"):
-                        condition["rhs"] = condition_data.get("rhs")
-                    
-                    # Add price field for price conditions
-                    if condition_type == "Price Action":
-                        condition["priceField"] = condition_data.get("priceField", "close")
-                        condition["maLength"] = condition_data.get("maLength")
-                        condition["priceMaType"] = condition_data.get("priceMaType", "EMA")
-                        condition["percentage"] = condition_data.get("percentage")
-                    
-                    # Add bounds for 'between' operator
-                    if condition_data.get("lowerBound") is not None:
-                        condition["lowerBound"] = condition_data.get("lowerBound")
-                    if condition_data.get("upperBound") is not None:
-                        condition["upperBound"] = condition_data.get("upperBound")
-                    
-                    conditions_to_evaluate.append(condition)
-                
-                if not conditions_to_evaluate:
-                    return True  # No enabled conditions = allow entry
-                
-                # Apply indicators needed for conditions
-                df_with_indicators = await self._apply_indicators(df, conditions_to_evaluate)
-                
-                # Build playbook structure for evaluator
-                playbook = {
-                    "gateLogic": gate_logic,
-                    "evaluationOrder": "priority",
-                    "conditions": []
-                }
-                
-                for i, playbook_condition in enumerate(playbook_conditions):
-                    if not playbook_condition.get("enabled", True):
-                        continue
-                    
-                    condition_data = playbook_condition.get("condition", {})
-                    condition_type = playbook_condition.get("conditionType", "indicator")
-                    
-                    condition = {
-                        "type": "price" if condition_type == "Price Action" else "indicator",
-                        "indicator": condition_data.get("indicator"),
-                        "component": condition_data.get("component"),
-                        "operator": condition_data.get("operator", ">"),
-                        "compareWith": condition_data.get("compareWith", "value"),
-                        "compareValue": condition_data.get("compareValue") or condition_data.get("value"),
-                        "timeframe": condition_data.get("timeframe", "same"),
-                        "period": condition_data.get("period"),
-                    }
-                    
-                    if condition_data.get("rhs"):
-                        condition["rhs"] = condition_data.get("rhs")
-                    
-                    if condition_type == "Price Action":
-                        condition["priceField"] = condition_data.get("priceField", "close")
-                        condition["maLength"] = condition_data.get("maLength")
-                        condition["priceMaType"] = condition_data.get("priceMaType", "EMA")
-                        condition["percentage"] = condition_data.get("percentage")
-                    
-                    if condition_data.get("lowerBound") is not None:
-                        condition["lowerBound"] = condition_data.get("lowerBound")
-                    if condition_data.get("upperBound") is not None:
-                        condition["upperBound"] = condition_data.get("upperBound")
-                    
-                    playbook["conditions"].append({
-                        "id": playbook_condition.get("id", f"cond_{i}"),
-                        "priority": playbook_condition.get("priority", i + 1),
-                        "enabled": True,
-                        "condition": condition,
-                        "logic": playbook_condition.get("logic", "AND"),
-                        "validityDuration": playbook_condition.get("validityDuration") or playbook_condition.get("durationBars"),
-                        "validityDurationUnit": playbook_condition.get("validityDurationUnit", "bars")
-                    })
-                
-                # Evaluate playbook
-                result = evaluate_playbook(df_with_indicators, playbook)
+                result = evaluate_playbook(df_with_indicators, plan["playbook"])
                 triggered = result.get("triggered", False)
                 
                 if triggered:
-                    logger.info(f"✅ Entry conditions met for {pair} (playbook mode, {gate_logic} logic)")
+                    logger.info(f"✅ Entry conditions met for {pair} (playbook mode, {plan['playbook']['gateLogic']} logic)")
                     # Don't log condition checks - only log actual orders placed
                 else:
                     logger.debug(f"❌ Entry conditions not met for {pair} (playbook mode)")
@@ -512,51 +415,12 @@ class DCABotExecutor:
             
             else:
                 # Simple mode: single condition
-                condition_data = condition_config.get("condition", {})
-                condition_type = condition_config.get("conditionType", "indicator")
-                
-                if not condition_data:
-                    return True  # No condition = allow entry
-                
-                # Build condition dict
-                condition = {
-                    "type": "price" if condition_type == "Price Action" else "indicator",
-                    "indicator": condition_data.get("indicator"),
-                    "component": condition_data.get("component"),
-                    "operator": condition_data.get("operator", ">"),
-                    "compareWith": condition_data.get("compareWith", "value"),
-                    "compareValue": condition_data.get("compareValue") or condition_data.get("value"),
-                    "timeframe": condition_data.get("timeframe", "same"),
-                    "period": condition_data.get("period"),
-                }
-                
-                # Add RHS for price action conditions
-                if condition_data.get("rhs"):
-                    condition["rhs"] = condition_data.get("rhs")
-                
-                # Add price field for price conditions
-                if condition_type == "Price Action":
-                    condition["priceField"] = condition_data.get("priceField", "close")
-                    condition["maLength"] = condition_data.get("maLength")
-                    condition["priceMaType"] = condition_data.get("priceMaType", "EMA")
-                    condition["percentage"] = condition_data.get("percentage")
-                
-                # Add bounds for 'between' operator
-                if condition_data.get("lowerBound") is not None:
-                    condition["lowerBound"] = condition_data.get("lowerBound")
-                if condition_data.get("upperBound") is not None:
-                    condition["upperBound"] = condition_data.get("upperBound")
-                
-                # Apply indicators needed for condition
-                df_with_indicators = await self._apply_indicators(df, [condition])
-                
-                # Evaluate condition
                 row_index = len(df_with_indicators) - 1
                 if row_index < 0:
                     logger.warning(f"Empty dataframe after indicator application for {pair}")
                     return False
                 
-                result = evaluate_condition(df_with_indicators, row_index, condition)
+                result = evaluate_condition(df_with_indicators, row_index, plan["conditions"][0])
                 
                 if result:
                     logger.info(f"✅ Entry condition met for {pair} (simple mode)")
@@ -572,23 +436,130 @@ class DCABotExecutor:
             # On error, be conservative: don't allow entry
             return False
     
-    async def _apply_indicators(self, df: pd.DataFrame, conditions: List[Dict]) -> pd.DataFrame:
+    def _entry_plan(self, condition_config: Dict) -> Dict[str, Any]:
+        """Entry plan for condition_config, built once and rebuilt only when the config changes."""
+        if self._entry_plan_cache is not None and self._entry_plan_cache[0] == condition_config:
+            return self._entry_plan_cache[1]
+        plan = self._build_entry_plan(condition_config)
+        self._entry_plan_cache = (copy.deepcopy(condition_config), plan)
+        return plan
+    
+    def _build_entry_plan(self, condition_config: Dict) -> Dict[str, Any]:
+        """
+        Convert condition_config into evaluator conditions and the indicators they need.
+        
+        Returns {"mode": None} when there is nothing to evaluate (entry allowed),
+        else mode ("simple" or "playbook"), conditions, indicators (name -> params)
+        and, in playbook mode, the playbook passed to evaluate_playbook.
+        """
+        # Check if this is the new EntryConditionsData format (has 'entryType' or 'conditions' array)
+        # If so, convert it to evaluator format
+        if "entryType" in condition_config or ("conditions" in condition_config and isinstance(condition_config.get("conditions"), list)):
+            logger.debug("Converting EntryConditionsData format to evaluator format")
+            condition_config = convert_for_dca_executor(condition_config)
+            if not condition_config or condition_config.get("mode") == "simple" and not condition_config.get("condition"):
+                # No valid conditions after conversion
+                return {"mode": None}
+        
+        # Get mode (playbook or simple)
+        mode = condition_config.get("mode", "simple")
+        plan: Dict[str, Any] = {"mode": mode}
+        
+        if mode == "playbook":
+            playbook_conditions = condition_config.get("conditions", [])
+            if not playbook_conditions:
+                logger.warning(f"No conditions in playbook for bot {self.bot_id}")
+                return {"mode": None}
+            
+            playbook = {
+                "gateLogic": condition_config.get("gateLogic", "ALL"),  # ALL = AND, ANY = OR
+                "evaluationOrder": "priority",
+                "conditions": []
+            }
+            for i, playbook_condition in enumerate(playbook_conditions):
+                if not playbook_condition.get("enabled", True):
+                    continue
+                condition = self._build_condition(
+                    playbook_condition.get("condition", {}),
+                    playbook_condition.get("conditionType", "indicator")
+                )
+                playbook["conditions"].append({
+                    "id": playbook_condition.get("id", f"cond_{i}"),
+                    "priority": playbook_condition.get("priority", i + 1),
+                    "enabled": True,
+                    "condition": condition,
+                    "logic": playbook_condition.get("logic", "AND"),
+                    "validityDuration": playbook_condition.get("validityDuration") or playbook_condition.get("durationBars"),
+                    "validityDurationUnit": playbook_condition.get("validityDurationUnit", "bars")
+                })
+            
+            if not playbook["conditions"]:
+                return {"mode": None}
+            plan["playbook"] = playbook
+            plan["conditions"] = [c["condition"] for c in playbook["conditions"]]
+        
+        else:
+            condition_data = condition_config.get("condition", {})
+            if not condition_data:
+                return {"mode": None}
+            plan["conditions"] = [
+                self._build_condition(condition_data, condition_config.get("conditionType", "indicator"))
+            ]
+        
+        plan["indicators"] = _indicator_manager()._needed_indicator_configs(plan["conditions"])
+        return plan
+    
+    @staticmethod
+    def _build_condition(condition_data: Dict, condition_type: str) -> Dict[str, Any]:
+        """Build an evaluator condition dict from a UI condition."""
+        condition = {
+            "type": "price" if condition_type == "Price Action" else "indicator",
+            "indicator": condition_data.get("indicator"),
+            "component": condition_data.get("component"),
+            "operator": condition_data.get("operator", ">"),
+            "compareWith": condition_data.get("compareWith", "value"),
+            "compareValue": condition_data.get("compareValue") or condition_data.get("value"),
+            "timeframe": condition_data.get("timeframe", "same"),
+            "period": condition_data.get("period"),
+        }
+        
+        # Add RHS for price action conditions
+        if condition_data.get("rhs"):
+            condition["rhs"] = condition_data.get("rhs")
+        
+        # Add price field for price conditions
+        if condition_type == "Price Action":
+            condition["priceField"] = condition_data.get("priceField", "close")
+            condition["maLength"] = condition_data.get("maLength")
+            condition["priceMaType"] = condition_data.get("priceMaType", "EMA")
+            condition["percentage"] = condition_data.get("percentage")
+        
+        # Add bounds for 'between' operator
+        if condition_data.get("lowerBound") is not None:
+            condition["lowerBound"] = condition_data.get("lowerBound")
+        if condition_data.get("upperBound") is not None:
+            condition["upperBound"] = condition_data.get("upperBound")
+        
+        return condition
+    
+    async def _apply_indicators(self, df: pd.DataFrame, conditions: List[Dict],
+                                indicators: Optional[Dict[str, Dict[str, Any]]] = None) -> pd.DataFrame:
         """
         Apply indicators needed for conditions to the dataframe.
         
-        Uses AlertManager's indicator application logic.
+        Uses AlertManager's indicator functions. Pass indicators (from the entry
+        plan) to skip working them out from conditions again.
         """
         try:
-            from apps.alerts.alert_manager import AlertManager
-            from apps.alerts.datasource import CandleSource
+            manager = _indicator_manager()
+            if df.empty:
+                return df
+            if indicators is None:
+                indicators = manager._needed_indicator_configs(conditions)
             
-            # Create AlertManager instance for indicator calculation
-            # We don't need a real CandleSource since we're providing the dataframe
-            src = CandleSource()
-            manager = AlertManager(src)
-            
-            # Apply indicators
-            df_with_indicators = manager._apply_needed_indicators(df, conditions)
+            df_with_indicators = df.copy()
+            for indicator, config in indicators.items():
+                df_with_indicators = manager._add_indicator(df_with_indicators, indicator, config)
             
             return df_with_indicators
             
@@ -985,8 +956,16 @@ class DCABotExecutor:
         
         return actions
         
+    def _price_symbols(self) -> List[str]:
+        """Exchange symbols of the selected pairs (ETH/USDT -> ETHUSDT)."""
+        return [
+            pair.replace('/', '').replace('-', '').upper()
+            for pair in self.config.get("selectedPairs", [])
+        ]
+        
     async def cleanup(self):
         """Cleanup resources."""
+        self.market_data.unsubscribe(self._price_symbols())
         await self.market_data.cleanup()
         
     async def get_statistics(self) -> Dict[str, Any]:
@@ -996,15 +975,14 @@ class DCABotExecutor:
             
         # Get current prices for all positions
         current_prices = {}
-        for pair in self.config.get("selectedPairs", []):
-            try:
-                # Normalize pair format for API calls
-                normalized_pair = pair.replace('/', '').replace('-', '').upper()
-                price = await self.market_data.get_current_price(normalized_pair)
-                if price > 0:
-                    current_prices[pair] = price
-            except Exception as e:
-                logger.error(f"Error fetching price for {pair}: {e}")
+        pairs = self.config.get("selectedPairs", [])
+        try:
+            prices = await self.market_data.get_prices(self._price_symbols())
+            for pair, symbol in zip(pairs, self._price_symbols()):
+                if prices.get(symbol, 0.0) > 0:
+                    current_prices[pair] = prices[symbol]
+        except Exception as e:
+            logger.error(f"Error fetching prices for {pairs}: {e}")
                 
         stats = self.trading_engine.get_statistics(current_prices)
         stats["paused"] = self.paused
@@ -3,17 +3,49 @@ Event Bus for Condition Triggers - Redis Pub/Sub Implementation
 
 Publishes condition trigger events to Redis channels.
 Bots can subscribe to these channels to receive notifications.
+
+Publishes made within EVENT_BUS_BATCH_MS of each other are pipelined into a
+single round trip. publish_many() sends a list of events in one pipeline.
+Events are JSON (orjson when installed) tagged with schema_version.
+
+EVENT_BUS_TRANSPORT=streams switches create_event_bus() to StreamEventBus
+(Redis Streams with consumer groups) without changing the callback API.
+EVENT_BUS_TRANSPORT=local uses LocalEventBus, an in-process bus for running
+the evaluator and notifier in one process (EVENT_BUS_LOCAL_FALLBACK=true
+falls back to it when Redis is unreachable).
 """
 
 import asyncio
+import fnmatch
 import json
 import logging
 import os
-from typing import Dict, Any, Optional, Callable, List
-from datetime import datetime
+import socket
+import sys
+import time
+import zlib
+from typing import Dict, Any, Optional, Callable, List, Tuple, Union
+from datetime import date, datetime
+
+# Add root path for 'apps' modules
+root_path = os.path.join(os.path.dirname(__file__), '..', '..')
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
 
 logger = logging.getLogger(__name__)
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    from apps.api.metrics import record_event_bus_callback, record_event_bus_flush, update_event_bus_backlog
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
 # Try to import Redis
 try:
     import redis.asyncio as redis
@@ -22,6 +54,36 @@ except ImportError:
     REDIS_AVAILABLE = False
     logger.warning("Redis not available. Install with: pip install redis")
 
+# Bump when the event envelope changes incompatibly
+EVENT_SCHEMA_VERSION = 1
+
+BATCH_MS = float(os.getenv("EVENT_BUS_BATCH_MS", "2"))  # 0 disables micro-batching
+MAX_BATCH = int(os.getenv("EVENT_BUS_MAX_BATCH", "500"))
+LISTEN_WORKERS = int(os.getenv("EVENT_BUS_LISTEN_WORKERS", "8"))
+LISTEN_QUEUE_SIZE = int(os.getenv("EVENT_BUS_LISTEN_QUEUE_SIZE", "1000"))
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_event(event: Dict[str, Any]) -> Union[bytes, str]:
+    """Serialize an event for publishing."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(event, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(event, default=_json_default)
+
+
+def decode_event(data: Union[bytes, str]) -> Dict[str, Any]:
+    """Deserialize a published event (raises json.JSONDecodeError on bad input)."""
+    event = orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+    version = event.get("schema_version", 1)
+    if version > EVENT_SCHEMA_VERSION:
+        logger.debug(f"Event schema version {version} is newer than supported {EVENT_SCHEMA_VERSION}")
+    return event
+
 
 class EventBus:
     """
@@ -34,12 +96,23 @@ class EventBus:
     - Automatic reconnection
     """
     
-    def __init__(self, redis_url: Optional[str] = None):
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        batch_ms: float = BATCH_MS,
+        max_batch: int = MAX_BATCH,
+        listen_workers: int = LISTEN_WORKERS,
+        listen_queue_size: int = LISTEN_QUEUE_SIZE
+    ):
         """
         Initialize event bus.
         
         Args:
             redis_url: Redis connection URL (default: from env or redis://localhost:6379)
+            batch_ms: How long publish() waits to pipeline with other publishes (0 = no batching)
+            max_batch: Flush as soon as this many events are waiting
+            listen_workers: Callback dispatch workers; one channel always maps to the same worker
+            listen_queue_size: Queued messages per dispatch worker before reading pauses
         """
         self.redis_url = redis_url or os.getenv("REDIS_URL", "redis://localhost:6379")
         self.redis_client: Optional[redis.Redis] = None
@@ -47,6 +120,16 @@ class EventBus:
         self.connected = False
         self.subscribers: Dict[str, List[Callable]] = {}
         self.running = False
+        self.batch_ms = batch_ms
+        self.max_batch = max_batch
+        self._pending: List[Tuple[str, Union[bytes, str], asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self.stats = {"batches": 0, "published": 0, "failed": 0}
+        self.listen_workers = max(1, listen_workers)
+        self.listen_queue_size = listen_queue_size
+        self._dispatch_queues: List[asyncio.Queue] = []
+        self._dispatch_workers: List[asyncio.Task] = []
+        self._listen_task: Optional[asyncio.Task] = None
         
     async def connect(self) -> bool:
         """Connect to Redis."""
@@ -76,6 +159,8 @@ class EventBus:
     
     async def disconnect(self):
         """Disconnect from Redis."""
+        await self.flush()
+        
         if self.pubsub:
             await self.pubsub.unsubscribe()
             await self.pubsub.close()
@@ -92,6 +177,8 @@ class EventBus:
         """
         Publish an event to a Redis channel.
         
+        Concurrent publishes within batch_ms share one pipelined round trip.
+        
         Args:
             channel: Channel name (e.g., "condition.187efde11d740283")
             event: Event data dictionary
@@ -104,25 +191,101 @@ class EventBus:
             return False
         
         try:
-            # Add metadata to event
-            event_with_meta = {
-                **event,
-                "published_at": datetime.now().isoformat(),
-                "channel": channel
-            }
-            
-            # Serialize event
-            event_json = json.dumps(event_with_meta)
-            
-            # Publish to Redis
-            subscribers_count = await self.redis_client.publish(channel, event_json)
-            
-            logger.debug(f"Published event to {channel} ({subscribers_count} subscribers)")
-            return True
-            
+            payload = encode_event(self._with_meta(channel, event))
         except Exception as e:
-            logger.error(f"Error publishing event to {channel}: {e}")
+            logger.error(f"Error serializing event for {channel}: {e}")
             return False
+        
+        if self.batch_ms <= 0:
+            return await self._send([(channel, payload)]) == 1
+        
+        # Join the pending batch; whoever fills it or the timer sends it
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((channel, payload, future))
+        if len(self._pending) >= self.max_batch:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+        return await future
+    
+    async def publish_many(self, events: List[Tuple[str, Dict[str, Any]]]) -> int:
+        """
+        Publish several events in one pipelined round trip.
+        
+        Args:
+            events: (channel, event) pairs
+        
+        Returns:
+            Number of events published
+        """
+        if not self.connected or not self.redis_client or not events:
+            return 0
+        
+        batch = []
+        for channel, event in events:
+            try:
+                batch.append((channel, encode_event(self._with_meta(channel, event))))
+            except Exception as e:
+                logger.error(f"Error serializing event for {channel}: {e}")
+        
+        published = 0
+        for start in range(0, len(batch), self.max_batch):
+            published += await self._send(batch[start:start + self.max_batch])
+        return published
+    
+    async def flush(self):
+        """Send events waiting in the micro-batch."""
+        if self._flush_task is not None and self._flush_task is not asyncio.current_task():
+            self._flush_task.cancel()
+        self._flush_task = None
+        
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        ok = await self._send([(channel, payload) for channel, payload, _ in pending]) == len(pending)
+        for _, _, future in pending:
+            if not future.done():
+                future.set_result(ok)
+    
+    async def _flush_later(self):
+        await asyncio.sleep(self.batch_ms / 1000)
+        await self.flush()
+    
+    def _with_meta(self, channel: str, event: Dict[str, Any]) -> Dict[str, Any]:
+        trace = event.get("trace")
+        if isinstance(trace, dict):
+            # Latency trace hop (see trigger_trace)
+            trace.setdefault("hops", {}).setdefault("published", time.time())
+        return {
+            **event,
+            "published_at": datetime.now().isoformat(),
+            "channel": channel,
+            "schema_version": EVENT_SCHEMA_VERSION
+        }
+    
+    async def _send(self, batch: List[Tuple[str, Union[bytes, str]]]) -> int:
+        """PUBLISH a batch in one pipeline; returns how many were sent."""
+        if not batch or not self.redis_client:
+            return 0
+        started = time.perf_counter()
+        failed = False
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for channel, payload in batch:
+                pipe.publish(channel, payload)
+            await pipe.execute()
+            self.stats["published"] += len(batch)
+            logger.debug(f"Published {len(batch)} events in one round trip")
+            return len(batch)
+        except Exception as e:
+            failed = True
+            self.stats["failed"] += len(batch)
+            logger.error(f"Error publishing {len(batch)} events: {e}")
+            return 0
+        finally:
+            self.stats["batches"] += 1
+            if METRICS_AVAILABLE:
+                record_event_bus_flush(len(batch), time.perf_counter() - started, failed)
     
     async def subscribe(self, channel: str, callback: Callable[[Dict[str, Any]], None]):
         """
@@ -213,39 +376,104 @@ class EventBus:
             logger.error(f"Error subscribing to pattern {pattern}: {e}")
     
     async def start_listening(self):
-        """Start listening for events and calling callbacks."""
+        """
+        Listen for events and dispatch them to callbacks until stopped.
+        
+        Blocks on the pubsub message iterator (no polling timer). Messages go
+        to listen_workers dispatch workers by channel hash, so callbacks for
+        one channel run in order while other channels proceed in parallel.
+        When a worker's queue is full, reading pauses (backpressure).
+        """
         if not self.pubsub:
             logger.warning("Cannot start listening - not subscribed to any channels")
             return
         
         self.running = True
-        logger.info("Started listening for events...")
+        self._listen_task = asyncio.current_task()
+        self._start_dispatch_workers()
+        logger.info(f"Started listening for events ({self.listen_workers} dispatch workers)...")
         
         try:
             while self.running:
                 try:
-                    # Get message with timeout
-                    message = await asyncio.wait_for(
-                        self.pubsub.get_message(ignore_subscribe_messages=True),
-                        timeout=1.0
-                    )
-                    
-                    if message:
-                        await self._handle_message(message)
+                    async for message in self.pubsub.listen():
+                        if message.get("type") in ("message", "pmessage"):
+                            await self._enqueue(message)
+                        if not self.running:
+                            break
+                    else:
+                        if not self.pubsub.subscribed:
+                            logger.warning("No subscriptions left - stopping listener")
+                            self.running = False
                 
-                except asyncio.TimeoutError:
-                    # Timeout is normal - continue listening
-                    continue
+                except asyncio.CancelledError:
+                    if self.running:
+                        raise  # Cancelled by the caller, not stop_listening()
+                    break
                 except Exception as e:
                     logger.error(f"Error in event loop: {e}")
                     await asyncio.sleep(1)
         
-        except Exception as e:
-            logger.error(f"Error in listening loop: {e}")
         finally:
+            self._listen_task = None
+            await self._stop_dispatch_workers(drain=not self.running)
             self.running = False
             logger.info("Stopped listening for events")
     
+    def _start_dispatch_workers(self):
+        self._dispatch_queues = [asyncio.Queue(maxsize=self.listen_queue_size) for _ in range(self.listen_workers)]
+        self._dispatch_workers = [
+            asyncio.create_task(self._dispatch_worker(queue)) for queue in self._dispatch_queues
+        ]
+    
+    async def _stop_dispatch_workers(self, drain: bool):
+        """Stop dispatch workers, first running callbacks for queued messages if drain."""
+        if drain:
+            for queue in self._dispatch_queues:
+                await queue.join()
+        for worker in self._dispatch_workers:
+            worker.cancel()
+        await asyncio.gather(*self._dispatch_workers, return_exceptions=True)
+        self._dispatch_workers = []
+        self._dispatch_queues = []
+        if METRICS_AVAILABLE:
+            update_event_bus_backlog(0)
+    
+    async def _enqueue(self, message: Dict):
+        channel = message.get("channel")
+        queue = self._dispatch_queues[zlib.crc32(str(channel).encode()) % len(self._dispatch_queues)]
+        await queue.put(message)
+        if METRICS_AVAILABLE:
+            update_event_bus_backlog(self.backlog)
+    
+    async def _dispatch_worker(self, queue: asyncio.Queue):
+        while True:
+            message = await queue.get()
+            try:
+                await self._handle_message(message)
+            finally:
+                queue.task_done()
+    
+    @property
+    def backlog(self) -> int:
+        """Messages received but not yet dispatched to callbacks."""
+        return sum(queue.qsize() for queue in self._dispatch_queues)
+    
+    async def _run_callback(self, name: str, callback: Callable, event: Dict[str, Any]) -> bool:
+        """Run one callback; False if it raised."""
+        started = time.perf_counter()
+        failed = False
+        try:
+            await callback(event)
+            return True
+        except Exception as e:
+            failed = True
+            logger.error(f"Error in callback for {name}: {e}")
+            return False
+        finally:
+            if METRICS_AVAILABLE:
+                record_event_bus_callback(time.perf_counter() - started, failed)
+    
     async def _handle_message(self, message: Dict):
         """Handle incoming message from Redis."""
         try:
@@ -257,13 +485,10 @@ class EventBus:
                 data = message.get("data")
                 
                 if channel in self.subscribers:
-                    event = json.loads(data)
+                    event = decode_event(data)
                     # Call all callbacks for this channel
-                    for callback in self.subscribers[channel]:
-                        try:
-                            await callback(event)
-                        except Exception as e:
-                            logger.error(f"Error in callback for {channel}: {e}")
+                    for callback in list(self.subscribers[channel]):
+                        await self._run_callback(channel, callback, event)
             
             elif message_type == "pmessage":
                 # Pattern subscription
@@ -273,13 +498,10 @@ class EventBus:
                 
                 pattern_key = f"pattern:{pattern}"
                 if pattern_key in self.subscribers:
-                    event = json.loads(data)
+                    event = decode_event(data)
                     # Call all callbacks for this pattern
-                    for callback in self.subscribers[pattern_key]:
-                        try:
-                            await callback(event)
-                        except Exception as e:
-                            logger.error(f"Error in pattern callback for {pattern}: {e}")
+                    for callback in list(self.subscribers[pattern_key]):
+                        await self._run_callback(pattern, callback, event)
         
         except json.JSONDecodeError as e:
             logger.error(f"Failed to decode event JSON: {e}")
@@ -287,8 +509,10 @@ class EventBus:
             logger.error(f"Error handling message: {e}")
     
     def stop_listening(self):
-        """Stop listening for events."""
+        """Stop listening for events (callbacks already queued still run)."""
         self.running = False
+        if self._listen_task is not None and self._listen_task is not asyncio.current_task():
+            self._listen_task.cancel()  # Wake the blocking iterator
         logger.info("Stopping event listener...")
     
     async def get_channel_subscribers_count(self, channel: str) -> int:
@@ -305,25 +529,475 @@ class EventBus:
             return 0
 
 
+class StreamEventBus(EventBus):
+    """
+    Redis Streams transport with the same publish/subscribe API as EventBus.
+    
+    Pub/sub drops events while nobody listens and delivers every event to
+    every listener. Here:
+    - Events are XADDed to one stream per channel namespace (the part before
+      the first "."; "condition.abc" goes to "events:condition"), trimmed to
+      about EVENT_STREAM_MAXLEN entries.
+    - Listeners read through a consumer group (EVENT_BUS_GROUP), so events
+      published while they were down are delivered when they come back, and
+      several instances split the load.
+    - An entry is acked only after every callback for it succeeded. Entries
+      whose callbacks raised, that no callback was subscribed to, or that a
+      crashed consumer left behind stay pending and are claimed again after
+      EVENT_STREAM_RECLAIM_IDLE_MS. After EVENT_STREAM_MAX_DELIVERIES failed
+      deliveries to this consumer an entry is acked and logged as abandoned.
+    
+    A new group starts at the end of the stream, so history from before the
+    first listener is never replayed.
+    """
+    
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        group: Optional[str] = None,
+        consumer: Optional[str] = None,
+        stream_prefix: str = "events",
+        maxlen: Optional[int] = None,
+        reclaim_idle_ms: Optional[int] = None,
+        max_deliveries: Optional[int] = None,
+        **kwargs
+    ):
+        super().__init__(redis_url, **kwargs)
+        self.group = group or os.getenv("EVENT_BUS_GROUP", "bot-notifier")
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.stream_prefix = stream_prefix
+        self.maxlen = maxlen or int(os.getenv("EVENT_STREAM_MAXLEN", "100000"))
+        self.reclaim_idle_ms = reclaim_idle_ms or int(os.getenv("EVENT_STREAM_RECLAIM_IDLE_MS", "60000"))
+        self.max_deliveries = max_deliveries or int(os.getenv("EVENT_STREAM_MAX_DELIVERIES", "5"))
+        self.read_count = 100
+        self.streams: set = set()
+        self._failed_deliveries: Dict[Any, int] = {}  # entry id -> failed deliveries
+        self.stats.update({"delivered": 0, "reclaimed": 0, "abandoned": 0})
+    
+    def _stream_for(self, channel: str) -> str:
+        return f"{self.stream_prefix}:{channel.split('.', 1)[0]}"
+    
+    async def _send(self, batch: List[Tuple[str, Union[bytes, str]]]) -> int:
+        """XADD a batch in one pipeline; returns how many were sent."""
+        if not batch or not self.redis_client:
+            return 0
+        started = time.perf_counter()
+        failed = False
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for channel, payload in batch:
+                pipe.xadd(
+                    self._stream_for(channel),
+                    {"channel": channel, "data": payload},
+                    maxlen=self.maxlen,
+                    approximate=True
+                )
+            await pipe.execute()
+            self.stats["published"] += len(batch)
+            return len(batch)
+        except Exception as e:
+            failed = True
+            self.stats["failed"] += len(batch)
+            logger.error(f"Error adding {len(batch)} events to streams: {e}")
+            return 0
+        finally:
+            self.stats["batches"] += 1
+            if METRICS_AVAILABLE:
+                record_event_bus_flush(len(batch), time.perf_counter() - started, failed)
+    
+    async def _join_stream(self, stream: str):
+        if stream in self.streams:
+            return
+        try:
+            await self.redis_client.xgroup_create(stream, self.group, id="$", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self.streams.add(stream)
+    
+    async def subscribe(self, channel: str, callback: Callable[[Dict[str, Any]], None]):
+        """Subscribe to a channel through the consumer group."""
+        if not self.connected or not self.redis_client:
+            logger.warning(f"Cannot subscribe - event bus not connected")
+            return
+        
+        try:
+            await self._join_stream(self._stream_for(channel))
+            self.subscribers.setdefault(channel, []).append(callback)
+            logger.info(f"Subscribed to channel: {channel} (group {self.group})")
+        except Exception as e:
+            logger.error(f"Error subscribing to {channel}: {e}")
+    
+    async def psubscribe(self, pattern: str, callback: Callable[[Dict[str, Any]], None]):
+        """
+        Subscribe to channels matching a pattern.
+        
+        The namespace (before the first ".") must be literal, e.g. "condition.*".
+        """
+        if not self.connected or not self.redis_client:
+            logger.warning(f"Cannot subscribe - event bus not connected")
+            return
+        
+        namespace = pattern.split(".", 1)[0]
+        if any(ch in namespace for ch in "*?["):
+            logger.error(f"Cannot subscribe to pattern {pattern} - stream namespace must be literal")
+            return
+        
+        try:
+            await self._join_stream(self._stream_for(pattern))
+            self.subscribers.setdefault(f"pattern:{pattern}", []).append(callback)
+            logger.info(f"Subscribed to pattern: {pattern} (group {self.group})")
+        except Exception as e:
+            logger.error(f"Error subscribing to pattern {pattern}: {e}")
+    
+    async def unsubscribe(self, channel: str, callback: Optional[Callable] = None):
+        """Remove a callback (or all callbacks) for a channel; the group membership stays."""
+        if callback:
+            if callback in self.subscribers.get(channel, []):
+                self.subscribers[channel].remove(callback)
+        else:
+            self.subscribers.pop(channel, None)
+    
+    async def start_listening(self):
+        """Read from the consumer group and call callbacks until stopped."""
+        if not self.streams:
+            logger.warning("Cannot start listening - not subscribed to any channels")
+            return
+        
+        self.running = True
+        logger.info(f"Started reading streams {sorted(self.streams)} as {self.group}/{self.consumer}")
+        last_reclaim = 0.0
+        
+        try:
+            while self.running:
+                try:
+                    if time.monotonic() - last_reclaim >= self.reclaim_idle_ms / 1000:
+                        last_reclaim = time.monotonic()
+                        await self._reclaim()
+                    
+                    response = await self.redis_client.xreadgroup(
+                        self.group,
+                        self.consumer,
+                        {stream: ">" for stream in self.streams},
+                        count=self.read_count,
+                        block=1000
+                    )
+                    for stream, entries in response or []:
+                        await self._process(stream, entries)
+                
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error in stream loop: {e}")
+                    await asyncio.sleep(1)
+        finally:
+            self.running = False
+            logger.info("Stopped reading streams")
+    
+    async def _reclaim(self):
+        """Take over entries another consumer read but never acked."""
+        for stream in list(self.streams):
+            start_id = "0-0"
+            while True:
+                result = await self.redis_client.xautoclaim(
+                    stream, self.group, self.consumer,
+                    min_idle_time=self.reclaim_idle_ms, start_id=start_id, count=self.read_count
+                )
+                start_id, entries = result[0], result[1]
+                if entries:
+                    self.stats["reclaimed"] += len(entries)
+                    logger.warning(f"Reclaimed {len(entries)} pending events on {stream}")
+                    await self._process(stream, entries)
+                if not entries or start_id in ("0-0", b"0-0"):
+                    break
+    
+    async def _process(self, stream: str, entries: List[Tuple[str, Dict[str, Any]]]):
+        """Call callbacks for stream entries and ack the ones that were handled."""
+        ids = []
+        for entry_id, fields in entries:
+            if not fields:
+                ids.append(entry_id)  # Trimmed away before it could be claimed
+                continue
+            channel = fields.get("channel")
+            try:
+                event = decode_event(fields.get("data"))
+            except (json.JSONDecodeError, TypeError) as e:
+                logger.error(f"Failed to decode event {entry_id} on {stream}: {e}")
+                ids.append(entry_id)  # Redelivery cannot fix it
+                continue
+            if await self._dispatch(channel, event):
+                ids.append(entry_id)
+                self._failed_deliveries.pop(entry_id, None)
+                self.stats["delivered"] += 1
+                continue
+            failures = self._failed_deliveries.get(entry_id, 0) + 1
+            if failures >= self.max_deliveries:
+                logger.error(f"Abandoning event {entry_id} on {stream} ({channel}) after {failures} failed deliveries")
+                ids.append(entry_id)
+                self._failed_deliveries.pop(entry_id, None)
+                self.stats["abandoned"] += 1
+            else:
+                self._failed_deliveries[entry_id] = failures  # Left pending for _reclaim
+        if ids:
+            await self.redis_client.xack(stream, self.group, *ids)
+    
+    async def _dispatch(self, channel: str, event: Dict[str, Any]) -> bool:
+        """Run every callback for the channel; True only if there was one and none raised."""
+        callbacks = list(self.subscribers.get(channel, []))
+        for key, pattern_callbacks in self.subscribers.items():
+            if key.startswith("pattern:") and fnmatch.fnmatchcase(channel, key[len("pattern:"):]):
+                callbacks.extend(pattern_callbacks)
+        if not callbacks:
+            return False
+        handled = True
+        for callback in callbacks:
+            if not await self._run_callback(channel, callback, event):
+                handled = False
+        return handled
+    
+    async def get_channel_subscribers_count(self, channel: str) -> int:
+        """Number of consumers in this bus's group for the channel's stream."""
+        if not self.connected or not self.redis_client:
+            return 0
+        
+        try:
+            groups = await self.redis_client.xinfo_groups(self._stream_for(channel))
+            return next((g["consumers"] for g in groups if g["name"] == self.group), 0)
+        except Exception as e:
+            logger.error(f"Error getting consumer count: {e}")
+            return 0
+
+
+class _LocalSubscription:
+    """One callback on a LocalEventBus with its own queue and worker."""
+    
+    __slots__ = ("key", "pattern", "callback", "queue", "worker")
+    
+    def __init__(self, key: str, pattern: Optional[str], callback: Callable, queue_size: int):
+        self.key = key
+        self.pattern = pattern
+        self.callback = callback
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.worker: Optional[asyncio.Task] = None
+    
+    def matches(self, channel: str) -> bool:
+        if self.pattern is None:
+            return self.key == channel
+        return fnmatch.fnmatchcase(channel, self.pattern)
+
+
+class LocalEventBus(EventBus):
+    """
+    In-process transport with the same publish/subscribe API as EventBus.
+    
+    For single-node deployments (evaluator and notifier in one process) and
+    tests. No Redis is involved:
+    - Events are handed over as dicts and never serialized. All subscribers
+      get the same dict, so callbacks must not modify it.
+    - Patterns use the same glob syntax as Redis PSUBSCRIBE ("condition.*").
+    - Every subscription has its own bounded queue and worker task. Callbacks
+      of one subscription run in publish order; a slow subscriber does not
+      hold up the others.
+    - While listening, publish() waits when a subscriber's queue is full
+      (backpressure). When nobody listens, events that do not fit are dropped,
+      like Redis pub/sub.
+    
+    create_event_bus(transport="local") returns one shared instance per process.
+    """
+    
+    def __init__(self, queue_size: int = LISTEN_QUEUE_SIZE):
+        super().__init__(batch_ms=0, listen_queue_size=queue_size)
+        self._subscriptions: List[_LocalSubscription] = []
+        self._stopped: Optional[asyncio.Event] = None
+        self.stats.update({"delivered": 0, "dropped": 0})
+    
+    async def connect(self) -> bool:
+        self.connected = True
+        logger.info("Event bus using in-process transport")
+        return True
+    
+    async def disconnect(self):
+        self.stop_listening()
+        if self._listen_task is not None and self._listen_task is not asyncio.current_task():
+            await asyncio.wait([self._listen_task])  # Let it drain queued callbacks
+        await self._stop_workers()
+        self.connected = False
+        logger.info("In-process event bus disconnected")
+    
+    async def publish(self, channel: str, event: Dict[str, Any]) -> bool:
+        """Queue an event for every matching subscription."""
+        if not self.connected:
+            logger.debug(f"Event bus not connected - skipping publish to {channel}")
+            return False
+        
+        event = self._with_meta(channel, event)
+        for subscription in self._subscriptions:
+            if not subscription.matches(channel):
+                continue
+            if self.running:
+                await subscription.queue.put((channel, event))
+                continue
+            try:
+                subscription.queue.put_nowait((channel, event))
+            except asyncio.QueueFull:
+                self.stats["dropped"] += 1
+        self.stats["published"] += 1
+        if METRICS_AVAILABLE:
+            update_event_bus_backlog(self.backlog)
+        return True
+    
+    async def publish_many(self, events: List[Tuple[str, Dict[str, Any]]]) -> int:
+        published = 0
+        for channel, event in events:
+            published += await self.publish(channel, event)
+        return published
+    
+    async def flush(self):
+        """Nothing is batched in process."""
+    
+    async def subscribe(self, channel: str, callback: Callable[[Dict[str, Any]], None]):
+        self._add_subscription(channel, None, callback)
+    
+    async def psubscribe(self, pattern: str, callback: Callable[[Dict[str, Any]], None]):
+        self._add_subscription(f"pattern:{pattern}", pattern, callback)
+    
+    def _add_subscription(self, key: str, pattern: Optional[str], callback: Callable):
+        if not self.connected:
+            logger.warning(f"Cannot subscribe - event bus not connected")
+            return
+        
+        subscription = _LocalSubscription(key, pattern, callback, self.listen_queue_size)
+        self._subscriptions.append(subscription)
+        self.subscribers.setdefault(key, []).append(callback)
+        if self.running:
+            subscription.worker = asyncio.create_task(self._local_worker(subscription))
+        logger.info(f"Subscribed to {'pattern' if pattern else 'channel'}: {pattern or key}")
+    
+    async def unsubscribe(self, channel: str, callback: Optional[Callable] = None):
+        """Remove a callback (or all callbacks) for a channel; its queued events are discarded."""
+        removed = [
+            s for s in self._subscriptions
+            if s.key == channel and (callback is None or s.callback is callback)
+        ]
+        for subscription in removed:
+            self._subscriptions.remove(subscription)
+            self.subscribers[channel].remove(subscription.callback)
+            if subscription.worker is not None:
+                subscription.worker.cancel()
+        if not self.subscribers.get(channel):
+            self.subscribers.pop(channel, None)
+    
+    async def start_listening(self):
+        """Run subscription workers until stop_listening(), then drain their queues."""
+        if not self._subscriptions:
+            logger.warning("Cannot start listening - not subscribed to any channels")
+            return
+        
+        self.running = True
+        self._listen_task = asyncio.current_task()
+        self._stopped = asyncio.Event()
+        for subscription in self._subscriptions:
+            if subscription.worker is None or subscription.worker.done():
+                subscription.worker = asyncio.create_task(self._local_worker(subscription))
+        logger.info(f"Started listening for events ({len(self._subscriptions)} in-process subscriptions)...")
+        
+        try:
+            await self._stopped.wait()
+        except asyncio.CancelledError:
+            if self.running:
+                raise
+        finally:
+            drain = not self.running
+            self.running = False
+            if drain:
+                for subscription in list(self._subscriptions):
+                    await subscription.queue.join()
+            await self._stop_workers()
+            self._listen_task = None
+            logger.info("Stopped listening for events")
+    
+    async def _stop_workers(self):
+        workers = [s.worker for s in self._subscriptions if s.worker is not None]
+        for subscription in self._subscriptions:
+            subscription.worker = None
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        if METRICS_AVAILABLE:
+            update_event_bus_backlog(self.backlog)
+    
+    async def _local_worker(self, subscription: _LocalSubscription):
+        while True:
+            channel, event = await subscription.queue.get()
+            try:
+                await self._run_callback(subscription.pattern or channel, subscription.callback, event)
+                self.stats["delivered"] += 1
+            finally:
+                subscription.queue.task_done()
+    
+    @property
+    def backlog(self) -> int:
+        return sum(s.queue.qsize() for s in self._subscriptions)
+    
+    def stop_listening(self):
+        """Stop listening for events (callbacks already queued still run)."""
+        self.running = False
+        if self._stopped is not None and not self._stopped.is_set():
+            self._stopped.set()
+            logger.info("Stopping event listener...")
+    
+    async def get_channel_subscribers_count(self, channel: str) -> int:
+        """Number of subscriptions an event on the channel would reach."""
+        return sum(1 for s in self._subscriptions if s.matches(channel))
+
+
+_local_event_bus: Optional[LocalEventBus] = None
+
+
+async def get_local_event_bus() -> LocalEventBus:
+    """The process-wide in-process event bus, connected."""
+    global _local_event_bus
+    if _local_event_bus is None:
+        _local_event_bus = LocalEventBus()
+    if not _local_event_bus.connected:
+        await _local_event_bus.connect()
+    return _local_event_bus
+
+
 # Convenience function to create event bus
-async def create_event_bus(redis_url: Optional[str] = None) -> Optional[EventBus]:
+async def create_event_bus(redis_url: Optional[str] = None, transport: Optional[str] = None) -> Optional[EventBus]:
     """
     Create and connect an event bus instance.
     
+    Args:
+        redis_url: Redis connection URL
+        transport: "pubsub", "streams" or "local" (default: EVENT_BUS_TRANSPORT env, else pubsub)
+    
     Returns:
-        EventBus instance if Redis is available, None otherwise
+        EventBus instance if Redis is available (or the transport is local), None otherwise.
+        With EVENT_BUS_LOCAL_FALLBACK=true the in-process bus is returned instead of None.
     """
+    transport = (transport or os.getenv("EVENT_BUS_TRANSPORT", "pubsub")).lower()
+    if transport == "local":
+        return await get_local_event_bus()
+    
+    local_fallback = os.getenv("EVENT_BUS_LOCAL_FALLBACK", "false").lower() == "true"
+    
     if not REDIS_AVAILABLE:
+        if local_fallback:
+            logger.warning("Redis not available - using in-process event bus")
+            return await get_local_event_bus()
         logger.warning("Redis not available - event bus disabled")
         return None
     
-    event_bus = EventBus(redis_url)
+    event_bus = StreamEventBus(redis_url) if transport == "streams" else EventBus(redis_url)
     connected = await event_bus.connect()
     
     if connected:
         return event_bus
+    elif local_fallback:
+        logger.warning("Failed to connect to Redis - using in-process event bus")
+        return await get_local_event_bus()
     else:
         logger.warning("Failed to connect to Redis - event bus disabled")
         return None
-
-
@@ -0,0 +1,286 @@
+"""
+Indicator Frame Cache - Shared per-(symbol, timeframe) indicator series.
+
+The condition evaluator used to recompute every indicator from scratch on
+each cycle, with hardcoded periods. This cache keeps incremental state for
+every (symbol, timeframe, indicator, params) that registered conditions need:
+
+- Closed bars are folded into the state exactly once.
+- Within a bar, the stored series is returned as-is.
+- When new bars close, only those bars are processed.
+- The still-forming last bar is computed from the committed state without
+  modifying it.
+"""
+
+import copy
+import logging
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Default parameters when a condition does not specify them
+DEFAULT_PARAMS: Dict[str, Tuple[int, ...]] = {
+    "RSI": (14,),
+    "EMA": (20,),
+    "SMA": (20,),
+    "MACD": (12, 26, 9),
+}
+
+# Bars of history kept per series
+MAX_BARS = 1000
+
+IndicatorSpec = Tuple[str, Tuple[int, ...]]
+
+
+def indicator_spec(indicator: Optional[str], period: Any = None) -> Optional[IndicatorSpec]:
+    """
+    Build the (indicator, params) spec for a condition.
+
+    Returns None for indicators the cache does not compute.
+    """
+    if not indicator:
+        return None
+    indicator = indicator.upper()
+    defaults = DEFAULT_PARAMS.get(indicator)
+    if defaults is None:
+        return None
+    if indicator != "MACD" and period:
+        try:
+            return indicator, (int(period),)
+        except (ValueError, TypeError):
+            pass
+    return indicator, defaults
+
+
+def spec_columns(spec: IndicatorSpec) -> List[str]:
+    """Column names written for a spec (matched by the evaluator's column lookup)."""
+    indicator, params = spec
+    if indicator == "MACD":
+        suffix = "" if params == DEFAULT_PARAMS["MACD"] else "_" + "_".join(str(p) for p in params)
+        return [f"MACD_macd_line{suffix}", f"MACD_signal_line{suffix}", f"MACD_histogram{suffix}"]
+    return [f"{indicator}_{params[0]}"]
+
+
+class _IndicatorState(ABC):
+    """Incremental indicator state; update() commits a closed bar."""
+
+    @abstractmethod
+    def update(self, close: float) -> Tuple[float, ...]:
+        """Fold a closed bar into the state and return the indicator value(s)."""
+
+    def peek(self, close: float) -> Tuple[float, ...]:
+        """Value for a still-forming bar without committing it."""
+        return copy.deepcopy(self).update(close)
+
+
+class _EWM:
+    """Matches pandas Series.ewm(span=span).mean() (adjust=True)."""
+
+    def __init__(self, span: int):
+        self.decay = 1 - 2 / (span + 1)
+        self.num = 0.0
+        self.den = 0.0
+
+    def update(self, x: float) -> float:
+        if np.isnan(x):
+            return self.num / self.den if self.den else np.nan
+        self.num = x + self.decay * self.num
+        self.den = 1 + self.decay * self.den
+        return self.num / self.den
+
+
+class _EMAState(_IndicatorState):
+    def __init__(self, period: int):
+        self.ewm = _EWM(period)
+
+    def update(self, close: float) -> Tuple[float, ...]:
+        return (self.ewm.update(close),)
+
+
+class _SMAState(_IndicatorState):
+    def __init__(self, period: int):
+        self.window = deque(maxlen=period)
+
+    def update(self, close: float) -> Tuple[float, ...]:
+        self.window.append(close)
+        if len(self.window) < self.window.maxlen:
+            return (np.nan,)
+        return (sum(self.window) / len(self.window),)
+
+
+class _RSIState(_IndicatorState):
+    """Rolling-mean RSI, same formula as the evaluator's previous implementation."""
+
+    def __init__(self, period: int):
+        self.deltas = deque(maxlen=period)
+        self.prev_close: Optional[float] = None
+
+    def update(self, close: float) -> Tuple[float, ...]:
+        if self.prev_close is not None:
+            self.deltas.append(close - self.prev_close)
+        self.prev_close = close
+        if len(self.deltas) < self.deltas.maxlen:
+            return (np.nan,)
+        gain = sum(d for d in self.deltas if d > 0) / len(self.deltas)
+        loss = sum(-d for d in self.deltas if d < 0) / len(self.deltas)
+        if loss == 0:
+            return (100.0 if gain > 0 else np.nan,)
+        return (100 - (100 / (1 + gain / loss)),)
+
+
+class _MACDState(_IndicatorState):
+    def __init__(self, fast: int, slow: int, signal: int):
+        self.fast = _EWM(fast)
+        self.slow = _EWM(slow)
+        self.signal = _EWM(signal)
+
+    def update(self, close: float) -> Tuple[float, ...]:
+        macd = self.fast.update(close) - self.slow.update(close)
+        signal = self.signal.update(macd)
+        return (macd, signal, macd - signal)
+
+
+def _new_state(spec: IndicatorSpec) -> _IndicatorState:
+    indicator, params = spec
+    if indicator == "RSI":
+        return _RSIState(*params)
+    if indicator == "EMA":
+        return _EMAState(*params)
+    if indicator == "SMA":
+        return _SMAState(*params)
+    if indicator == "MACD":
+        return _MACDState(*params)
+    raise ValueError(f"Unsupported indicator: {indicator}")
+
+
+class _SeriesEntry:
+    """Committed values for closed bars plus the memo for the current bar."""
+
+    def __init__(self, spec: IndicatorSpec):
+        self.state = _new_state(spec)
+        self.times: deque = deque(maxlen=MAX_BARS)
+        self.values: deque = deque(maxlen=MAX_BARS)
+        self.last_closed_time = None
+        # (last_closed_time, forming bar time, forming close) -> output arrays
+        self.memo_key = None
+        self.memo: Optional[List[np.ndarray]] = None
+
+
+class IndicatorFrameCache:
+    """
+    Cache of indicator series keyed by (symbol, timeframe, indicator, params).
+
+    Usage:
+        cache = IndicatorFrameCache()
+        df = cache.apply("BTCUSDT", "1m", df, {("RSI", (14,)), ("EMA", (50,))})
+    """
+
+    def __init__(self, time_column: str = "open_time"):
+        self.time_column = time_column
+        self._entries: Dict[Tuple[str, str, IndicatorSpec], _SeriesEntry] = {}
+        self.stats = {"hits": 0, "bars_computed": 0, "resets": 0}
+
+    def apply(
+        self,
+        symbol: str,
+        timeframe: str,
+        df: pd.DataFrame,
+        specs: Iterable[IndicatorSpec],
+        last_bar_closed: bool = False
+    ) -> pd.DataFrame:
+        """
+        Add indicator columns for all specs to df (in place) and return it.
+
+        Args:
+            df: Candles ordered by time; the last row is the forming bar
+                unless last_bar_closed is True
+            specs: (indicator, params) pairs, see indicator_spec()
+        """
+        if df.empty:
+            return df
+
+        times = df[self.time_column].to_numpy()
+        closes = df["close"].to_numpy(dtype=float)
+
+        for spec in set(specs):
+            try:
+                arrays = self._series(symbol, timeframe, spec, times, closes, last_bar_closed)
+                for column, values in zip(spec_columns(spec), arrays):
+                    df[column] = values
+            except Exception as e:
+                logger.error(f"Error calculating {spec} for {symbol} {timeframe}: {e}")
+
+        return df
+
+    def _series(
+        self,
+        symbol: str,
+        timeframe: str,
+        spec: IndicatorSpec,
+        times: np.ndarray,
+        closes: np.ndarray,
+        last_bar_closed: bool
+    ) -> List[np.ndarray]:
+        key = (symbol, timeframe, spec)
+        entry = self._entries.get(key)
+
+        n = len(times)
+        closed_n = n if last_bar_closed else n - 1
+        last_closed_time = times[closed_n - 1] if closed_n > 0 else None
+        forming = (times[-1], closes[-1]) if closed_n < n else None
+
+        memo_key = (last_closed_time, forming)
+        if entry is not None and entry.memo_key == memo_key and len(entry.memo[0]) == n:
+            self.stats["hits"] += 1
+            return entry.memo
+
+        # Find where the stored series ends inside this frame
+        start = 0
+        if entry is not None and entry.last_closed_time is not None:
+            pos = int(np.searchsorted(times[:closed_n], entry.last_closed_time))
+            if pos < closed_n and times[pos] == entry.last_closed_time:
+                start = pos + 1
+            elif last_closed_time is not None and last_closed_time == entry.last_closed_time:
+                start = closed_n
+            else:
+                # Gap larger than the frame, or history rewritten - rebuild
+                entry = None
+                self.stats["resets"] += 1
+
+        if entry is None:
+            entry = self._entries[key] = _SeriesEntry(spec)
+            start = 0
+
+        # Commit newly closed bars
+        for i in range(start, closed_n):
+            entry.values.append(entry.state.update(float(closes[i])))
+            entry.times.append(times[i])
+        if closed_n > start:
+            self.stats["bars_computed"] += closed_n - start
+            entry.last_closed_time = last_closed_time
+
+        width = len(spec_columns(spec))
+        out = np.full((width, n), np.nan)
+        stored = min(len(entry.values), closed_n)
+        if stored:
+            tail = list(entry.values)[-stored:]
+            out[:, closed_n - stored:closed_n] = np.array(tail).T
+        if forming is not None:
+            out[:, -1] = entry.state.peek(float(closes[-1]))
+
+        entry.memo_key = memo_key
+        entry.memo = list(out)
+        return entry.memo
+
+    def evict(self, symbol: str, timeframe: Optional[str] = None):
+        """Drop cached series for a symbol (and optionally one timeframe)."""
+        for key in [k for k in self._entries if k[0] == symbol and (timeframe is None or k[1] == timeframe)]:
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
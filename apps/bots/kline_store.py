@@ -0,0 +1,377 @@
+"""
+Kline Store - Long-lived in-process candle store fed by Binance websockets.
+
+Each (symbol, interval) is seeded once over REST and then kept current from a
+single combined-stream websocket (``<symbol>@kline_<interval>``). Reads return
+DataFrame / NumPy views built from memory, so evaluation cycles and bot
+iterations no longer hit ``/api/v3/klines``.
+
+If the websocket is down, reads fall back to REST so callers always get
+fresh data; series are re-seeded once the stream is back.
+
+Listeners registered with add_listener() receive every stream update as a
+``Candle`` (``x=True`` marks a closed bar), which lets consumers react to bar
+closes instead of polling on a timer.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import websockets
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    WEBSOCKETS_AVAILABLE = False
+
+# Add api directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+from binance_client import BinanceClient
+
+# Add root path for 'shared' contracts
+root_path = os.path.join(os.path.dirname(__file__), '..', '..')
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+from shared.contracts.market import Candle
+
+logger = logging.getLogger(__name__)
+
+COMBINED_STREAM_URL = os.getenv("BINANCE_COMBINED_STREAM_URL", "wss://stream.binance.com:9443/stream")
+
+# Column layout matches MarketDataService.get_klines_as_dataframe
+KLINE_COLUMNS = [
+    'open_time', 'open', 'high', 'low', 'close', 'volume',
+    'close_time', 'quote_volume', 'trades', 'taker_buy_base',
+    'taker_buy_quote', 'ignore'
+]
+
+# Binance allows up to 200 streams per SUBSCRIBE request
+_SUBSCRIBE_BATCH = 200
+
+
+def stream_name(symbol: str, interval: str) -> str:
+    return f"{symbol.lower()}@kline_{interval}"
+
+
+class _KlineSeries:
+    """Bounded buffer of bars for one symbol/interval."""
+
+    def __init__(self, max_bars: int):
+        # Rows: [open_time, open, high, low, close, volume, close_time,
+        #        quote_volume, trades, taker_buy_base, taker_buy_quote, closed]
+        self.rows: deque = deque(maxlen=max_bars)
+        self.version = 0
+        self.seeded_limit = 0
+        self.needs_seed = True
+        self.last_update = 0.0
+        self._view_version = -1
+        self._view: Optional[np.ndarray] = None
+
+    def replace(self, rows: List[List[float]], limit: int):
+        self.rows.clear()
+        self.rows.extend(rows)
+        self.seeded_limit = limit
+        self.needs_seed = False
+        self._touch()
+
+    def apply(self, row: List[float]):
+        """Update the forming bar or append a new one."""
+        if self.rows and self.rows[-1][0] == row[0]:
+            self.rows[-1] = row
+        elif not self.rows or self.rows[-1][0] < row[0]:
+            self.rows.append(row)
+        else:
+            return  # Out-of-order update for an older bar
+        self._touch()
+
+    def _touch(self):
+        self.version += 1
+        self.last_update = time.monotonic()
+
+    def matrix(self) -> np.ndarray:
+        """All rows as a 2-D float array (rebuilt only when the series changed)."""
+        if self._view_version != self.version:
+            self._view = np.array(self.rows, dtype=float).reshape(-1, len(KLINE_COLUMNS))
+            self._view_version = self.version
+        return self._view
+
+
+class KlineStore:
+    """
+    Shared kline store for the evaluator, DCA executors and alert runner.
+
+    Usage:
+        df = await kline_store.get_dataframe("BTCUSDT", "1m", limit=200)
+        arrays = await kline_store.get_arrays("BTCUSDT", "1m", limit=200)
+    """
+
+    def __init__(self, max_bars: int = 1000, seed_limit: int = 500, ws_url: str = COMBINED_STREAM_URL):
+        self.max_bars = max_bars
+        self.seed_limit = seed_limit
+        self.ws_url = ws_url
+        self.binance_client: Optional[BinanceClient] = None
+        self.series: Dict[Tuple[str, str], _KlineSeries] = {}
+        self.streams: Dict[str, Tuple[str, str]] = {}  # stream name -> (symbol, interval)
+        self.connected = False
+        self.running = False
+        self._ws = None
+        self._ws_task: Optional[asyncio.Task] = None
+        self._seed_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._msg_id = 0
+        self._listeners: List[Callable[[str, str, Candle], None]] = []
+        self.stats = {"rest_seeds": 0, "rest_fallbacks": 0, "ws_updates": 0, "reconnects": 0}
+
+    async def start(self):
+        """Start the websocket consumer (idempotent)."""
+        if self.running:
+            return
+        self.running = True
+        if self.binance_client is None:
+            self.binance_client = BinanceClient()
+            await self.binance_client.__aenter__()
+        if WEBSOCKETS_AVAILABLE:
+            self._ws_task = asyncio.create_task(self._run_websocket())
+        else:
+            logger.warning("websockets not installed - kline store will serve REST data only")
+        logger.info("Kline store started")
+
+    async def stop(self):
+        """Stop the websocket consumer and close the REST session."""
+        self.running = False
+        if self._ws is not None:
+            await self._ws.close()
+        if self._ws_task:
+            self._ws_task.cancel()
+            try:
+                await self._ws_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._ws_task = None
+        if self.binance_client:
+            await self.binance_client.__aexit__(None, None, None)
+            self.binance_client = None
+        self.connected = False
+        logger.info("Kline store stopped")
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    async def get_dataframe(self, symbol: str, interval: str, limit: int = 500) -> pd.DataFrame:
+        """Get klines as a DataFrame (same layout as MarketDataService)."""
+        await self.ensure(symbol, interval, limit)
+        return self.snapshot(symbol, interval, limit)
+
+    async def get_arrays(self, symbol: str, interval: str, limit: int = 500) -> Dict[str, np.ndarray]:
+        """Get klines as NumPy arrays keyed by column name (views, do not modify)."""
+        await self.ensure(symbol, interval, limit)
+        return self.arrays(symbol, interval, limit)
+
+    def snapshot(self, symbol: str, interval: str, limit: int = 500) -> pd.DataFrame:
+        """Build a DataFrame from memory only (empty if the series is not seeded)."""
+        arrays = self.arrays(symbol, interval, limit)
+        if not arrays:
+            return pd.DataFrame()
+        df = pd.DataFrame({col: arrays[col] for col in KLINE_COLUMNS if col in arrays})
+        df['open_time'] = pd.to_datetime(arrays['open_time'].astype('int64'), unit='ms')
+        df['close_time'] = arrays['close_time'].astype('int64')
+        df['trades'] = arrays['trades'].astype('int64')
+        df['ignore'] = "0"
+        return df[KLINE_COLUMNS]
+
+    def arrays(self, symbol: str, interval: str, limit: int = 500) -> Dict[str, np.ndarray]:
+        """Column arrays from memory only (empty dict if the series is not seeded)."""
+        series = self.series.get((symbol.upper(), interval))
+        if series is None or not series.rows:
+            return {}
+        matrix = series.matrix()[-limit:]
+        out = {col: matrix[:, i] for i, col in enumerate(KLINE_COLUMNS[:-1])}
+        out["closed"] = matrix[:, -1].astype(bool)
+        return out
+
+    def is_live(self, symbol: str, interval: str) -> bool:
+        """True when the series is seeded and kept current by the websocket."""
+        series = self.series.get((symbol.upper(), interval))
+        return bool(self.connected and series and not series.needs_seed)
+
+    def add_listener(self, callback: Callable[[str, str, Candle], None]):
+        """
+        Register a callback(symbol, interval, candle) for stream updates.
+
+        Callbacks run inside the websocket reader and must not block;
+        schedule real work (e.g. put onto an asyncio.Queue) instead.
+        """
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[str, str, Candle], None]):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    # ------------------------------------------------------------------
+    # Seeding / subscriptions
+    # ------------------------------------------------------------------
+
+    async def ensure(self, symbol: str, interval: str, limit: int = 500):
+        """Make sure (symbol, interval) is seeded with at least `limit` bars and streamed."""
+        if not self.running:
+            await self.start()
+
+        key = (symbol.upper(), interval)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = _KlineSeries(self.max_bars)
+            await self._subscribe(*key)
+
+        wanted = min(max(limit, self.seed_limit), self.max_bars)
+        if not self.connected:
+            # No live stream - behave like plain REST polling
+            await self._seed(key, series, wanted, fallback=True)
+        elif series.needs_seed or series.seeded_limit < min(limit, self.max_bars):
+            await self._seed(key, series, wanted)
+
+    async def _seed(self, key: Tuple[str, str], series: _KlineSeries, limit: int, fallback: bool = False):
+        lock = self._seed_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            version = series.version
+            if not fallback and not series.needs_seed and series.seeded_limit >= limit:
+                return  # Seeded by a concurrent caller
+            if fallback and version != 0 and series.last_update > time.monotonic() - 1:
+                return  # Refreshed by a concurrent caller moments ago
+            try:
+                klines = await self.binance_client.get_klines(key[0], key[1], limit)
+            except Exception as e:
+                logger.error(f"Error seeding klines for {key[0]} {key[1]}: {e}")
+                return
+            rows = [self._rest_row(k) for k in klines or []]
+            if rows:
+                # Bars older than the newest one are closed
+                for row in rows[:-1]:
+                    row[-1] = 1.0
+                rows[-1][-1] = 1.0 if rows[-1][6] < time.time() * 1000 else 0.0
+            series.replace(rows, limit)
+            self.stats["rest_fallbacks" if fallback else "rest_seeds"] += 1
+
+    async def release(self, symbol: str, interval: str):
+        """
+        Unsubscribe (symbol, interval) and drop its bars.
+
+        Binance caps a combined connection at 1024 streams, so pairs nobody
+        evaluates any more should be released. A later ensure() (including
+        get_dataframe/get_arrays) seeds and subscribes the pair again.
+        """
+        key = (symbol.upper(), interval)
+        self.series.pop(key, None)
+        self._seed_locks.pop(key, None)
+        name = stream_name(*key)
+        if self.streams.pop(name, None) is not None and self.connected and self._ws is not None:
+            await self._send_subscribe([name], method="UNSUBSCRIBE")
+
+    async def _subscribe(self, symbol: str, interval: str):
+        name = stream_name(symbol, interval)
+        self.streams[name] = (symbol, interval)
+        if self.connected and self._ws is not None:
+            await self._send_subscribe([name])
+
+    async def _send_subscribe(self, names: List[str], method: str = "SUBSCRIBE"):
+        for i in range(0, len(names), _SUBSCRIBE_BATCH):
+            self._msg_id += 1
+            await self._ws.send(json.dumps({
+                "method": method,
+                "params": names[i:i + _SUBSCRIBE_BATCH],
+                "id": self._msg_id
+            }))
+
+    # ------------------------------------------------------------------
+    # Websocket
+    # ------------------------------------------------------------------
+
+    async def _run_websocket(self):
+        backoff = 1
+        while self.running:
+            try:
+                async with websockets.connect(self.ws_url, ping_interval=20) as ws:
+                    self._ws = ws
+                    self.connected = True
+                    backoff = 1
+                    # Anything buffered while disconnected may have gaps - re-seed lazily
+                    for series in self.series.values():
+                        series.needs_seed = True
+                    if self.streams:
+                        await self._send_subscribe(list(self.streams))
+                    logger.info(f"Kline store websocket connected ({len(self.streams)} streams)")
+
+                    async for message in ws:
+                        self._handle_message(message)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.warning(f"Kline store websocket error: {e}")
+            finally:
+                self.connected = False
+                self._ws = None
+
+            if self.running:
+                self.stats["reconnects"] += 1
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def _handle_message(self, message: str):
+        try:
+            data = json.loads(message)
+            payload = data.get("data", data)
+            if payload.get("e") != "kline":
+                return
+            k = payload["k"]
+            key = (k["s"].upper(), k["i"])
+            series = self.series.get(key)
+            if series is None:
+                return
+            series.apply(self._ws_row(k))
+            self.stats["ws_updates"] += 1
+        except Exception as e:
+            logger.error(f"Error processing kline message: {e}")
+            return
+
+        if self._listeners:
+            candle = Candle(
+                t=int(k["t"]),
+                o=float(k["o"]),
+                h=float(k["h"]),
+                l=float(k["l"]),
+                c=float(k["c"]),
+                v=float(k["v"]),
+                x=bool(k["x"])
+            )
+            for callback in list(self._listeners):
+                try:
+                    callback(key[0], key[1], candle)
+                except Exception as e:
+                    logger.error(f"Error in kline listener: {e}")
+
+    @staticmethod
+    def _rest_row(k: List[Any]) -> List[float]:
+        return [
+            float(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]),
+            float(k[6]), float(k[7]), float(k[8]), float(k[9]), float(k[10]), 0.0
+        ]
+
+    @staticmethod
+    def _ws_row(k: Dict[str, Any]) -> List[float]:
+        return [
+            float(k["t"]), float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]), float(k["v"]),
+            float(k["T"]), float(k["q"]), float(k["n"]), float(k["V"]), float(k["Q"]),
+            1.0 if k["x"] else 0.0
+        ]
+
+
+# Process-wide store shared by all MarketDataService instances
+kline_store = KlineStore()
@@ -1,7 +1,16 @@
-"""Market Data Service - Fetches data from Binance for bot execution."""
+"""
+Market Data Service - Fetches data from Binance for bot execution.
 
+MarketDataHub is the process-wide variant shared by all running bots: one
+HTTP session, prices from a batched bookTicker cache and de-duplicated kline
+requests, so N bots on the same pair cost one request instead of N.
+"""
+
+import asyncio
 import logging
-from typing import Dict, Any, List, Optional
+import time
+from collections import Counter
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 from datetime import datetime
 import pandas as pd
 import sys
@@ -11,14 +20,34 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
 from binance_client import BinanceClient
 
+# Add bots directory to path
+bots_path = os.path.dirname(__file__)
+if bots_path not in sys.path:
+    sys.path.insert(0, bots_path)
+from kline_store import KlineStore, kline_store as shared_kline_store
+
 logger = logging.getLogger(__name__)
 
+# Serve klines from the shared websocket-fed store instead of polling REST
+USE_KLINE_STORE = os.getenv("MARKET_DATA_USE_KLINE_STORE", "true").lower() in ("1", "true", "yes")
+
+# How long a cached bookTicker price is served before it is fetched again
+PRICE_TTL_MS = int(os.getenv("MARKET_DATA_PRICE_TTL_MS", "1000"))
+
+# Concurrent REST requests per service (the shared hub makes this process-wide for bots)
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MARKET_DATA_MAX_CONCURRENT_REQUESTS", "10"))
+
+# Symbols per bookTicker request
+_BOOK_TICKER_BATCH = 100
+
 
 class MarketDataService:
     """Service for fetching market data from Binance."""
     
-    def __init__(self):
+    def __init__(self, kline_store: Optional[KlineStore] = None):
         self.binance_client = None
+        self.kline_store = kline_store or (shared_kline_store if USE_KLINE_STORE else None)
+        self._rate_limiter = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
         
     async def initialize(self):
         """Initialize Binance client."""
@@ -42,12 +71,60 @@ class MarketDataService:
         except Exception as e:
             logger.error(f"Error fetching price for {symbol}: {e}")
             return 0.0
+    
+    async def get_prices(self, symbols: Iterable[str]) -> Dict[str, float]:
+        """
+        Get current prices (bid/ask mid) for several symbols in one bookTicker request.
+        
+        Keyed by upper-case symbol; symbols with no price map to 0.0.
+        """
+        symbols = sorted({s.upper() for s in symbols})
+        prices: Dict[str, float] = {}
+        for start in range(0, len(symbols), _BOOK_TICKER_BATCH):
+            prices.update(await self._book_ticker_prices(symbols[start:start + _BOOK_TICKER_BATCH]))
+        return {s: prices.get(s, 0.0) for s in symbols}
+    
+    async def _book_ticker_prices(self, symbols: List[str]) -> Dict[str, float]:
+        try:
+            async with self._rate_limiter:
+                tickers = await self.binance_client.get_book_ticker(symbols)
+        except Exception as e:
+            if len(symbols) == 1:
+                logger.error(f"Error fetching price for {symbols[0]}: {e}")
+                return {}
+            # One unknown symbol fails the whole request; retry one by one
+            logger.warning(f"Batched bookTicker request failed, fetching {len(symbols)} symbols one by one: {e}")
+            prices: Dict[str, float] = {}
+            for result in await asyncio.gather(*(self._book_ticker_prices([s]) for s in symbols)):
+                prices.update(result)
+            return prices
+        return {
+            ticker["symbol"]: self._mid_price(ticker)
+            for ticker in (tickers if isinstance(tickers, list) else [tickers])
+        }
+    
+    @staticmethod
+    def _mid_price(ticker: Dict[str, Any]) -> float:
+        bid = float(ticker.get("bidPrice") or 0)
+        ask = float(ticker.get("askPrice") or 0)
+        if bid > 0 and ask > 0:
+            return (bid + ask) / 2
+        return bid or ask
             
     async def get_klines_as_dataframe(self, symbol: str, interval: str, 
                                      limit: int = 500) -> pd.DataFrame:
         """Get klines and convert to DataFrame."""
+        if self.kline_store:
+            try:
+                df = await self.kline_store.get_dataframe(symbol, interval, limit)
+                if not df.empty:
+                    return df
+            except Exception as e:
+                logger.warning(f"Kline store unavailable for {symbol} {interval}, using REST: {e}")
+        
         try:
-            klines = await self.binance_client.get_klines(symbol, interval, limit)
+            async with self._rate_limiter:
+                klines = await self.binance_client.get_klines(symbol, interval, limit)
             
             if not klines:
                 return pd.DataFrame()
@@ -75,13 +152,11 @@ class MarketDataService:
     async def get_multiple_symbols_data(self, symbols: List[str], 
                                        interval: str = "1h", 
                                        limit: int = 100) -> Dict[str, pd.DataFrame]:
-        """Get klines for multiple symbols."""
-        market_data = {}
-        for symbol in symbols:
-            df = await self.get_klines_as_dataframe(symbol, interval, limit)
-            if not df.empty:
-                market_data[symbol] = df
-        return market_data
+        """Get klines for multiple symbols (fetched concurrently)."""
+        frames = await asyncio.gather(
+            *(self.get_klines_as_dataframe(symbol, interval, limit) for symbol in symbols)
+        )
+        return {symbol: df for symbol, df in zip(symbols, frames) if not df.empty}
         
     async def get_24hr_ticker(self, symbol: Optional[str] = None) -> Dict[str, Any]:
         """Get 24hr ticker data."""
@@ -91,5 +166,137 @@ class MarketDataService:
         except Exception as e:
             logger.error(f"Error fetching 24hr ticker: {e}")
             return {}
+    
+    def subscribe(self, symbols: Iterable[str]):
+        """Declare symbols this caller will ask for (no-op without a shared hub)."""
+    
+    def unsubscribe(self, symbols: Iterable[str]):
+        """Release symbols passed to subscribe()."""
+
+
+class MarketDataHub(MarketDataService):
+    """
+    Market data shared by every bot executor in the process.
+    
+    - initialize()/cleanup() are reference counted; the Binance session is
+      opened by the first user and closed by the last.
+    - subscribe()/unsubscribe() reference count symbols. Prices for all
+      subscribed symbols are refreshed together in one bookTicker request
+      and served from cache for MARKET_DATA_PRICE_TTL_MS.
+    - Concurrent kline requests for the same (symbol, interval) share one
+      fetch. Every caller gets its own copy of the DataFrame.
+    """
+    
+    def __init__(self, kline_store: Optional[KlineStore] = None, price_ttl_ms: int = PRICE_TTL_MS):
+        super().__init__(kline_store)
+        self.price_ttl = price_ttl_ms / 1000
+        self.users = 0
+        self.symbols: Counter = Counter()
+        self._prices: Dict[str, Tuple[float, float]] = {}  # symbol -> (fetched at, price)
+        self._price_fetches: Dict[str, asyncio.Task] = {}
+        self._kline_fetches: Dict[Tuple[str, str], Tuple[int, asyncio.Task]] = {}
+        self.stats = {"price_hits": 0, "price_fetches": 0, "kline_fetches": 0, "kline_shared": 0}
+    
+    async def initialize(self):
+        self.users += 1
+        if self.binance_client is None:
+            await super().initialize()
+    
+    async def cleanup(self):
+        self.users = max(0, self.users - 1)
+        if self.users == 0 and self.binance_client is not None:
+            client, self.binance_client = self.binance_client, None
+            await client.__aexit__(None, None, None)
+    
+    def subscribe(self, symbols: Iterable[str]):
+        self.symbols.update(s.upper() for s in symbols)
+    
+    def unsubscribe(self, symbols: Iterable[str]):
+        for symbol in symbols:
+            symbol = symbol.upper()
+            self.symbols[symbol] -= 1
+            if self.symbols[symbol] <= 0:
+                del self.symbols[symbol]
+                self._prices.pop(symbol, None)
+    
+    async def get_current_price(self, symbol: str) -> float:
+        """Get current price (bid/ask mid) for a symbol."""
+        return (await self.get_prices([symbol])).get(symbol.upper(), 0.0)
+    
+    async def get_prices(self, symbols: Iterable[str]) -> Dict[str, float]:
+        """
+        Get current prices for several symbols, keyed by upper-case symbol.
+        
+        Stale symbols are fetched in one request together with every other
+        stale subscribed symbol. Symbols with no price map to 0.0.
+        """
+        symbols = [s.upper() for s in symbols]
+        now = time.monotonic()
+        stale = [s for s in symbols if not self._fresh(s, now)]
+        self.stats["price_hits"] += len(symbols) - len(stale)
+        
+        if stale:
+            missing = {s for s in stale if s not in self._price_fetches}
+            if missing:
+                # Refresh every stale subscribed symbol along with these
+                missing.update(
+                    s for s in self.symbols
+                    if s not in self._price_fetches and not self._fresh(s, now)
+                )
+                batch = sorted(missing)
+                task = asyncio.create_task(self._fetch_prices(batch))
+                for symbol in batch:
+                    self._price_fetches[symbol] = task
+                task.add_done_callback(lambda t, batch=batch: self._forget_price_fetch(t, batch))
+            tasks = {self._price_fetches[s] for s in stale if s in self._price_fetches}
+            await asyncio.gather(*(asyncio.shield(t) for t in tasks), return_exceptions=True)
+        
+        return {s: self._prices[s][1] if s in self._prices else 0.0 for s in symbols}
+    
+    def _fresh(self, symbol: str, now: float) -> bool:
+        cached = self._prices.get(symbol)
+        return cached is not None and now - cached[0] < self.price_ttl
+    
+    def _forget_price_fetch(self, task: asyncio.Task, batch: List[str]):
+        for symbol in batch:
+            if self._price_fetches.get(symbol) is task:
+                del self._price_fetches[symbol]
+    
+    async def _fetch_prices(self, symbols: List[str]):
+        if self.binance_client is None:
+            # Used without initialize(): open the session without counting a
+            # user; the last user's cleanup() closes it
+            await super().initialize()
+        self.stats["price_fetches"] += 1
+        prices = await super().get_prices(symbols)
+        fetched_at = time.monotonic()
+        for symbol, price in prices.items():
+            if price > 0:
+                self._prices[symbol] = (fetched_at, price)
+    
+    async def get_klines_as_dataframe(self, symbol: str, interval: str,
+                                     limit: int = 500) -> pd.DataFrame:
+        """Get klines, sharing the fetch with concurrent callers for the same series."""
+        key = (symbol.upper(), interval)
+        in_flight = self._kline_fetches.get(key)
+        if in_flight is not None and in_flight[0] >= limit:
+            self.stats["kline_shared"] += 1
+            task = in_flight[1]
+        else:
+            self.stats["kline_fetches"] += 1
+            task = asyncio.create_task(super().get_klines_as_dataframe(symbol, interval, limit))
+            self._kline_fetches[key] = (limit, task)
+            task.add_done_callback(lambda t, key=key: self._forget_kline_fetch(t, key))
+        
+        # Shielded: a cancelled bot must not cancel the fetch other bots wait on
+        df = await asyncio.shield(task)
+        return df.tail(limit).reset_index(drop=True) if len(df) > limit else df.copy()
+    
+    def _forget_kline_fetch(self, task: asyncio.Task, key: Tuple[str, str]):
+        in_flight = self._kline_fetches.get(key)
+        if in_flight is not None and in_flight[1] is task:
+            del self._kline_fetches[key]
 
 
+# Process-wide hub shared by all bot executors
+market_data_hub = MarketDataHub()
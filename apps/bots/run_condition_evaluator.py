@@ -65,6 +65,8 @@ class ConditionEvaluatorService:
     
     def __init__(self):
         self.evaluator: Optional[CentralizedConditionEvaluator] = None
+        self.notifier = None
+        self.notifier_task: Optional[asyncio.Task] = None
         self.running = False
         
     async def start(self):
@@ -81,10 +83,13 @@ class ConditionEvaluatorService:
                 return False
             
             # Initialize event bus (if Redis available)
-            from event_bus import create_event_bus
+            from event_bus import LocalEventBus, create_event_bus
             event_bus = await create_event_bus()
             
-            if event_bus:
+            if isinstance(event_bus, LocalEventBus):
+                # Nobody outside this process can receive in-process events
+                await self._start_local_notifier(event_bus)
+            elif event_bus:
                 logger.info("Event bus initialized - triggers will be published to Redis")
             else:
                 logger.warning("Event bus not available - triggers will only be logged to database")
@@ -100,10 +105,15 @@ class ConditionEvaluatorService:
             # Get evaluation interval from environment (default: 60 seconds)
             interval_seconds = int(os.getenv("EVALUATOR_INTERVAL_SECONDS", "60"))
             
+            # Evaluation mode: "interval" (fixed loop) or "bar_close" (kline stream driven)
+            mode = os.getenv("EVALUATOR_MODE", "interval").lower()
+            intrabar = os.getenv("EVALUATOR_INTRABAR", "false").lower() == "true"
+            
             # Get timeframes to evaluate (default: 1m, 5m, 15m, 1h)
             timeframes_str = os.getenv("EVALUATOR_TIMEFRAMES", "1m,5m,15m,1h")
             timeframes = [tf.strip() for tf in timeframes_str.split(",")]
             
+            logger.info(f"Evaluation mode: {mode}")
             logger.info(f"Evaluation interval: {interval_seconds} seconds")
             logger.info(f"Timeframes: {timeframes}")
             logger.info("=" * 70)
@@ -111,12 +121,20 @@ class ConditionEvaluatorService:
             # Start evaluation loop
             self.running = True
             
-            # Run evaluation loop in background
-            await self.evaluator.start_evaluation_loop(
-                symbols=None,  # Auto-discover from conditions
-                timeframes=timeframes,
-                interval_seconds=interval_seconds
-            )
+            if mode == "bar_close":
+                # Evaluate once per closed bar; interval is used to refresh active symbols
+                await self.evaluator.start_event_loop(
+                    timeframes=timeframes,
+                    intrabar=intrabar,
+                    refresh_seconds=interval_seconds
+                )
+            else:
+                # Run evaluation loop in background
+                await self.evaluator.start_evaluation_loop(
+                    symbols=None,  # Auto-discover from conditions
+                    timeframes=timeframes,
+                    interval_seconds=interval_seconds
+                )
             
             return True
             
@@ -124,6 +142,18 @@ class ConditionEvaluatorService:
             logger.error(f"Error starting evaluator service: {e}", exc_info=True)
             return False
     
+    async def _start_local_notifier(self, event_bus):
+        """Run the bot notifier in this process on the in-process event bus."""
+        from bot_notifier import BotNotifier
+        
+        self.notifier = BotNotifier(event_bus=event_bus)
+        if not await self.notifier.initialize():
+            logger.warning("In-process bot notifier failed to initialize - triggers will only be logged")
+            self.notifier = None
+            return
+        self.notifier_task = asyncio.create_task(self.notifier.start_listening())
+        logger.info("Event bus initialized in process - bot notifier running in this process")
+    
     async def stop(self):
         """Stop the evaluator service."""
         logger.info("Stopping Condition Evaluator Service...")
@@ -131,7 +161,14 @@ class ConditionEvaluatorService:
         
         if self.evaluator:
             await self.evaluator.stop()
-            
+        
+        if self.notifier:
+            # Delivers triggers already published before disconnecting the bus
+            await self.notifier.stop()
+            if self.notifier_task:
+                await asyncio.gather(self.notifier_task, return_exceptions=True)
+        
+        if self.evaluator:
             # Disconnect event bus if available
             if self.evaluator.event_bus:
                 await self.evaluator.event_bus.disconnect()
@@ -19,6 +19,8 @@ try:
 except ImportError:
     db_service = None
 
+import trigger_trace
+
 try:
     from clients.supabase_client import supabase
 except ImportError:
@@ -407,9 +409,12 @@ class TradingService:
             }
         """
         if self.paper_trading:
-            return await self._execute_buy_paper(pair, amount, price, order_type)
+            result = await self._execute_buy_paper(pair, amount, price, order_type)
         else:
-            return await self._execute_buy_live(pair, amount, price, order_type)
+            result = await self._execute_buy_live(pair, amount, price, order_type)
+        if result.get("success"):
+            trigger_trace.mark_current("order_placed")
+        return result
     
     async def _execute_buy_paper(self, pair: str, amount: float, price: float,
                                   order_type: str) -> Dict[str, Any]:
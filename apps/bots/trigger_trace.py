@@ -0,0 +1,145 @@
+"""
+Trigger latency tracing, from kline close to order placement.
+
+A small trace dict travels inside the trigger event (the "trace" key) and
+collects a timestamp per hop:
+
+    bar_close -> evaluated -> published -> received -> order_placed -> handled
+
+The hops run in different processes (condition evaluator, bot notifier), so
+the timestamps are wall clock. Monotonic clocks can't be compared across
+processes. Inside the notifier the trace is held in a context variable, so
+TradingService can stamp order placement without it being threaded through
+DCABotExecutor.
+
+Finished traces feed per-hop histograms (trigger_hop_seconds) and Redis
+sorted sets of the slowest traces per time window, which
+/debug/traces/slowest reads.
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from contextvars import ContextVar, Token
+from typing import Any, Dict, List, Optional
+
+# Add root path for 'apps' modules
+root_path = os.path.join(os.path.dirname(__file__), '..', '..')
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+try:
+    from apps.api.metrics import record_trigger_trace
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+HOPS = ("bar_close", "evaluated", "published", "received", "order_placed", "handled")
+
+SLOWEST_KEY_PREFIX = "traces:slowest"
+SLOWEST_KEEP = int(os.getenv("TRACE_SLOWEST_KEEP", "200"))
+SLOWEST_WINDOW_SECONDS = int(os.getenv("TRACE_SLOWEST_WINDOW_SECONDS", "3600"))
+
+_current: ContextVar[Optional[Dict[str, Any]]] = ContextVar("trigger_trace", default=None)
+
+
+def start(bar_close_ts: Optional[float] = None) -> Dict[str, Any]:
+    """New trace stamped as evaluated now (and closed at bar_close_ts, if known)."""
+    hops: Dict[str, float] = {}
+    if bar_close_ts:
+        hops["bar_close"] = bar_close_ts
+    hops["evaluated"] = time.time()
+    return {"trace_id": uuid.uuid4().hex[:16], "hops": hops}
+
+
+def mark(trace: Optional[Dict[str, Any]], hop: str):
+    """Stamp a hop once; later stamps of the same hop are ignored."""
+    if trace is not None:
+        trace.setdefault("hops", {}).setdefault(hop, time.time())
+
+
+def fork(trace: Optional[Dict[str, Any]], **labels) -> Optional[Dict[str, Any]]:
+    """Copy of a trace for one branch (e.g. one subscriber), with extra labels."""
+    if trace is None:
+        return None
+    return {**trace, **labels, "hops": dict(trace.get("hops", {}))}
+
+
+def activate(trace: Optional[Dict[str, Any]]) -> Token:
+    return _current.set(trace)
+
+
+def deactivate(token: Token):
+    _current.reset(token)
+
+
+def current() -> Optional[Dict[str, Any]]:
+    return _current.get()
+
+
+def mark_current(hop: str):
+    """Stamp a hop on the trace active in this context, if any."""
+    mark(_current.get(), hop)
+
+
+def hop_durations(trace: Dict[str, Any]) -> Dict[str, float]:
+    """Seconds spent reaching each hop from the previous stamped one, plus "total"."""
+    hops = trace.get("hops", {})
+    stamped = [(hop, hops[hop]) for hop in HOPS if hop in hops]
+    durations = {
+        hop: max(0.0, ts - prev_ts)
+        for (_, prev_ts), (hop, ts) in zip(stamped, stamped[1:])
+    }
+    if len(stamped) > 1:
+        durations["total"] = max(0.0, stamped[-1][1] - stamped[0][1])
+    return durations
+
+
+async def finish(trace: Optional[Dict[str, Any]], redis_client=None):
+    """Record a completed trace: per-hop metrics and, with redis_client, the slowest list."""
+    if trace is None:
+        return
+    durations = hop_durations(trace)
+    if not durations:
+        return
+    if METRICS_AVAILABLE:
+        record_trigger_trace(durations)
+    if redis_client is None:
+        return
+
+    finished_at = time.time()
+    summary = {**trace, "durations": durations, "finished_at": finished_at}
+    key = _slowest_key(finished_at)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zadd(key, {json.dumps(summary, default=str): durations.get("total", 0.0)})
+        pipe.zremrangebyrank(key, 0, -SLOWEST_KEEP - 1)  # Keep the slowest SLOWEST_KEEP
+        pipe.expire(key, 2 * SLOWEST_WINDOW_SECONDS)
+        await pipe.execute()
+    except Exception as e:
+        logger.debug(f"Failed to store trace {trace.get('trace_id')}: {e}")
+
+
+def _slowest_key(ts: float) -> str:
+    # One sorted set per window, so old slow traces age out instead of
+    # crowding out recent ones
+    return f"{SLOWEST_KEY_PREFIX}:{int(ts // SLOWEST_WINDOW_SECONDS)}"
+
+
+async def load_slowest(redis_client, limit: int = 20) -> List[Dict[str, Any]]:
+    """Slowest traces finished within the last SLOWEST_WINDOW_SECONDS, slowest first."""
+    now = time.time()
+    cutoff = now - SLOWEST_WINDOW_SECONDS
+    traces = []
+    for key in {_slowest_key(now), _slowest_key(cutoff)}:
+        for member in await redis_client.zrevrange(key, 0, SLOWEST_KEEP - 1):
+            summary = json.loads(member)
+            if summary.get("finished_at", 0) >= cutoff:
+                traces.append(summary)
+    traces.sort(key=lambda t: t["durations"].get("total", 0.0), reverse=True)
+    return traces[:limit]
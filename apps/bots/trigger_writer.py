@@ -0,0 +1,229 @@
+"""
+Trigger Writer - Write-behind persistence for condition triggers.
+
+Previously every trigger did its own ``condition_triggers`` INSERT, followed by
+a read-modify-write of ``trigger_count`` (two more round trips, and racy when
+two evaluations hit the same condition). The writer instead:
+
+- Queues trigger rows and bulk-inserts them every flush interval, or as soon
+  as a full batch is waiting.
+- Coalesces counter increments per condition and applies them atomically via
+  the ``increment_condition_trigger_counts`` RPC (migration 07). Only a
+  missing function switches to per-condition updates; other RPC errors are
+  retried on the next flush.
+- Runs the synchronous Supabase calls in a worker thread.
+- Applies backpressure: add_trigger() waits when the queue is full.
+- Flushes everything that is left on stop().
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+# Add root path for 'apps' modules
+root_path = os.path.join(os.path.dirname(__file__), '..', '..')
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+try:
+    from apps.api.metrics import record_trigger_writer_flush, update_trigger_writer_queue_depth
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+TRIGGERS_TABLE = "condition_triggers"
+REGISTRY_TABLE = "condition_registry"
+INCREMENT_RPC = "increment_condition_trigger_counts"
+
+# PostgREST "function not in schema cache" and Postgres undefined_function
+MISSING_FUNCTION_CODES = ("PGRST202", "42883")
+
+
+def _is_missing_function(error: Exception) -> bool:
+    if str(getattr(error, "code", None) or "") in MISSING_FUNCTION_CODES:
+        return True
+    message = str(error).lower()
+    return "could not find the function" in message or ("function" in message and "does not exist" in message)
+
+
+class TriggerWriter:
+    """
+    Batched writer for condition_triggers rows and condition_registry counters.
+
+    Usage:
+        writer = TriggerWriter(supabase)
+        await writer.start()
+        await writer.add_trigger(trigger_event)
+        writer.increment_trigger_count(condition_id)
+        await writer.stop()  # flushes pending rows
+    """
+
+    def __init__(
+        self,
+        supabase_client,
+        flush_interval_ms: int = 250,
+        max_batch: int = 500,
+        max_queue: int = 10000
+    ):
+        self.supabase = supabase_client
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._retry_rows: List[Dict[str, Any]] = []  # Rows from a failed insert
+        self._counters: Dict[str, List[Any]] = {}  # condition_id -> [increment, last_triggered_at]
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._rpc_available = True
+        self.running = False
+        self.stats = {"flushes": 0, "triggers_written": 0, "counters_written": 0, "failures": 0, "dropped": 0}
+
+    async def start(self):
+        """Start the background flush loop (idempotent)."""
+        if self.running:
+            return
+        self.running = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write everything still pending."""
+        self.running = False
+        self._wakeup.set()
+        if self._task:
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        await self.flush()
+        if self.pending:
+            logger.error(f"Trigger writer stopped with {self.pending} unwritten rows")
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() + len(self._retry_rows)
+
+    async def add_trigger(self, trigger_event: Dict[str, Any]):
+        """Queue a condition_triggers row; waits while the queue is full."""
+        await self._queue.put(trigger_event)
+        depth = self._queue.qsize()
+        if depth >= self.max_batch:
+            self._wakeup.set()
+        if METRICS_AVAILABLE:
+            update_trigger_writer_queue_depth(depth)
+
+    def increment_trigger_count(self, condition_id: str, triggered_at: Optional[str] = None):
+        """Coalesce a trigger_count increment for the next flush."""
+        triggered_at = triggered_at or datetime.now().isoformat()
+        counter = self._counters.get(condition_id)
+        if counter is None:
+            self._counters[condition_id] = [1, triggered_at]
+        else:
+            counter[0] += 1
+            counter[1] = max(counter[1], triggered_at)
+
+    async def _run(self):
+        while self.running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing triggers: {e}", exc_info=True)
+
+    async def flush(self):
+        """Write queued rows in batches of max_batch and apply pending counters."""
+        while True:
+            rows = self._retry_rows[:self.max_batch]
+            self._retry_rows = self._retry_rows[self.max_batch:]
+            while len(rows) < self.max_batch and not self._queue.empty():
+                rows.append(self._queue.get_nowait())
+            counters, self._counters = self._counters, {}
+            if not rows and not counters:
+                return
+
+            started = time.perf_counter()
+            failed = False
+            if rows:
+                try:
+                    await asyncio.to_thread(self._insert_rows, rows)
+                    self.stats["triggers_written"] += len(rows)
+                except Exception as e:
+                    failed = True
+                    logger.error(f"Error inserting {len(rows)} condition triggers: {e}")
+                    self._retain(rows)
+            if counters:
+                try:
+                    await asyncio.to_thread(self._apply_counters, counters)
+                    self.stats["counters_written"] += len(counters)
+                except Exception as e:
+                    failed = True
+                    logger.error(f"Error updating trigger counts for {len(counters)} conditions: {e}")
+                    self._restore_counters(counters)
+
+            self.stats["flushes"] += 1
+            if failed:
+                self.stats["failures"] += 1
+            if METRICS_AVAILABLE:
+                record_trigger_writer_flush(
+                    time.perf_counter() - started, len(rows), len(counters), failed, self.pending
+                )
+            if failed:
+                return  # Retry on the next tick instead of spinning
+
+    def _insert_rows(self, rows: List[Dict[str, Any]]):
+        self.supabase.table(TRIGGERS_TABLE).insert(rows).execute()
+
+    def _apply_counters(self, counters: Dict[str, List[Any]]):
+        updates = [
+            {"condition_id": condition_id, "increment": increment, "last_triggered_at": last_triggered_at}
+            for condition_id, (increment, last_triggered_at) in counters.items()
+        ]
+        if self._rpc_available:
+            try:
+                self.supabase.rpc(INCREMENT_RPC, {"updates": updates}).execute()
+                return
+            except Exception as e:
+                if not _is_missing_function(e):
+                    raise  # Transient; counters are restored and retried
+                logger.warning(f"{INCREMENT_RPC} unavailable, falling back to per-condition updates: {e}")
+                self._rpc_available = False
+
+        for update in updates:
+            current = self.supabase.table(REGISTRY_TABLE).select("trigger_count").eq(
+                "condition_id", update["condition_id"]
+            ).execute()
+            current_count = current.data[0]["trigger_count"] if current.data else 0
+            self.supabase.table(REGISTRY_TABLE).update({
+                "last_triggered_at": update["last_triggered_at"],
+                "trigger_count": (current_count or 0) + update["increment"],
+                "last_evaluated_at": update["last_triggered_at"]
+            }).eq("condition_id", update["condition_id"]).execute()
+
+    def _retain(self, rows: List[Dict[str, Any]]):
+        """Keep failed rows for the next flush, dropping the oldest beyond max_queue."""
+        self._retry_rows = rows + self._retry_rows
+        overflow = len(self._retry_rows) - self.max_queue
+        if overflow > 0:
+            self._retry_rows = self._retry_rows[overflow:]
+            self.stats["dropped"] += overflow
+            logger.error(f"Dropped {overflow} condition triggers after repeated write failures")
+
+    def _restore_counters(self, counters: Dict[str, List[Any]]):
+        for condition_id, (increment, last_triggered_at) in counters.items():
+            counter = self._counters.get(condition_id)
+            if counter is None:
+                self._counters[condition_id] = [increment, last_triggered_at]
+            else:
+                counter[0] += increment
+                counter[1] = max(counter[1], last_triggered_at)
@@ -7,7 +7,8 @@ Supports various operators and comparison types.
 
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, Callable, List, Optional, Sequence, Tuple, Union
+from dataclasses import dataclass, field
 import logging
 
 logger = logging.getLogger(__name__)
@@ -83,7 +84,7 @@ def _evaluate_indicator_condition(row: pd.Series, condition: Dict[str, Any], ope
         return False
     
     # Get indicator value from row
-    indicator_value = _get_indicator_value(row, indicator, component)
+    indicator_value = _get_indicator_value(row, indicator, component, condition.get("period"))
     if indicator_value is None:
         return False
     
@@ -258,8 +259,19 @@ def _evaluate_volume_condition(row: pd.Series, condition: Dict[str, Any], operat
     
     return False
 
-def _get_indicator_value(row: pd.Series, indicator: str, component: str) -> Optional[float]:
+def _get_indicator_value(row: pd.Series, indicator: str, component: str, period: Any = None) -> Optional[float]:
     """Get indicator value from row data"""
+    for col in _indicator_columns(indicator, component, period):
+        if col in row.index and pd.notna(row[col]):
+            try:
+                return float(row[col])
+            except (ValueError, TypeError):
+                continue
+    
+    return None
+
+def _indicator_columns(indicator: str, component: str, period: Any = None) -> List[str]:
+    """Candidate column names for an indicator component, in lookup order"""
     # Try different column naming conventions
     possible_columns = [
         f"{indicator}_{component}",
@@ -292,14 +304,11 @@ def _get_indicator_value(row: pd.Series, indicator: str, component: str) -> Opti
             f"{indicator}_{component.lower()}_{indicator}",
         ] + possible_columns
     
-    for col in possible_columns:
-        if col in row.index and pd.notna(row[col]):
-            try:
-                return float(row[col])
-            except (ValueError, TypeError):
-                continue
+    # Period-specific columns (e.g. RSI_14) take precedence when the condition names a period
+    if period:
+        possible_columns = [f"{indicator}_{period}", f"{indicator.upper()}_{period}"] + possible_columns
     
-    return None
+    return possible_columns
 
 def _evaluate_price_pattern_with_df(df: pd.DataFrame, row_index: int, condition: Dict[str, Any]) -> bool:
     """Evaluate price pattern conditions using dataframe (needs previous candle)"""
@@ -433,6 +442,303 @@ def _apply_operator(left: float, right: Union[float, Dict[str, float]], operator
         return False
 
 
+# ---------------------------------------------------------------------------
+# Compiled condition plans and batch evaluation
+#
+# evaluate_condition() walks one condition at a time, rebuilding candidate
+# column names and re-reading the condition dict on every call. When hundreds
+# of conditions share one DataFrame (same symbol/timeframe) that work is
+# repeated per condition and per tick. compile_condition() does it once and
+# produces an immutable ConditionPlan; evaluate_conditions_batch() reads each
+# referenced column a single time and evaluates all plans with NumPy. Which
+# candidate columns a frame actually has is worked out once per frame layout
+# and kept in a module-level cache, so plans themselves stay immutable.
+# ---------------------------------------------------------------------------
+
+# A column reference: (candidate columns in lookup order, bar offset from row_index)
+ColumnRef = Tuple[Tuple[str, ...], int]
+
+# Frame column layout -> {ref: ref narrowed to the columns that layout has}
+_MAX_SCHEMAS = 1024
+_schema_refs: Dict[Tuple[str, ...], Dict[ColumnRef, ColumnRef]] = {}
+
+
+def _schema_refs_for(columns: pd.Index) -> Dict[ColumnRef, ColumnRef]:
+    key = tuple(columns)
+    refs = _schema_refs.get(key)
+    if refs is None:
+        if len(_schema_refs) >= _MAX_SCHEMAS:
+            _schema_refs.clear()
+        refs = _schema_refs[key] = {}
+    return refs
+
+def _op_gt(lhs, rhs, lower, upper):
+    return lhs > rhs
+
+def _op_lt(lhs, rhs, lower, upper):
+    return lhs < rhs
+
+def _op_ge(lhs, rhs, lower, upper):
+    return lhs >= rhs
+
+def _op_le(lhs, rhs, lower, upper):
+    return lhs <= rhs
+
+def _op_equals(lhs, rhs, lower, upper):
+    return np.abs(lhs - rhs) < 1e-10  # Float comparison with tolerance
+
+def _op_between(lhs, rhs, lower, upper):
+    return (lower <= lhs) & (lhs <= upper)
+
+_OPERATOR_FUNCTIONS: Dict[str, Callable[..., np.ndarray]] = {
+    ">": _op_gt,
+    "<": _op_lt,
+    ">=": _op_ge,
+    "<=": _op_le,
+    "equals": _op_equals,
+    "between": _op_between,
+    "crosses_above": _op_gt,
+    "closes_above": _op_gt,
+    "crosses_below": _op_lt,
+    "closes_below": _op_lt,
+}
+
+_ABOVE_OPERATORS = ("closes_above", "crosses_above", ">", ">=")
+_BELOW_OPERATORS = ("closes_below", "crosses_below", "<", "<=")
+
+
+@dataclass(frozen=True)
+class ConditionPlan:
+    """
+    Immutable, pre-resolved form of a condition.
+    
+    compare is None when the condition can never be true (unknown operator,
+    missing threshold, ...). scalar_condition is set for conditions that only
+    the row-based evaluator supports (price patterns).
+    """
+    compare: Optional[Callable[..., np.ndarray]]
+    lhs: Optional[ColumnRef] = None
+    rhs: Optional[ColumnRef] = None
+    rhs_value: float = np.nan
+    rhs_scale: float = 1.0
+    lower: float = np.nan
+    upper: float = np.nan
+    # (column, source column, window) rolling means the frame must provide
+    rolling_columns: Tuple[Tuple[str, str, int], ...] = ()
+    scalar_condition: Optional[Dict[str, Any]] = field(default=None, compare=False)
+
+
+_NEVER = ConditionPlan(compare=None)
+
+def _number(value: Any) -> float:
+    """Numeric threshold from a condition dict (non-numbers never compare true)"""
+    if isinstance(value, (int, float, np.number)):
+        return float(value)
+    return np.nan
+
+
+def _to_float(value: Any) -> float:
+    """Convert a cell value to float, returning NaN when not numeric"""
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+def _indicator_ref(indicator: Optional[str], component: Optional[str], period: Any = None) -> Optional[ColumnRef]:
+    if not indicator or not component:
+        return None
+    return tuple(dict.fromkeys(_indicator_columns(indicator, component, period))), 0
+
+
+def _compile_value_thresholds(condition: Dict[str, Any], operator: str) -> Optional[Tuple[float, float, float]]:
+    """Resolve (rhs_value, lower, upper) for compareWith == 'value'"""
+    compare_value = condition.get("compareValue")
+    if operator == "between":
+        lower_bound = condition.get("lowerBound")
+        upper_bound = condition.get("upperBound")
+        if lower_bound is not None and upper_bound is not None:
+            return np.nan, _number(lower_bound), _number(upper_bound)
+        if isinstance(compare_value, dict):
+            return np.nan, _number(compare_value.get("lower")), _number(compare_value.get("upper"))
+        return None
+    if compare_value is None:
+        return None
+    return _number(compare_value), np.nan, np.nan
+
+
+def compile_condition(condition: Dict[str, Any]) -> ConditionPlan:
+    """
+    Compile a condition dict (evaluate_condition format) into a ConditionPlan.
+    
+    Evaluating the plan gives the same result as evaluate_condition().
+    """
+    condition_type = condition.get("type", "indicator")
+    compare_with = condition.get("compareWith", "value")
+    operator = condition.get("operator", ">")
+    compare = _OPERATOR_FUNCTIONS.get(operator)
+    if compare is None:
+        return _NEVER
+
+    if condition_type == "indicator":
+        lhs = _indicator_ref(
+            condition.get("indicator"),
+            condition.get("component", condition.get("indicator")),
+            condition.get("period")
+        )
+    elif condition_type == "price":
+        if condition.get("patternType"):
+            return ConditionPlan(compare=None, scalar_condition=condition)
+        lhs = ((condition.get("priceField", "close"),), 0)
+    elif condition_type == "volume":
+        lhs = (("volume",), 0)
+    else:
+        return _NEVER
+
+    if lhs is None:
+        return _NEVER
+
+    if compare_with == "value":
+        thresholds = _compile_value_thresholds(condition, operator)
+        if thresholds is None:
+            return _NEVER
+        rhs_value, lower, upper = thresholds
+        return ConditionPlan(compare=compare, lhs=lhs, rhs_value=rhs_value, lower=lower, upper=upper)
+
+    if operator == "between":
+        # 'between' needs a bounds dict; column comparisons never satisfy it
+        return _NEVER
+
+    if compare_with == "indicator_component":
+        rhs_spec = condition.get("rhs")
+        if not rhs_spec:
+            return _NEVER
+        rhs_indicator = rhs_spec.get("indicator")
+        rhs_component = rhs_spec.get("component", rhs_indicator)
+
+        rolling_columns = ()
+        if condition_type == "volume" and rhs_indicator == "VOLUME_MA":
+            period = rhs_spec.get("settings", {}).get("length", 20)
+            volume_ma_col = f"VOLUME_MA_{period}"
+            rolling_columns = ((volume_ma_col, "volume", period),)
+            rhs = ((volume_ma_col,), 0)
+        else:
+            rhs = _indicator_ref(rhs_indicator, rhs_component)
+        if rhs is None:
+            return _NEVER
+
+        scale = 1.0
+        percentage = condition.get("percentage")
+        if percentage is not None and percentage != 0:
+            if condition_type == "volume":
+                scale = 1 + percentage / 100
+            elif condition_type == "price":
+                if operator in _ABOVE_OPERATORS:
+                    scale = 1 + percentage / 100
+                elif operator in _BELOW_OPERATORS:
+                    scale = 1 - percentage / 100
+        return ConditionPlan(compare=compare, lhs=lhs, rhs=rhs, rhs_scale=scale, rolling_columns=rolling_columns)
+
+    if compare_with == "price" and condition_type == "indicator":
+        rhs = ((condition.get("priceField", "close"),), 0)
+    elif compare_with == "price_field" and condition_type == "price":
+        rhs = ((condition.get("rhsPriceField", "low"),), 0)
+    elif compare_with == "previous_volume" and condition_type == "volume":
+        rhs = (("volume",), -1)
+    else:
+        return _NEVER
+
+    return ConditionPlan(compare=compare, lhs=lhs, rhs=rhs)
+
+
+def evaluate_conditions_batch(
+    df: pd.DataFrame,
+    conditions: Sequence[Union[Dict[str, Any], ConditionPlan]],
+    row_index: Optional[int] = None
+) -> np.ndarray:
+    """
+    Evaluate many conditions against the same DataFrame in a single pass.
+    
+    Semantics match evaluate_condition() for each condition. Each referenced
+    column is read from the DataFrame once for the whole batch, and
+    comparisons run as one NumPy operation per operator.
+    
+    Args:
+        df: DataFrame with OHLCV data and indicator columns
+        conditions: Condition dicts (same format as evaluate_condition) or
+            precompiled ConditionPlans
+        row_index: Row to evaluate (default: latest)
+    
+    Returns:
+        np.ndarray: Boolean array, one entry per condition
+    """
+    n = len(conditions)
+    result = np.zeros(n, dtype=bool)
+    if n == 0 or df is None or len(df) == 0:
+        return result
+    if row_index is None:
+        row_index = len(df) - 1
+    if row_index >= len(df) or row_index < 0:
+        return result
+
+    plans = [c if isinstance(c, ConditionPlan) else compile_condition(c) for c in conditions]
+
+    lhs = np.full(n, np.nan)
+    rhs = np.full(n, np.nan)
+    lower = np.full(n, np.nan)
+    upper = np.full(n, np.nan)
+    groups: Dict[Callable[..., np.ndarray], List[int]] = {}
+    scalar: List[int] = []
+
+    columns = df.columns
+    for plan in plans:
+        for col, source, window in plan.rolling_columns:
+            if col not in columns and source in columns:
+                df[col] = df[source].rolling(window=window).mean()
+                columns = df.columns
+    schema_refs = _schema_refs_for(columns)
+    ref_values: Dict[ColumnRef, float] = {}
+
+    def resolve(ref: ColumnRef) -> float:
+        value = ref_values.get(ref)
+        if value is None:
+            narrowed = schema_refs.get(ref)
+            if narrowed is None:
+                # Candidates this frame layout has, in lookup order
+                narrowed = schema_refs[ref] = (tuple(col for col in ref[0] if col in columns), ref[1])
+            present, offset = narrowed
+            value = np.nan
+            idx = row_index + offset
+            if idx >= 0:
+                for col in present:
+                    value = _to_float(df[col].iat[idx])
+                    if not np.isnan(value):
+                        break
+            ref_values[ref] = value
+        return value
+
+    for i, plan in enumerate(plans):
+        if plan.compare is None:
+            if plan.scalar_condition is not None:
+                scalar.append(i)
+            continue
+        lhs[i] = resolve(plan.lhs)
+        rhs[i] = plan.rhs_value if plan.rhs is None else resolve(plan.rhs) * plan.rhs_scale
+        lower[i] = plan.lower
+        upper[i] = plan.upper
+        groups.setdefault(plan.compare, []).append(i)
+
+    # NaN operands compare False, matching the scalar path's "missing value" behaviour
+    with np.errstate(invalid="ignore"):
+        for compare, indices in groups.items():
+            idx = np.asarray(indices)
+            result[idx] = compare(lhs[idx], rhs[idx], lower[idx], upper[idx])
+
+    for i in scalar:
+        result[i] = evaluate_condition(df, row_index, plans[i].scalar_condition)
+
+    return result
+
 def evaluate_playbook(
     df: pd.DataFrame,
     playbook: Dict[str, Any],
@@ -0,0 +1,113 @@
+"""Shared fixtures: the bots import path, an event loop runner and a fake Supabase client."""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# apps/bots modules import each other by plain name
+bots_path = os.path.join(os.path.dirname(__file__), '..', '..', 'apps', 'bots')
+if bots_path not in sys.path:
+    sys.path.insert(0, bots_path)
+
+
+class FakeError(Exception):
+    """Stand-in for postgrest's APIError, which carries the SQLSTATE as .code."""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.op = None
+        self.rows = None
+        self.filters = []
+
+    def insert(self, rows):
+        self.op, self.rows = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict=None):
+        self.op, self.rows = "upsert", rows
+        return self
+
+    def update(self, data):
+        self.op, self.rows = "update", data
+        return self
+
+    def select(self, columns):
+        self.op = "select"
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def execute(self):
+        self.client.requests.append((self.table, self.op, self.rows, self.filters))
+        if self.client.down:
+            raise FakeError("connection refused")
+        if self.table in self.client.missing_tables:
+            raise FakeError(f'relation "{self.table}" does not exist', code="42P01")
+        rows = self.rows if isinstance(self.rows, list) else [self.rows] if self.rows else []
+        for row in rows:
+            if row.get("bad"):
+                raise FakeError("violates foreign key constraint", code="23503")
+        self.client.written.append((self.table, self.op, rows, self.filters))
+        return SimpleNamespace(data=rows)
+
+
+class FakeRpc:
+    def __init__(self, client, name, params):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        self.client.rpc_calls.append((self.name, self.params))
+        if self.client.rpc_errors:
+            raise self.client.rpc_errors.pop(0)
+        return SimpleNamespace(data=None)
+
+
+class FakeSupabase:
+    """Records every request; `written` holds only the ones that succeeded."""
+
+    def __init__(self):
+        self.requests = []
+        self.written = []
+        self.rpc_calls = []
+        self.rpc_errors = []
+        self.missing_tables = set()
+        self.down = False
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        return FakeRpc(self, name, params)
+
+    def inserted(self, table):
+        """Rows successfully inserted into table, in write order."""
+        return [row for t, op, rows, _ in self.written if t == table and op == "insert" for row in rows]
+
+
+@pytest.fixture
+def supabase():
+    return FakeSupabase()
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine to completion on a fresh event loop."""
+    return asyncio.run
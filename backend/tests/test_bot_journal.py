@@ -0,0 +1,175 @@
+"""Tests for the bot write-behind journal."""
+
+import json
+
+from bot_journal import BotJournal
+
+
+class TestBotJournal:
+
+    def test_append_without_event_loop_is_refused(self, supabase):
+        """Callers outside an event loop must write inline."""
+        journal = BotJournal(supabase, wal_path="")
+        assert journal.append("order_logs", "insert", {"i": 1}) is False
+
+    def test_inserts_keep_order(self, supabase, run):
+        async def scenario():
+            journal = BotJournal(supabase, flush_interval_ms=10, max_batch=7, wal_path="")
+            for i in range(20):
+                assert journal.append("order_logs", "insert", {"bot_id": "b1", "i": i})
+            await journal.stop()
+            assert journal.append("order_logs", "insert", {"i": 99}) is False
+            return journal
+
+        journal = run(scenario())
+        assert [row["i"] for row in supabase.inserted("order_logs")] == list(range(20))
+        assert journal.stats["written"] == 20
+
+    def test_bulk_rows_share_columns(self, supabase, run):
+        """Rows with different columns never share a request (PostgREST would write NULLs)."""
+
+        async def scenario():
+            journal = BotJournal(supabase, wal_path="")
+            journal.append("order_logs", "insert", {"i": 0, "fees": 1.0})
+            journal.append("order_logs", "insert", {"i": 1})
+            journal.append("order_logs", "insert", {"i": 2})
+            journal.append("order_logs", "insert", {"i": 3, "fees": 1.0})
+            await journal.stop()
+
+        run(scenario())
+        for _, _, rows, _ in supabase.written:
+            assert len({tuple(sorted(row)) for row in rows}) == 1
+        assert [row["i"] for row in supabase.inserted("order_logs")] == [0, 1, 2, 3]
+
+    def test_upserts_coalesce_like_sequential_writes(self, supabase, run):
+        async def scenario():
+            journal = BotJournal(supabase, wal_path="")
+            journal.append("positions", "upsert", {"user_id": "u", "symbol": "BTC", "qty": 1, "current_price": 100})
+            journal.append("positions", "upsert", {"user_id": "u", "symbol": "BTC", "qty": 2})
+            journal.append("positions", "upsert", {"user_id": "u", "symbol": "ETH", "qty": 1})
+            journal.append("positions", "delete", {"user_id": "u", "symbol": "ETH"})
+            await journal.stop()
+            return journal
+
+        journal = run(scenario())
+        upserts = [row for t, op, rows, _ in supabase.written if op == "upsert" for row in rows]
+        deletes = [filters for t, op, _, filters in supabase.written if op == "delete"]
+        # Later values win; columns the later call left out keep their earlier value
+        assert upserts == [{"user_id": "u", "symbol": "BTC", "qty": 2, "current_price": 100}]
+        assert deletes == [[("user_id", "u"), ("symbol", "ETH")]]
+        assert journal.stats["coalesced"] == 2
+
+    def test_delete_then_upsert_runs_both_in_order(self, supabase, run):
+        async def scenario():
+            journal = BotJournal(supabase, wal_path="")
+            journal.append("positions", "delete", {"user_id": "u", "symbol": "BTC"})
+            journal.append("positions", "upsert", {"user_id": "u", "symbol": "BTC", "qty": 3})
+            await journal.stop()
+
+        run(scenario())
+        assert [op for _, op, _, _ in supabase.written] == ["delete", "upsert"]
+
+    def test_bad_row_does_not_block_others(self, supabase, run):
+        """A failing bulk insert is retried row by row; only the bad row stays behind."""
+
+        async def scenario():
+            journal = BotJournal(supabase, flush_interval_ms=10, max_attempts=3, wal_path="")
+            journal.append("order_logs", "insert", {"i": 0, "bad": False})
+            journal.append("order_logs", "insert", {"i": 1, "bad": True})
+            journal.append("order_logs", "insert", {"i": 2, "bad": False})
+            await journal.flush()
+            assert journal.pending == 1
+            assert [row["i"] for row in supabase.inserted("order_logs")] == [0, 2]
+            # Backing off: the bad row is not retried on the next tick
+            assert journal._retry_at > 0
+            await journal.flush()
+            await journal.flush()
+            return journal
+
+        journal = run(scenario())
+        assert journal.pending == 0
+        assert journal.stats["dead_lettered"] == 1
+
+    def test_dead_letter_file(self, tmp_path, supabase, run):
+        path = tmp_path / "dead.jsonl"
+
+        async def scenario():
+            journal = BotJournal(supabase, max_attempts=1, wal_path="", dead_letter_path=str(path))
+            journal.append("order_logs", "insert", {"i": 1, "bad": True})
+            await journal.stop()
+
+        run(scenario())
+        [entry] = [json.loads(line) for line in path.read_text().splitlines()]
+        assert entry["table"] == "order_logs"
+        assert entry["data"] == {"i": 1, "bad": True}
+        assert entry["attempts"] == 1
+
+    def test_outage_retries_without_giving_up(self, supabase, run):
+        """Connection errors never count toward max_attempts."""
+        supabase.down = True
+
+        async def scenario():
+            journal = BotJournal(supabase, max_attempts=1, wal_path="")
+            journal.append("order_logs", "insert", {"i": 0})
+            journal.append("order_logs", "insert", {"i": 1})
+            for _ in range(3):
+                await journal.flush()
+            assert journal.pending == 2
+            supabase.down = False
+            await journal.stop()
+            return journal
+
+        journal = run(scenario())
+        assert journal.stats["dead_lettered"] == 0
+        assert [row["i"] for row in supabase.inserted("order_logs")] == [0, 1]
+
+    def test_live_events_fall_back_to_legacy_table(self, supabase, run):
+        supabase.missing_tables.add("bot_events_live")
+
+        async def scenario():
+            journal = BotJournal(supabase, wal_path="")
+            journal.append("bot_events_live", "insert", {"event_type": "bot_started"})
+            await journal.stop()
+
+        run(scenario())
+        assert supabase.inserted("bot_events") == [{"event_type": "bot_started"}]
+
+    def test_wal_replay_after_crash(self, tmp_path, supabase, run):
+        wal = tmp_path / "journal.wal"
+        supabase.down = True
+
+        async def crash():
+            journal = BotJournal(supabase, wal_path=str(wal))
+            journal.append("order_logs", "insert", {"i": 0})
+            journal.append("funds", "upsert", {"user_id": "u", "exchange": "binance", "currency": "USDT", "free": 5})
+            await journal.flush()  # Fails; records stay in the WAL
+            journal._task.cancel()  # Process dies without stop()
+
+        run(crash())
+        assert len(wal.read_text().splitlines()) == 2
+
+        supabase.down = False
+
+        async def restart():
+            journal = BotJournal(supabase, wal_path=str(wal))
+            await journal.start()
+            await journal.stop()
+
+        run(restart())
+        assert supabase.inserted("order_logs") == [{"i": 0}]
+        assert [rows for t, op, rows, _ in supabase.written if t == "funds"] == [
+            [{"user_id": "u", "exchange": "binance", "currency": "USDT", "free": 5}]
+        ]
+        assert wal.read_text() == ""
+
+    def test_queue_bound_drops_oldest(self, supabase, run):
+        async def scenario():
+            journal = BotJournal(supabase, max_queue=3, wal_path="")
+            for i in range(5):
+                journal.append("order_logs", "insert", {"i": i})
+            await journal.stop()
+            return journal
+
+        journal = run(scenario())
+        assert journal.stats["dropped"] == 2
+        assert [row["i"] for row in supabase.inserted("order_logs")] == [2, 3, 4]
@@ -0,0 +1,148 @@
+"""Tests for the shared bot scheduler."""
+
+import asyncio
+import time
+
+from bot_scheduler import BotScheduler, _ScheduledBot
+
+INTERVAL = 0.1
+TOLERANCE = 0.04
+
+
+def offset_from_slot(entry, t):
+    """Distance of t from the nearest phase-aligned slot of entry."""
+    offset = (t - entry.phase) % entry.interval
+    return min(offset, entry.interval - offset)
+
+
+class TestNextSlot:
+
+    def test_slot_is_aligned_and_strictly_after(self):
+        entry = _ScheduledBot("b1", 60.0, ["BTCUSDT"])
+        for after in (0.0, entry.phase, entry.phase + 59.9, 1234.5):
+            slot = entry.next_slot(after)
+            assert after < slot <= after + 60.0
+            assert abs(offset_from_slot(entry, slot)) < 1e-6
+
+    def test_same_pair_shares_phase(self):
+        a = _ScheduledBot("a", 60.0, ["BTCUSDT"])
+        b = _ScheduledBot("b", 60.0, ["BTCUSDT", "ETHUSDT"])
+        c = _ScheduledBot("c", 60.0, ["ETHUSDT"])
+        assert a.phase == b.phase
+        assert a.phase != c.phase
+
+
+class TestBotScheduler:
+
+    def test_runs_at_fixed_rate_without_drift(self, run):
+        """Iteration cost does not push later runs back: starts stay on the aligned slots."""
+        starts = []
+
+        async def iteration(bot_id):
+            starts.append(time.monotonic())
+            await asyncio.sleep(INTERVAL * 0.4)
+
+        async def scenario():
+            scheduler = BotScheduler(iteration)
+            scheduler.add("b1", INTERVAL, ["BTCUSDT"])
+            entry = scheduler.bots["b1"]
+            await asyncio.sleep(INTERVAL * 8)
+            await scheduler.stop()
+            return entry
+
+        entry = run(scenario())
+        assert len(starts) >= 5
+        for t in starts[1:]:
+            assert offset_from_slot(entry, t) < TOLERANCE
+        gaps = [b - a for a, b in zip(starts[1:], starts[2:])]
+        assert all(abs(gap - INTERVAL) < TOLERANCE for gap in gaps)
+
+    def test_first_slot_is_at_least_half_an_interval_after_first_run(self, run):
+        starts = []
+
+        async def iteration(bot_id):
+            starts.append(time.monotonic())
+
+        async def scenario():
+            scheduler = BotScheduler(iteration)
+            scheduler.add("b1", 10.0, ["BTCUSDT"])
+            await asyncio.sleep(0.05)
+            until_due = scheduler.seconds_until_due("b1")
+            await scheduler.stop()
+            return until_due
+
+        until_due = run(scenario())
+        assert len(starts) == 1
+        assert 5.0 - 0.1 <= until_due <= 15.0
+
+    def test_overrunning_iteration_skips_slots(self, run):
+        running = 0
+        max_running = 0
+
+        async def iteration(bot_id):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            try:
+                await asyncio.sleep(INTERVAL * 2.5)
+            finally:
+                running -= 1
+
+        async def scenario():
+            scheduler = BotScheduler(iteration)
+            scheduler.add("b1", INTERVAL, ["BTCUSDT"])
+            await asyncio.sleep(INTERVAL * 8)
+            stats = dict(scheduler.stats)
+            await scheduler.stop()
+            return stats
+
+        stats = run(scenario())
+        assert max_running == 1
+        assert stats["skipped"] >= 2
+        assert stats["iterations"] >= 2
+
+    def test_removed_bot_stops_running(self, run):
+        calls = []
+
+        async def iteration(bot_id):
+            calls.append(bot_id)
+
+        async def scenario():
+            scheduler = BotScheduler(iteration)
+            scheduler.add("b1", INTERVAL, ["BTCUSDT"])
+            await asyncio.sleep(INTERVAL * 0.2)
+            await scheduler.remove("b1")
+            await asyncio.sleep(INTERVAL * 3)
+            await scheduler.stop()
+            return scheduler
+
+        scheduler = run(scenario())
+        assert calls == ["b1"]
+        assert scheduler.seconds_until_due("b1") is None
+
+    def test_batch_prefetches_prices_once(self, run):
+        fetched = []
+
+        class MarketData:
+            async def get_prices(self, symbols):
+                fetched.append(symbols)
+
+        async def iteration(bot_id):
+            pass
+
+        async def scenario():
+            scheduler = BotScheduler(iteration, market_data=MarketData())
+            scheduler.bots["b1"] = _ScheduledBot("b1", INTERVAL, ["BTCUSDT"])
+            scheduler.bots["b2"] = _ScheduledBot("b2", INTERVAL, ["ETHUSDT", "BTCUSDT"])
+            now = time.monotonic()
+            for entry in scheduler.bots.values():
+                entry.due = now
+                scheduler._push(entry)
+            scheduler._ensure_running()
+            await asyncio.sleep(INTERVAL * 0.2)
+            await scheduler.stop()
+            return scheduler
+
+        scheduler = run(scenario())
+        assert fetched == [["BTCUSDT", "ETHUSDT"]]
+        assert scheduler.stats["batches"] == 1
@@ -0,0 +1,140 @@
+"""Tests for the condition evaluator."""
+
+import dataclasses
+
+import pytest
+import numpy as np
+import pandas as pd
+
+from backend import evaluator
+from backend.evaluator import (
+    ConditionPlan,
+    compile_condition,
+    evaluate_condition,
+    evaluate_conditions_batch,
+)
+
+
+class TestEvaluateConditionsBatch:
+    """Batch evaluation must agree with evaluate_condition()."""
+    
+    @pytest.fixture
+    def sample_df(self):
+        """OHLCV frame with a few indicator columns."""
+        rng = np.random.default_rng(42)
+        n = 50
+        df = pd.DataFrame({
+            "time": pd.date_range("2024-01-01", periods=n, freq="1min"),
+            "open": rng.uniform(90, 110, n),
+            "high": rng.uniform(100, 120, n),
+            "low": rng.uniform(80, 100, n),
+            "close": rng.uniform(90, 110, n),
+            "volume": rng.uniform(1000, 2000, n),
+        })
+        df["RSI"] = rng.uniform(0, 100, n)
+        df["EMA"] = rng.uniform(90, 110, n)
+        df["MACD_macd_line"] = rng.normal(size=n)
+        df["MACD_signal_line"] = rng.normal(size=n)
+        return df
+    
+    @pytest.fixture
+    def conditions(self):
+        """A mix of indicator, price and volume conditions."""
+        return [
+            {"type": "indicator", "indicator": "RSI", "component": "RSI", "operator": "<", "compareWith": "value", "compareValue": 50},
+            {"type": "indicator", "indicator": "RSI", "component": "RSI", "operator": "between", "compareWith": "value", "lowerBound": 20, "upperBound": 80},
+            {"type": "indicator", "indicator": "MACD", "component": "macd_line", "operator": "crosses_above", "compareWith": "indicator_component", "rhs": {"indicator": "MACD", "component": "signal_line"}},
+            {"type": "indicator", "indicator": "EMA", "component": "EMA", "operator": ">", "compareWith": "price", "priceField": "close"},
+            {"type": "price", "priceField": "close", "operator": "closes_above", "compareWith": "indicator_component", "rhs": {"indicator": "EMA"}, "percentage": 2},
+            {"type": "price", "priceField": "close", "operator": ">", "compareWith": "price_field", "rhsPriceField": "open"},
+            {"type": "price", "priceField": "close", "operator": "between", "compareWith": "value", "lowerBound": 95, "upperBound": 105},
+            {"type": "volume", "operator": ">", "compareWith": "previous_volume"},
+            {"type": "volume", "operator": ">", "compareWith": "value", "compareValue": 1500},
+            {"type": "indicator", "indicator": "MISSING", "component": "MISSING", "operator": ">", "compareWith": "value", "compareValue": 0},
+            {"type": "indicator", "indicator": "RSI", "component": "RSI", "operator": "unknown", "compareWith": "value", "compareValue": 0},
+        ]
+    
+    @pytest.mark.parametrize("row_index", [0, 1, 25, 49])
+    def test_matches_scalar_evaluation(self, sample_df, conditions, row_index):
+        """Each batch result equals the per-condition result."""
+        expected = [evaluate_condition(sample_df, row_index, c) for c in conditions]
+        result = evaluate_conditions_batch(sample_df, conditions, row_index)
+        
+        assert isinstance(result, np.ndarray)
+        assert result.dtype == bool
+        assert result.tolist() == expected
+    
+    def test_defaults_to_latest_row(self, sample_df, conditions):
+        """Without row_index the latest bar is evaluated."""
+        expected = evaluate_conditions_batch(sample_df, conditions, len(sample_df) - 1)
+        assert evaluate_conditions_batch(sample_df, conditions).tolist() == expected.tolist()
+    
+    def test_nan_indicator_is_false(self, sample_df):
+        """Missing indicator values never satisfy a condition."""
+        sample_df.loc[len(sample_df) - 1, "RSI"] = np.nan
+        condition = {"type": "indicator", "indicator": "RSI", "component": "RSI", "operator": "<", "compareWith": "value", "compareValue": 1000}
+        assert not evaluate_conditions_batch(sample_df, [condition])[0]
+    
+    def test_empty_inputs(self, sample_df):
+        """Empty frames and empty condition lists return empty/False results."""
+        assert len(evaluate_conditions_batch(sample_df, [])) == 0
+        condition = {"type": "price", "operator": ">", "compareWith": "value", "compareValue": 0}
+        assert evaluate_conditions_batch(pd.DataFrame(), [condition]).tolist() == [False]
+        assert evaluate_conditions_batch(sample_df, [condition], row_index=len(sample_df)).tolist() == [False]
+    
+    def test_accepts_compiled_plans(self, sample_df, conditions):
+        """Precompiled plans evaluate the same as raw condition dicts."""
+        plans = [compile_condition(c) for c in conditions]
+        assert all(isinstance(p, ConditionPlan) for p in plans)
+        assert evaluate_conditions_batch(sample_df, plans).tolist() == evaluate_conditions_batch(sample_df, conditions).tolist()
+
+
+class TestCompileCondition:
+    """Test cases for compile_condition()."""
+    
+    def test_plan_is_immutable(self):
+        """Plans cannot be modified after compilation."""
+        plan = compile_condition({"type": "indicator", "indicator": "RSI", "component": "RSI", "operator": "<", "compareValue": 30})
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            plan.rhs_value = 50
+    
+    def test_resolves_thresholds_and_columns(self):
+        """Thresholds and candidate columns are resolved at compile time."""
+        plan = compile_condition({"type": "indicator", "indicator": "RSI", "component": "RSI", "operator": "<", "compareValue": 30})
+        assert plan.rhs_value == 30.0
+        assert plan.lhs[0][0] == "RSI_RSI"
+        assert "RSI" in plan.lhs[0]
+    
+    def test_unknown_operator_never_true(self):
+        """Unsupported operators compile to a plan without a comparison."""
+        plan = compile_condition({"type": "indicator", "indicator": "RSI", "operator": "??", "compareValue": 30})
+        assert plan.compare is None
+    
+    def test_volume_ma_column_added(self):
+        """Volume MA conditions add their rolling column to the frame once."""
+        df = pd.DataFrame({"volume": np.arange(1, 31, dtype=float)})
+        condition = {"type": "volume", "operator": ">", "compareWith": "indicator_component", "rhs": {"indicator": "VOLUME_MA", "settings": {"length": 5}}}
+        result = evaluate_conditions_batch(df, [compile_condition(condition)])
+        assert "VOLUME_MA_5" in df.columns
+        assert result.tolist() == [True]
+    
+    def test_columns_resolved_once_per_frame_layout(self):
+        """Candidate columns are narrowed once per frame layout, outside the plan."""
+        plan = compile_condition({"type": "indicator", "indicator": "RSI", "component": "RSI", "operator": "<", "compareValue": 30})
+        df = pd.DataFrame({"close": [1.0, 2.0], "RSI": [50.0, 20.0]})
+        assert evaluate_conditions_batch(df, [plan]).tolist() == [True]
+        refs = evaluator._schema_refs[tuple(df.columns)]
+        assert refs[plan.lhs] == (("RSI",), 0)
+        
+        df["RSI"] = [50.0, 60.0]  # Same layout, new values
+        assert evaluate_conditions_batch(df, [plan]).tolist() == [False]
+        assert evaluator._schema_refs[tuple(df.columns)] is refs
+        
+        other = pd.DataFrame({"close": [1.0, 2.0], "RSI_RSI": [50.0, 10.0], "RSI": [50.0, 90.0]})
+        assert evaluate_conditions_batch(other, [plan]).tolist() == [True]
+        assert evaluator._schema_refs[tuple(other.columns)][plan.lhs] == (("RSI_RSI", "RSI"), 0)
+    
+    def test_nan_in_first_candidate_falls_through(self):
+        plan = compile_condition({"type": "indicator", "indicator": "RSI", "component": "RSI", "operator": "<", "compareValue": 30})
+        df = pd.DataFrame({"RSI_RSI": [np.nan], "RSI": [20.0]})
+        assert evaluate_conditions_batch(df, [plan]).tolist() == [True]
@@ -0,0 +1,229 @@
+"""Tests for the Redis Streams and in-process event bus transports."""
+
+import asyncio
+import json
+
+from event_bus import LocalEventBus, StreamEventBus
+
+
+class FakeStreamRedis:
+    """The consumer-group calls StreamEventBus makes, with a scripted XAUTOCLAIM."""
+
+    def __init__(self):
+        self.acked = []
+        self.claim_pages = []
+
+    async def xgroup_create(self, stream, group, id="$", mkstream=False):
+        return True
+
+    async def xack(self, stream, group, *ids):
+        self.acked.extend(ids)
+        return len(ids)
+
+    async def xautoclaim(self, stream, group, consumer, min_idle_time, start_id="0-0", count=None):
+        if not self.claim_pages:
+            return ["0-0", [], []]
+        return self.claim_pages.pop(0)
+
+
+def entry(entry_id, channel, event):
+    return (entry_id, {"channel": channel, "data": json.dumps(event)})
+
+
+async def stream_bus(max_deliveries=3):
+    bus = StreamEventBus(max_deliveries=max_deliveries)
+    bus.redis_client = FakeStreamRedis()
+    bus.connected = True
+    return bus
+
+
+class TestStreamEventBus:
+
+    def test_handled_entries_are_acked(self, run):
+        async def scenario():
+            bus = await stream_bus()
+            received = []
+
+            async def callback(event):
+                received.append(event["n"])
+
+            await bus.subscribe("condition.a", callback)
+            await bus._process("events:condition", [entry("1-0", "condition.a", {"n": 1}),
+                                                    entry("2-0", "condition.a", {"n": 2})])
+            return bus, received
+
+        bus, received = run(scenario())
+        assert received == [1, 2]
+        assert bus.redis_client.acked == ["1-0", "2-0"]
+        assert bus.stats["delivered"] == 2
+
+    def test_failed_callback_leaves_entry_pending_until_reclaimed(self, run):
+        async def scenario():
+            bus = await stream_bus()
+            calls = []
+
+            async def callback(event):
+                calls.append(event["n"])
+                if len(calls) == 1:
+                    raise RuntimeError("executor down")
+
+            await bus.psubscribe("condition.*", callback)
+            failing = entry("1-0", "condition.a", {"n": 1})
+            await bus._process("events:condition", [failing])
+            assert bus.redis_client.acked == []
+
+            # Another pass through XAUTOCLAIM delivers it again
+            bus.redis_client.claim_pages = [["0-0", [failing], []]]
+            await bus._reclaim()
+            return bus, calls
+
+        bus, calls = run(scenario())
+        assert calls == [1, 1]
+        assert bus.redis_client.acked == ["1-0"]
+        assert bus.stats["reclaimed"] == 1
+
+    def test_entry_without_callback_is_not_acked(self, run):
+        async def scenario():
+            bus = await stream_bus()
+
+            async def callback(event):
+                pass
+
+            await bus.subscribe("condition.a", callback)
+            await bus._process("events:condition", [entry("1-0", "condition.b", {"n": 1})])
+            return bus
+
+        bus = run(scenario())
+        assert bus.redis_client.acked == []
+
+    def test_poison_entry_is_abandoned_after_max_deliveries(self, run):
+        async def scenario():
+            bus = await stream_bus(max_deliveries=3)
+
+            async def callback(event):
+                raise ValueError("bad event")
+
+            await bus.subscribe("condition.a", callback)
+            poison = entry("1-0", "condition.a", {"n": 1})
+            for _ in range(3):
+                await bus._process("events:condition", [poison])
+            return bus
+
+        bus = run(scenario())
+        assert bus.redis_client.acked == ["1-0"]
+        assert bus.stats["abandoned"] == 1
+        assert bus.stats["delivered"] == 0
+
+    def test_trimmed_and_undecodable_entries_are_acked(self, run):
+        async def scenario():
+            bus = await stream_bus()
+
+            async def callback(event):
+                pass
+
+            await bus.subscribe("condition.a", callback)
+            await bus._process("events:condition", [
+                ("1-0", {}),
+                ("2-0", {"channel": "condition.a", "data": "{not json"}),
+            ])
+            return bus
+
+        bus = run(scenario())
+        assert bus.redis_client.acked == ["1-0", "2-0"]
+
+    def test_reclaim_follows_pages(self, run):
+        async def scenario():
+            bus = await stream_bus()
+            received = []
+
+            async def callback(event):
+                received.append(event["n"])
+
+            await bus.subscribe("condition.a", callback)
+            bus.redis_client.claim_pages = [
+                ["5-0", [entry("1-0", "condition.a", {"n": 1})], []],
+                ["0-0", [entry("5-0", "condition.a", {"n": 5})], []],
+            ]
+            await bus._reclaim()
+            return bus, received
+
+        bus, received = run(scenario())
+        assert received == [1, 5]
+        assert bus.redis_client.acked == ["1-0", "5-0"]
+
+
+class TestLocalEventBus:
+
+    def test_publish_waits_while_a_subscriber_queue_is_full(self, run):
+        async def scenario():
+            bus = LocalEventBus(queue_size=1)
+            await bus.connect()
+            release = asyncio.Event()
+            received = []
+
+            async def slow(event):
+                await release.wait()
+                received.append(event["n"])
+
+            await bus.subscribe("condition.a", slow)
+            listener = asyncio.create_task(bus.start_listening())
+            await asyncio.sleep(0)
+
+            await bus.publish("condition.a", {"n": 1})  # Taken by the worker
+            await asyncio.sleep(0)
+            await bus.publish("condition.a", {"n": 2})  # Fills the queue
+            third = asyncio.create_task(bus.publish("condition.a", {"n": 3}))
+            await asyncio.sleep(0.05)
+            blocked = not third.done()
+
+            release.set()
+            await third
+            await bus.disconnect()
+            await listener
+            return blocked, received, bus
+
+        blocked, received, bus = run(scenario())
+        assert blocked
+        assert received == [1, 2, 3]
+        assert bus.stats["dropped"] == 0
+
+    def test_events_are_dropped_when_nobody_listens(self, run):
+        async def scenario():
+            bus = LocalEventBus(queue_size=2)
+            await bus.connect()
+
+            async def callback(event):
+                pass
+
+            await bus.subscribe("condition.a", callback)
+            for n in range(5):
+                await bus.publish("condition.a", {"n": n})
+            return bus
+
+        bus = run(scenario())
+        assert bus.stats["dropped"] == 3
+        assert bus.backlog == 2
+
+    def test_disconnect_drains_queued_events(self, run):
+        async def scenario():
+            bus = LocalEventBus()
+            await bus.connect()
+            received = []
+
+            async def callback(event):
+                await asyncio.sleep(0.001)
+                received.append(event["n"])
+
+            await bus.psubscribe("condition.*", callback)
+            listener = asyncio.create_task(bus.start_listening())
+            await asyncio.sleep(0)
+            for n in range(20):
+                await bus.publish("condition.a", {"n": n})
+            await bus.disconnect()
+            await listener
+            return received, bus
+
+        received, bus = run(scenario())
+        assert received == list(range(20))
+        assert bus.stats["delivered"] == 20
+        assert bus.backlog == 0
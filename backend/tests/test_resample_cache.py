@@ -0,0 +1,102 @@
+"""Tests for incremental resampling, checked against a full pandas resample."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from apps.alerts.resample_cache import ResampleCache, VALUE_COLUMNS
+
+
+def candles(n, start="2024-01-01 00:03", freq="1min", seed=7):
+    """Random-walk 1m candles starting off a bucket boundary."""
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    open_ = np.r_[close[0], close[:-1]]
+    spread = rng.uniform(0, 1, n)
+    return pd.DataFrame({
+        "time": pd.date_range(start, periods=n, freq=freq, tz="UTC"),
+        "open": open_,
+        "high": np.maximum(open_, close) + spread,
+        "low": np.minimum(open_, close) - spread,
+        "close": close,
+        "volume": rng.uniform(1, 10, n),
+    })
+
+
+def pandas_resample(df, rule):
+    indexed = df.set_index("time")
+    out = pd.concat([
+        indexed["open"].resample(rule).first(),
+        indexed["high"].resample(rule).max(),
+        indexed["low"].resample(rule).min(),
+        indexed["close"].resample(rule).last(),
+        indexed["volume"].resample(rule).sum(),
+    ], axis=1)
+    out.columns = VALUE_COLUMNS
+    return out.dropna(how="any").reset_index()
+
+
+def assert_same_bars(actual, expected):
+    assert list(actual["time"]) == list(expected["time"])
+    np.testing.assert_allclose(actual[VALUE_COLUMNS].to_numpy(), expected[VALUE_COLUMNS].to_numpy())
+
+
+class TestResampleCache:
+
+    @pytest.mark.parametrize("rule", ["5min", "15min", "1h", "4h"])
+    def test_matches_pandas_resample(self, rule):
+        df = candles(600)
+        cache = ResampleCache()
+        out = cache.resample("BTCUSDT", "1m", rule, df, pd.Timedelta(rule))
+        assert_same_bars(out, pandas_resample(df, rule))
+        assert cache.stats == {"incremental": 0, "rebuilds": 1}
+
+    def test_sliding_window_stays_equal(self):
+        """Each poll sees the last 200 bars; buckets match a resample of everything seen so far."""
+        history = candles(500)
+        cache = ResampleCache()
+        for end in range(200, len(history) + 1, 7):
+            window = history.iloc[end - 200:end].reset_index(drop=True)
+            out = cache.resample("BTCUSDT", "1m", "15m", window, pd.Timedelta("15min"))
+            expected = pandas_resample(history.iloc[:end], "15min")
+            first_bucket = window["time"].iloc[0].floor("15min")
+            expected = expected[expected["time"] >= first_bucket].reset_index(drop=True)
+            assert_same_bars(out, expected)
+        assert cache.stats["rebuilds"] == 1
+        assert cache.stats["incremental"] > 0
+
+    def test_forming_bar_update_is_applied(self):
+        df = candles(30)
+        cache = ResampleCache()
+        cache.resample("BTCUSDT", "1m", "5m", df, pd.Timedelta("5min"))
+
+        # The exchange revises the still-open last candle
+        df = df.copy()
+        df.loc[df.index[-1], ["high", "close", "volume"]] = [1000.0, 999.0, 50.0]
+        out = cache.resample("BTCUSDT", "1m", "5m", df, pd.Timedelta("5min"))
+        assert_same_bars(out, pandas_resample(df, "5min"))
+        assert out["high"].iloc[-1] == 1000.0
+        assert cache.stats["incremental"] == 1
+
+    def test_gap_rebuilds(self):
+        cache = ResampleCache()
+        cache.resample("BTCUSDT", "1m", "5m", candles(50), pd.Timedelta("5min"))
+
+        later = candles(50, start="2024-01-02 00:00", seed=8)
+        out = cache.resample("BTCUSDT", "1m", "5m", later, pd.Timedelta("5min"))
+        assert_same_bars(out, pandas_resample(later, "5min"))
+        assert cache.stats["rebuilds"] == 2
+
+    def test_keys_are_independent(self):
+        btc, eth = candles(60, seed=1), candles(60, seed=2)
+        cache = ResampleCache()
+        cache.resample("BTCUSDT", "1m", "5m", btc, pd.Timedelta("5min"))
+        out = cache.resample("ETHUSDT", "1m", "5m", eth, pd.Timedelta("5min"))
+        assert_same_bars(out, pandas_resample(eth, "5min"))
+
+        cache.evict("BTCUSDT")
+        assert [key[0] for key in cache._series] == ["ETHUSDT"]
+
+    def test_rule_not_dividing_a_day_is_unsupported(self):
+        cache = ResampleCache()
+        assert cache.resample("BTCUSDT", "1m", "7m", candles(60), pd.Timedelta("7min")) is None
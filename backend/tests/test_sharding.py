@@ -0,0 +1,63 @@
+"""Tests for consistent hashing of alert groups onto runner shards."""
+
+from collections import Counter
+
+from apps.alerts.sharding import HashRing
+
+KEYS = [(f"SYM{i}USDT", tf) for i in range(500) for tf in ("1m", "1h")]
+
+
+def placement(ring):
+    return {key: ring.node_for(key) for key in KEYS}
+
+
+class TestHashRing:
+
+    def test_empty_ring_has_no_owner(self):
+        ring = HashRing()
+        assert ring.node_for(("BTCUSDT", "1m")) is None
+        ring.add(0)
+        ring.remove(0)
+        assert ring.node_for(("BTCUSDT", "1m")) is None
+
+    def test_placement_is_deterministic(self):
+        """Every runner computes the same owner, whatever order shards were added in."""
+        assert placement(HashRing([0, 1, 2, 3])) == placement(HashRing([3, 1, 0, 2]))
+
+    def test_groups_are_spread_over_shards(self):
+        counts = Counter(placement(HashRing([0, 1, 2, 3])).values())
+        assert set(counts) == {0, 1, 2, 3}
+        # 64 virtual nodes per shard keep every share well away from zero or all
+        assert all(len(KEYS) * 0.1 < count < len(KEYS) * 0.45 for count in counts.values())
+
+    def test_removing_a_shard_only_moves_its_groups(self):
+        ring = HashRing([0, 1, 2, 3])
+        before = placement(ring)
+        ring.remove(2)
+        after = placement(ring)
+
+        moved = {key for key in KEYS if before[key] != after[key]}
+        assert moved == {key for key in KEYS if before[key] == 2}
+        assert 2 not in after.values()
+
+    def test_adding_a_shard_back_restores_placement(self):
+        ring = HashRing([0, 1, 2, 3])
+        before = placement(ring)
+        ring.remove(1)
+        ring.add(1)
+        assert placement(ring) == before
+
+    def test_adding_a_shard_only_takes_groups(self):
+        ring = HashRing([0, 1, 2])
+        before = placement(ring)
+        ring.add(3)
+        after = placement(ring)
+        assert all(after[key] in (before[key], 3) for key in KEYS)
+
+    def test_add_and_remove_are_idempotent(self):
+        ring = HashRing([0, 1])
+        before = placement(ring)
+        ring.add(1)
+        ring.remove(5)
+        assert placement(ring) == before
+        assert len(ring._points) == 2 * ring.replicas
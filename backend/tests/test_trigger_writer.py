@@ -0,0 +1,91 @@
+"""Tests for the condition trigger write-behind queue."""
+
+from trigger_writer import INCREMENT_RPC, TriggerWriter
+
+from .conftest import FakeError
+
+
+def inserts(supabase):
+    return [rows for table, op, rows, _ in supabase.written if op == "insert"]
+
+
+class TestTriggerWriter:
+
+    def test_rows_are_batched(self, supabase, run):
+        async def scenario():
+            writer = TriggerWriter(supabase, flush_interval_ms=1000, max_batch=4)
+            await writer.start()
+            for i in range(10):
+                await writer.add_trigger({"i": i})
+            await writer.stop()
+            return writer
+
+        writer = run(scenario())
+        batches = inserts(supabase)
+        assert all(len(rows) <= 4 for rows in batches)
+        assert [row["i"] for rows in batches for row in rows] == list(range(10))
+        assert writer.stats["triggers_written"] == 10
+
+    def test_counters_coalesce_into_one_rpc(self, supabase, run):
+        async def scenario():
+            writer = TriggerWriter(supabase)
+            writer.increment_trigger_count("c1", "2024-01-01T00:00:01")
+            writer.increment_trigger_count("c1", "2024-01-01T00:00:03")
+            writer.increment_trigger_count("c2", "2024-01-01T00:00:02")
+            await writer.flush()
+
+        run(scenario())
+        [(name, params)] = supabase.rpc_calls
+        assert name == INCREMENT_RPC
+        assert params["updates"] == [
+            {"condition_id": "c1", "increment": 2, "last_triggered_at": "2024-01-01T00:00:03"},
+            {"condition_id": "c2", "increment": 1, "last_triggered_at": "2024-01-01T00:00:02"},
+        ]
+
+    def test_transient_rpc_error_is_retried(self, supabase, run):
+        """A network error keeps the atomic RPC; counters are kept for the next flush."""
+        supabase.rpc_errors = [FakeError("timed out")]
+
+        async def scenario():
+            writer = TriggerWriter(supabase)
+            writer.increment_trigger_count("c1")
+            await writer.flush()
+            assert writer._rpc_available
+            writer.increment_trigger_count("c1")
+            await writer.flush()
+            return writer
+
+        writer = run(scenario())
+        assert len(supabase.rpc_calls) == 2
+        assert supabase.rpc_calls[-1][1]["updates"][0]["increment"] == 2
+        assert not any(table == "condition_registry" for table, *_ in supabase.requests)
+
+    def test_missing_rpc_falls_back(self, supabase, run):
+        supabase.rpc_errors = [FakeError("Could not find the function", code="PGRST202")]
+
+        async def scenario():
+            writer = TriggerWriter(supabase)
+            writer.increment_trigger_count("c1")
+            await writer.flush()
+            return writer
+
+        writer = run(scenario())
+        assert not writer._rpc_available
+        assert ("condition_registry", "update") in [(table, op) for table, op, *_ in supabase.written]
+
+    def test_failed_insert_is_retained(self, supabase, run):
+        supabase.down = True
+
+        async def scenario():
+            writer = TriggerWriter(supabase, max_queue=3)
+            for i in range(5):
+                await writer._queue.put({"i": i})
+                await writer.flush()
+            assert writer.pending == 3
+            supabase.down = False
+            await writer.flush()
+            return writer
+
+        writer = run(scenario())
+        assert writer.stats["dropped"] == 2
+        assert [row["i"] for row in inserts(supabase)[-1]] == [2, 3, 4]
@@ -0,0 +1,17 @@
+-- Migration: Batched condition trigger counters
+-- Lets the condition evaluator apply coalesced trigger counts in one atomic statement
+-- instead of a read-modify-write per trigger
+
+CREATE OR REPLACE FUNCTION public.increment_condition_trigger_counts(updates JSONB)
+RETURNS VOID AS $$
+BEGIN
+    UPDATE public.condition_registry AS cr
+    SET trigger_count = COALESCE(cr.trigger_count, 0) + u.increment,
+        last_triggered_at = GREATEST(COALESCE(cr.last_triggered_at, u.last_triggered_at), u.last_triggered_at),
+        last_evaluated_at = GREATEST(COALESCE(cr.last_evaluated_at, u.last_triggered_at), u.last_triggered_at)
+    FROM jsonb_to_recordset(updates) AS u(condition_id VARCHAR(64), increment BIGINT, last_triggered_at TIMESTAMPTZ)
+    WHERE cr.condition_id = u.condition_id;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION public.increment_condition_trigger_counts(JSONB) IS 'Apply [{condition_id, increment, last_triggered_at}] trigger counter updates atomically';
@@ -0,0 +1,11 @@
+-- Change tracking for alerts
+-- The alert runner loads alerts once and then only pulls rows changed since its last watermark
+alter table public.alerts
+  add column if not exists updated_at timestamptz not null default now();
+
+create index if not exists alerts_updated_at_idx on public.alerts (updated_at);
+
+drop trigger if exists update_alerts_updated_at on public.alerts;
+create trigger update_alerts_updated_at
+before update on public.alerts
+for each row execute function update_updated_at_column();